@@ -13,6 +13,7 @@ the Prometheus remote_write API, that is, they can receive metrics data over rem
 should use the `PrometheusRemoteWriteProducer`.
 """
 
+import base64
 import json
 import logging
 import os
@@ -21,8 +22,9 @@ import re
 import socket
 import subprocess
 import tempfile
+import zlib
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import yaml
 from charms.observability_libs.v0.juju_topology import JujuTopology
@@ -45,6 +47,8 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
+# Left at the vendored version: the alert rules payload features below are local changes, not yet
+# upstreamed, and upstream patch versions mustn't be reused for a diverging copy of the library.
 LIBPATCH = 12
 
 
@@ -57,6 +61,16 @@ RELATION_INTERFACE_NAME = "prometheus_remote_write"
 
 DEFAULT_ALERT_RULES_RELATIVE_PATH = "./src/prometheus_alert_rules"
 
+# Alert rules payload features understood by `PrometheusRemoteWriteProvider`. They are advertised
+# to the consumers in the `alert_rules_features` key of the provider's unit relation data bag.
+# Until they are upstreamed, Prometheus charms using the upstream library don't advertise them.
+ALERT_RULES_FEATURES = ["zlib", "chunks", "configmap", "group_labels"]
+
+# Processed alert rules chunks are cached in files named by their hash, in a subdirectory for each
+# relation name. The cache doesn't need to survive restarts: chunks are just processed again.
+ALERT_RULES_CACHE_DIR = os.path.join(tempfile.gettempdir(), "prometheus-remote-write-alert-rules")
+ALERT_RULES_CHUNK_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
 
 class RelationNotFoundError(Exception):
     """Raised if there is no relation with the given name."""
@@ -160,13 +174,14 @@ def _is_single_alert_rule_format(rules_dict: dict) -> bool:
 
     Alert rules in dictionary form are considered to be in single rule
     format if in the least it contains two keys corresponding to the
-    alert rule name and alert expression.
+    alert rule name and alert expression. Recording rules in single rule
+    format contain the recorded series name instead of the alert rule name.
 
     Returns:
         True if alert rule is in single rule file format.
     """
-    # one alert rule per file
-    return set(rules_dict) >= {"alert", "expr"}
+    # one alert (or recording) rule per file
+    return set(rules_dict) >= {"alert", "expr"} or set(rules_dict) >= {"record", "expr"}
 
 
 class AlertRules:
@@ -899,6 +914,274 @@ class PrometheusRemoteWriteProvider(Object):
                 "url": endpoint_url,
             }
         )
+        relation.data[self._charm.unit]["alert_rules_features"] = json.dumps(ALERT_RULES_FEATURES)
+
+    def _decode_alert_rules(self, alert_rules: str, encoding: str) -> Optional[dict]:
+        """Decode alert rules as stored in the relation data bag.
+
+        Args:
+            alert_rules: Alert rules, either plain JSON or base64 encoded zlib compressed JSON.
+            encoding: The encoding of the alert rules, `zlib` or an empty string for plain JSON.
+
+        Returns:
+            a dictionary of alert rules or None if they can't be decoded.
+        """
+        try:
+            if encoding == "zlib":
+                alert_rules = zlib.decompress(base64.b64decode(alert_rules)).decode()
+            elif encoding:
+                logger.error("Unsupported alert rules encoding: %s", encoding)
+                return None
+            decoded = json.loads(alert_rules)
+        except (ValueError, zlib.error) as e:
+            logger.error("Failed to load alert rules from relation data: %s", e)
+            return None
+        if not isinstance(decoded, dict):
+            logger.error("Failed to load alert rules from relation data: not a JSON object")
+            return None
+        return decoded
+
+    def _load_alert_rules(
+        self, relation: Relation
+    ) -> List[Tuple[Optional[str], Optional[List[dict]]]]:
+        """Load alert rule groups from the remote application's relation data bag.
+
+        Alert rules are stored either in the `alert_rules` key or, if the remote application
+        splits them into chunks, in the `alert_rules_chunk_<n>` keys listed (by their hash) in the
+        `alert_rules_manifest` key. Very large alert rules may also be stored in Kubernetes
+        ConfigMaps listed (by their name and hash) in the `alert_rules_ref` key. Either way, they
+        are plain JSON or, if the `alert_rules_encoding` key is set to `zlib`, base64 encoded
+        zlib compressed JSON. Chunks which have already been processed are not fetched nor
+        decoded again.
+
+        Args:
+            relation: The relation to load the alert rules from.
+
+        Returns:
+            a list of tuples of chunk hash (None if alert rules aren't chunked) and alert rule
+            groups of this chunk, or None if the chunk couldn't be loaded.
+        """
+        relation_data = relation.data[relation.app]  # type: ignore[index]
+        encoding = relation_data.get("alert_rules_encoding", "")
+        if "alert_rules_ref" in relation_data:
+            return self._load_alert_rules_from_configmaps(
+                json.loads(relation_data["alert_rules_ref"]), encoding
+            )
+        if "alert_rules_manifest" not in relation_data:
+            alert_rules = self._decode_alert_rules(
+                relation_data.get("alert_rules", "{}"), encoding
+            )
+            if alert_rules is None:
+                return [(None, None)]
+            if alert_rules and "groups" not in alert_rules:
+                logger.debug("No alert groups were found in relation data")
+                return []
+            return [(None, alert_rules["groups"])] if alert_rules else []
+
+        chunks = []  # type: List[Tuple[Optional[str], Optional[List[dict]]]]
+        manifest = json.loads(relation_data["alert_rules_manifest"])
+        for idx, chunk_hash in enumerate(manifest["chunks"]):
+            if self._is_chunk_cached(chunk_hash):
+                chunks.append((chunk_hash, []))
+                continue
+            chunk = relation_data.get("alert_rules_chunk_{}".format(idx))
+            if chunk is None:
+                logger.error("Alert rules chunk %d listed in the manifest is missing", idx)
+                chunks.append((chunk_hash, None))
+                continue
+            alert_rules = self._decode_alert_rules(chunk, encoding)
+            chunks.append(
+                (chunk_hash, None if alert_rules is None else alert_rules.get("groups", []))
+            )
+        return chunks
+
+    def _load_alert_rules_from_configmaps(
+        self, reference: dict, encoding: str
+    ) -> List[Tuple[Optional[str], Optional[List[dict]]]]:
+        """Load alert rule groups from the Kubernetes ConfigMaps they are stored in.
+
+        Args:
+            reference: The `namespace` of the ConfigMaps and their list (`configmaps`), each
+                with a `name` and content `hash`.
+            encoding: The encoding of the alert rules.
+
+        Returns:
+            a list of tuples of chunk hash and alert rule groups of this chunk, or None if the
+            chunk couldn't be loaded.
+        """
+        chunks = []  # type: List[Tuple[Optional[str], Optional[List[dict]]]]
+        for configmap in reference["configmaps"]:
+            if self._is_chunk_cached(configmap["hash"]):
+                chunks.append((configmap["hash"], []))
+                continue
+            configmap_data = self._fetch_configmap(reference["namespace"], configmap["name"])
+            alert_rules = (
+                self._decode_alert_rules(configmap_data, encoding)
+                if configmap_data is not None
+                else None
+            )
+            chunks.append(
+                (configmap["hash"], None if alert_rules is None else alert_rules.get("groups", []))
+            )
+        return chunks
+
+    def _fetch_configmap(self, namespace: str, name: str) -> Optional[str]:
+        """Fetch alert rules from a Kubernetes ConfigMap.
+
+        Args:
+            namespace: The namespace of the ConfigMap.
+            name: The name of the ConfigMap.
+
+        Returns:
+            the alert rules stored in the ConfigMap or None if they can't be read, so that they
+            are fetched again next time (e.g. once the application is trusted).
+        """
+        # lightkube is only needed if the remote application stores alert rules in ConfigMaps
+        from lightkube import ApiError, Client
+        from lightkube.core.exceptions import ConfigError
+        from lightkube.resources.core_v1 import ConfigMap
+
+        try:
+            configmap = Client().get(ConfigMap, name, namespace=namespace)
+        except (ApiError, ConfigError) as e:
+            logger.error("Failed to read alert rules from ConfigMap %s/%s: %s", namespace, name, e)
+            return None
+        alert_rules = (configmap.data or {}).get("alert_rules")
+        if alert_rules is None:
+            logger.error("No alert rules found in ConfigMap %s/%s", namespace, name)
+        return alert_rules
+
+    def _chunk_cache_path(self, chunk_hash: str) -> Optional[Path]:
+        """Path of the file caching a processed alert rules chunk.
+
+        Args:
+            chunk_hash: The hash of the chunk, as listed by the remote application.
+
+        Returns:
+            the path of the file or None if the hash isn't a SHA-256 hex digest, so that a remote
+            application can't make the provider write outside of the cache directory.
+        """
+        if not ALERT_RULES_CHUNK_HASH_PATTERN.fullmatch(chunk_hash):
+            return None
+        return Path(ALERT_RULES_CACHE_DIR, self._relation_name, "{}.json".format(chunk_hash))
+
+    def _is_chunk_cached(self, chunk_hash: str) -> bool:
+        path = self._chunk_cache_path(chunk_hash)
+        return path is not None and path.exists()
+
+    def _read_cached_chunk(self, chunk_hash: str) -> Optional[List[list]]:
+        """Read the processed alert rule groups of a chunk from the cache.
+
+        Args:
+            chunk_hash: The hash of the chunk.
+
+        Returns:
+            the processed alert rule groups of the chunk or None if they can't be read, in which
+            case the cached chunk is removed so that it is loaded again next time.
+        """
+        path = self._chunk_cache_path(chunk_hash)
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.error("Failed to read cached alert rules chunk %s: %s", chunk_hash, e)
+            path.unlink(missing_ok=True)
+            return None
+
+    def _cache_chunk(self, chunk_hash: str, processed_groups: List[list]) -> None:
+        """Cache the processed alert rule groups of a chunk.
+
+        Args:
+            chunk_hash: The hash of the chunk.
+            processed_groups: The processed alert rule groups, as returned by
+                `_process_alert_groups`.
+        """
+        path = self._chunk_cache_path(chunk_hash)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written to a temporary file first, so that a partially written chunk is never read
+            temporary_path = path.with_suffix(".tmp")
+            temporary_path.write_text(json.dumps(processed_groups))
+            temporary_path.replace(path)
+        except OSError as e:
+            logger.warning("Failed to cache alert rules chunk %s: %s", chunk_hash, e)
+
+    def _prune_cached_chunks(self, seen_chunks: Set[str]) -> None:
+        """Remove cached chunks which are no longer listed by any remote application.
+
+        Args:
+            seen_chunks: The hashes of the chunks still listed.
+        """
+        for path in Path(ALERT_RULES_CACHE_DIR, self._relation_name).glob("*.json"):
+            if path.stem not in seen_chunks:
+                path.unlink(missing_ok=True)
+
+    def _process_alert_groups(self, alert_groups: List[dict]) -> Tuple[List[list], List[str]]:
+        """Inject topology into alert rules and validate them.
+
+        Args:
+            alert_groups: a list of alert rule groups.
+
+        Returns:
+            a tuple of a list of valid alert rule groups, each paired with its topology
+            identifier, and a list of validation error messages.
+        """
+        processed_groups = []  # type: List[list]
+        error_messages = []
+        tool = CosTool(self._charm)
+        for group in alert_groups:
+            # Labels shared by all rules of a group may be hoisted to the group level to make the
+            # payload smaller; put them back into each rule (labels of the rule win)
+            group_labels = group.pop("labels", None)
+            if group_labels:
+                group["rules"] = [
+                    {**rule, "labels": {**group_labels, **rule.get("labels", {})}}
+                    for rule in group["rules"]
+                ]
+            # Copy off rules, so we don't modify an object we're iterating over
+            rules = group["rules"]
+            for idx, alert_rule in enumerate(rules):
+                labels = alert_rule.get("labels")
+
+                if labels:
+                    topology = JujuTopology(
+                        model=labels.get("juju_model", ""),
+                        model_uuid=labels.get("juju_model_uuid", ""),
+                        application=labels.get("juju_application", ""),
+                        unit=labels.get("juju_unit", ""),
+                        charm_name=labels.get("juju_charm", ""),
+                    )
+
+                    # Inject topology and put it back in the list
+                    alert_rule["expr"] = tool.inject_label_matchers(
+                        re.sub(r"%%juju_topology%%,?", "", alert_rule["expr"]),
+                        topology.label_matcher_dict,
+                    )
+
+                    group["rules"][idx] = alert_rule
+            try:
+                labels = group["rules"][0]["labels"]
+                identifier = JujuTopology(
+                    model=labels.get("juju_model", ""),
+                    model_uuid=labels.get("juju_model_uuid", ""),
+                    application=labels.get("juju_application", ""),
+                    unit=labels.get("juju_unit", ""),
+                    charm_name=labels.get("juju_charm", ""),
+                ).identifier
+
+                _, errmsg = self.tool.validate_alert_rules({"groups": [group]})
+
+                if errmsg:
+                    error_messages.append(errmsg)
+                    continue
+                processed_groups.append([identifier, group])
+            except KeyError:
+                logger.error("Alert rules were found but no usable labels were present")
+
+        return processed_groups, error_messages
 
     def alerts(self) -> dict:
         """Fetch alert rules from all relations.
@@ -927,68 +1210,54 @@ class PrometheusRemoteWriteProvider(Object):
         The `PrometheusRemoteWriteProvider` accepts a list of rules and these
         rules are all placed into one group.
 
+        Alert rules split into chunks by the remote application are reassembled. Chunks are
+        identified by their hash, so those which have already been processed are not validated
+        again. Processed chunks are cached in files in `ALERT_RULES_CACHE_DIR` rather than in
+        stored state, which would otherwise hold a copy of all alert rules. Chunks which couldn't
+        be loaded are reported as errors and not cached, so that they are loaded again next time.
+
         Returns:
             a dictionary mapping the name of an alert rule group to the group.
         """
         alerts = {}  # type: Dict[str, dict] # mapping b/w juju identifiers and alert rule files
+        seen_chunks = set()  # type: Set[str]
         for relation in self._charm.model.relations[self._relation_name]:
             if not relation.units or not relation.app:
                 continue
 
-            alert_rules = json.loads(relation.data[relation.app].get("alert_rules", "{}"))
-
-            if not alert_rules:
-                continue
-
-            if "groups" not in alert_rules:
-                logger.debug("No alert groups were found in relation data")
-                continue
-            # Construct an ID based on what's in the alert rules
             error_messages = []
-            tool = CosTool(self._charm)
-            for group in alert_rules["groups"]:
-                # Copy off rules, so we don't modify an object we're iterating over
-                rules = group["rules"]
-                for idx, alert_rule in enumerate(rules):
-                    labels = alert_rule.get("labels")
-
-                    if labels:
-                        topology = JujuTopology(
-                            model=labels.get("juju_model", ""),
-                            model_uuid=labels.get("juju_model_uuid", ""),
-                            application=labels.get("juju_application", ""),
-                            unit=labels.get("juju_unit", ""),
-                            charm_name=labels.get("juju_charm", ""),
+            for chunk_hash, alert_groups in self._load_alert_rules(relation):
+                if alert_groups is None:
+                    error_messages.append(
+                        "failed to load alert rules{}".format(
+                            " chunk {}".format(chunk_hash) if chunk_hash else ""
                         )
-
-                        # Inject topology and put it back in the list
-                        alert_rule["expr"] = tool.inject_label_matchers(
-                            re.sub(r"%%juju_topology%%,?", "", alert_rule["expr"]),
-                            topology.label_matcher_dict,
+                    )
+                    continue
+                if chunk_hash and self._is_chunk_cached(chunk_hash):
+                    cached_groups = self._read_cached_chunk(chunk_hash)
+                    if cached_groups is None:
+                        error_messages.append(
+                            "failed to load alert rules chunk {}".format(chunk_hash)
                         )
-
-                        group["rules"][idx] = alert_rule
-                try:
-                    labels = group["rules"][0]["labels"]
-                    identifier = JujuTopology(
-                        model=labels.get("juju_model", ""),
-                        model_uuid=labels.get("juju_model_uuid", ""),
-                        application=labels.get("juju_application", ""),
-                        unit=labels.get("juju_unit", ""),
-                        charm_name=labels.get("juju_charm", ""),
-                    ).identifier
-
-                    _, errmsg = self.tool.validate_alert_rules({"groups": [group]})
-
-                    if errmsg:
-                        error_messages.append(errmsg)
                         continue
+                    processed_groups = cached_groups
+                else:
+                    processed_groups, chunk_error_messages = self._process_alert_groups(
+                        alert_groups
+                    )
+                    error_messages.extend(chunk_error_messages)
+                    if chunk_hash and not chunk_error_messages:
+                        self._cache_chunk(chunk_hash, processed_groups)
+                if chunk_hash:
+                    seen_chunks.add(chunk_hash)
+
+                # Construct an ID based on what's in the alert rules
+                for identifier, group in processed_groups:
                     if identifier not in alerts:
                         alerts[identifier] = {"groups": [group]}
                     else:
                         alerts[identifier]["groups"].append(group)
-                except KeyError:
-                    logger.error("Alert rules were found but no usable labels were present")
 
             if error_messages:
                 relation.data[self._charm.app]["event"] = json.dumps(
@@ -996,6 +1265,8 @@ class PrometheusRemoteWriteProvider(Object):
                 )
                 continue
 
+        self._prune_cached_chunks(seen_chunks)
+
         return alerts
 
 
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements static estimation of the cardinality risk of alert rules.
+Every firing or pending alert is a series of Prometheus' `ALERTS` and `ALERTS_FOR_STATE` metrics,
+labelled with the labels of the series the alert's expression returns and the labels of the rule
+itself. Rules whose expressions return many series, or whose labels template in values varying
+from one evaluation to another, make these metrics explode.
+The risk of a rule is estimated from:
+- the labels its expression returns: grouping `by` a few low-cardinality labels is cheap, while
+  grouping `without` some labels or not aggregating at all keeps every label of the selected
+  series,
+- the templates in its labels: `$value` (a new series on every change of the value) is the
+  riskiest, `$labels.<label>` is as risky as the label it copies.
+Labels are considered high-cardinality if they're listed in `HIGH_CARDINALITY_LABELS`.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from alert_rules_cost import AGGREGATION_OPERATORS, closing_parenthesis
+
+HIGH_CARDINALITY_LABELS = {
+    "instance",
+    "pod",
+    "pod_name",
+    "container",
+    "container_id",
+    "id",
+    "uid",
+    "ip",
+    "path",
+    "url",
+    "uri",
+    "endpoint",
+    "device",
+    "mountpoint",
+    "user",
+    "session",
+    "request_id",
+    "trace_id",
+}
+LABEL_RISK = 1.0
+HIGH_CARDINALITY_LABEL_RISK = 10.0
+UNAGGREGATED_RISK = 20.0
+VALUE_TEMPLATE_RISK = 100.0
+
+_OUTERMOST_AGGREGATION = re.compile(
+    r"^\s*({})\s*(?:(by|without)\s*\(([^)]*)\)\s*)?\(".format("|".join(AGGREGATION_OPERATORS))
+)
+_LABEL_TEMPLATE = re.compile(r"\{\{[^}]*\}\}")
+_LABEL_REFERENCE = re.compile(r"\$labels\.([a-zA-Z_]\w*)|\$labels\s*\"?([a-zA-Z_]\w*)")
+
+
+def estimate(rule: dict) -> float:
+    """Estimates the `ALERTS` cardinality risk of an alert rule.
+
+    Args:
+        rule: Alert rule.
+
+    Returns:
+        float: Estimated risk, 0 for recording rules.
+    """
+    if "alert" not in rule:
+        return 0.0
+    return round(_expr_risk(str(rule["expr"])) + _labels_risk(rule.get("labels", {})), 2)
+
+
+def report(tenant_groups: Dict[str, List[dict]]) -> dict:
+    """Estimates the `ALERTS` cardinality risk of alert rules of each tenant.
+
+    Args:
+        tenant_groups: Alert rule groups of each tenant.
+
+    Returns:
+        dict: Total risk (`risk`) and risks of each tenant (`tenants`), each with its total risk
+            (`risk`) and the risks of its alerts (`rules`, keyed by `<group>/<alert>`). Alert
+            names aren't unique, so each key maps to the list of risks of all the rules of the
+            group alerting under that name, in the order of the group.
+    """
+    tenants = {}
+    total_risk = 0.0
+    for tenant, groups in tenant_groups.items():
+        rule_risks = {}  # type: Dict[str, List[float]]
+        for group in groups:
+            for rule in group["rules"]:
+                if "alert" in rule:
+                    rule_risks.setdefault(_rule_name(group, rule), []).append(estimate(rule))
+        tenant_risk = round(sum(sum(risks) for risks in rule_risks.values()), 2)
+        tenants[tenant] = {"risk": tenant_risk, "rules": rule_risks}
+        total_risk += tenant_risk
+    return {"risk": round(total_risk, 2), "tenants": tenants}
+
+
+def block(groups: List[dict], max_risk: float) -> Tuple[List[dict], List[str]]:
+    """Drops alert rules whose cardinality risk exceeds a threshold.
+
+    Args:
+        groups: Alert rule groups.
+        max_risk: Maximum risk of a single alert rule.
+
+    Returns:
+        tuple: Alert rule groups without the risky rules (groups left without rules are dropped)
+            and the names (`<group>/<alert>`) of the dropped rules, one per dropped rule, so that
+            a name is listed as many times as rules alerting under it were dropped.
+    """
+    blocked = []
+    allowed_groups = []
+    for group in groups:
+        rules = []
+        for rule in group["rules"]:
+            if estimate(rule) > max_risk:
+                blocked.append(_rule_name(group, rule))
+            else:
+                rules.append(rule)
+        if rules:
+            allowed_groups.append({**group, "rules": rules})
+    return allowed_groups, blocked
+
+
+def _rule_name(group: dict, rule: dict) -> str:
+    return f"{group['name']}/{rule['alert']}"
+
+
+def _expr_risk(expr: str) -> float:
+    match = _OUTERMOST_AGGREGATION.match(expr)
+    if not match:
+        return UNAGGREGATED_RISK
+    clause, labels = match.group(2), match.group(3)
+    if not clause:
+        # The grouping clause may as well follow the aggregated expression
+        end = closing_parenthesis(expr, match.end() - 1)
+        trailing = re.match(r"\s*(by|without)\s*\(([^)]*)\)", expr[end:])
+        if trailing:
+            clause, labels = trailing.group(1), trailing.group(2)
+    if clause == "without":
+        return UNAGGREGATED_RISK
+    return sum(_label_risk(label.strip()) for label in (labels or "").split(",") if label.strip())
+
+
+def _labels_risk(labels: dict) -> float:
+    risk = 0.0
+    for value in labels.values():
+        for template in _LABEL_TEMPLATE.findall(str(value)):
+            if "$value" in template:
+                risk += VALUE_TEMPLATE_RISK
+            for reference in _LABEL_REFERENCE.findall(template):
+                risk += _label_risk(reference[0] or reference[1])
+    return risk
+
+
+def _label_risk(label: str) -> float:
+    return HIGH_CARDINALITY_LABEL_RISK if label in HIGH_CARDINALITY_LABELS else LABEL_RISK
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements storage of the alert rules bundle in Kubernetes ConfigMaps.
+It is used by the prometheus-configurer-k8s-operator charm for rule sets too big to be pushed
+through the `prometheus` relation data bag. In that case, the bundle is split into chunks, each
+written to a ConfigMap of its own, and the relation data bag only carries a reference to these
+ConfigMaps together with their content hashes.
+ConfigMaps are named after their content, so a ConfigMap referenced from the relation data bag
+is never modified: a write only creates the ConfigMaps of chunks which changed, and those of the
+previous write are only deleted once they're no longer referenced. If a write fails halfway, the
+ConfigMaps it created are deleted, leaving the previous ones untouched.
+The Kubernetes client is set up the same way as in `KubernetesServicePatch`, so the application
+needs to be trusted (`juju trust`) to manage ConfigMaps.
+"""
+
+import logging
+from typing import List, Optional
+
+from lightkube import ApiError, Client
+from lightkube.core import exceptions
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.core_v1 import ConfigMap
+
+import alert_rules_payload
+
+logger = logging.getLogger(__name__)
+
+# ConfigMaps are limited to 1MiB, including metadata
+CONFIGMAP_CHUNK_SIZE = 900 * 1024
+CONFIGMAP_DATA_KEY = "alert_rules"
+CONFIGMAP_NAME_HASH_LENGTH = 16
+
+
+class AlertRulesConfigMaps:
+    def __init__(self, app_name: str):
+        self._app = app_name
+
+    def write(
+        self, chunks: List[str], encoding: str, previous_names: List[str]
+    ) -> Optional[List[dict]]:
+        """Writes alert rules chunks which changed since last write to ConfigMaps.
+
+        ConfigMaps of the previous write aren't deleted, as they're still referenced until the
+        new references are published.
+
+        Args:
+            chunks: Serialised alert rules chunks.
+            encoding: The encoding to write the chunks with.
+            previous_names: Names of the ConfigMaps written last time.
+
+        Returns:
+            list: ConfigMap references (`name` and `hash` of each ConfigMap) or None if writing
+                failed.
+        """
+        namespace = self.namespace
+        if not namespace:
+            return None
+        try:
+            client = Client()
+        except exceptions.ConfigError as e:
+            logger.warning("Error creating k8s client: %s", e)
+            return None
+
+        references = []
+        created: List[str] = []
+        try:
+            for chunk in chunks:
+                name = self._configmap_name(chunk, encoding)
+                references.append({"name": name, "hash": alert_rules_payload.fingerprint(chunk)})
+                if name in previous_names or name in created:
+                    continue
+                client.apply(
+                    self._configmap(name, namespace, alert_rules_payload.encode(chunk, encoding)),
+                    field_manager=self._app,
+                    force=True,
+                )
+                created.append(name)
+        except ApiError as e:
+            if e.status.code == 403:
+                logger.error("Alert rules ConfigMap write failed: `juju trust` this application.")
+            else:
+                logger.error("Alert rules ConfigMap write failed: %s", str(e))
+            self._delete(client, namespace, created)
+            return None
+        return references
+
+    def delete(self, names: List[str]) -> None:
+        """Deletes alert rules ConfigMaps.
+
+        Args:
+            names: Names of the ConfigMaps to delete.
+        """
+        if not names:
+            return
+        namespace = self.namespace
+        if not namespace:
+            return
+        try:
+            client = Client()
+        except exceptions.ConfigError as e:
+            logger.warning("Error creating k8s client: %s", e)
+            return
+        self._delete(client, namespace, names)
+
+    @staticmethod
+    def _delete(client: Client, namespace: str, names: List[str]) -> None:
+        for name in names:
+            try:
+                client.delete(ConfigMap, name, namespace=namespace)
+            except ApiError as e:
+                if e.status.code != 404:
+                    logger.error("Alert rules ConfigMap %s delete failed: %s", name, str(e))
+
+    def _configmap(self, name: str, namespace: str, chunk: str) -> ConfigMap:
+        return ConfigMap(
+            apiVersion="v1",
+            kind="ConfigMap",
+            metadata=ObjectMeta(
+                namespace=namespace,
+                name=name,
+                labels={"app.kubernetes.io/name": self._app},
+            ),
+            data={CONFIGMAP_DATA_KEY: chunk},
+        )
+
+    def _configmap_name(self, chunk: str, encoding: str) -> str:
+        content_hash = alert_rules_payload.fingerprint(f"{encoding}:{chunk}")
+        return f"{self._app}-alert-rules-{content_hash[:CONFIGMAP_NAME_HASH_LENGTH]}"
+
+    @property
+    def namespace(self) -> Optional[str]:
+        """The Kubernetes namespace we're running in.
+
+        Returns:
+            str: A string containing the name of the current Kubernetes namespace, or None if
+                it can't be read (e.g. outside of Kubernetes).
+        """
+        try:
+            with open("/var/run/secrets/kubernetes.io/serviceaccount/namespace", "r") as f:
+                return f.read().strip()
+        except OSError as e:
+            logger.warning("Failed to read the Kubernetes namespace: %s", e)
+            return None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements static estimation of the evaluation cost of alert rules.
+The cost of a rule is estimated from its PromQL expression only, without querying Prometheus.
+Each of the following adds to the cost:
+- vector selectors (each selects series Prometheus has to look up),
+- range selectors (proportionally to the range width, as wider ranges load more samples),
+- regex label matchers (which are more expensive to match than equality matchers),
+- subqueries (proportionally to the number of evaluation steps within their range),
+- aggregations without a `by` or `without` clause (which aggregate all selected series at once).
+Costs are aggregated per group and per tenant, so that expensive tenants can be identified.
+"""
+
+import re
+from typing import Dict, List
+
+SELECTOR_COST = 1.0
+RANGE_COST_PER_5M = 1.0
+REGEX_MATCHER_COST = 2.0
+SUBQUERY_STEP_COST = 1.0
+UNGROUPED_AGGREGATION_COST = 2.0
+DEFAULT_SUBQUERY_STEP_SECONDS = 60
+
+AGGREGATION_OPERATORS = (
+    "sum",
+    "min",
+    "max",
+    "avg",
+    "group",
+    "stddev",
+    "stdvar",
+    "count",
+    "count_values",
+    "bottomk",
+    "topk",
+    "quantile",
+)
+KEYWORDS = {
+    "by",
+    "without",
+    "on",
+    "ignoring",
+    "group_left",
+    "group_right",
+    "bool",
+    "and",
+    "or",
+    "unless",
+    "offset",
+    "inf",
+    "nan",
+}
+DURATION_UNITS_SECONDS = {
+    "ms": 0.001,
+    "s": 1,
+    "m": 60,
+    "h": 3600,
+    "d": 86400,
+    "w": 604800,
+    "y": 31536000,
+}
+
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`[^`]*`')
+_RANGE = re.compile(r"\[\s*([^\]:]+?)\s*(?::\s*([^\]]*?)\s*)?\]")
+_DURATION_PART = re.compile(r"(\d+)(ms|s|m|h|d|w|y)")
+_LABEL_LIST = re.compile(r"\b(by|without|on|ignoring|group_left|group_right)\s*\([^)]*\)")
+_MATCHERS = re.compile(r"\{[^}]*\}")
+_IDENTIFIER = re.compile(r"(?<![\w:.])([a-zA-Z_:][\w:]*)(\s*\()?")
+_AGGREGATION = re.compile(r"\b({})\s*(by|without)?\s*\(".format("|".join(AGGREGATION_OPERATORS)))
+
+
+def duration_seconds(duration: str) -> float:
+    """Converts a Prometheus duration to seconds.
+
+    Args:
+        duration: Prometheus duration, e.g. `1h30m`.
+
+    Returns:
+        float: Number of seconds, 0 if the duration can't be parsed.
+    """
+    return sum(
+        int(value) * DURATION_UNITS_SECONDS[unit]
+        for value, unit in _DURATION_PART.findall(duration)
+    )
+
+
+def estimate(expr: str) -> float:
+    """Estimates the evaluation cost of a PromQL expression.
+
+    Args:
+        expr: PromQL expression.
+
+    Returns:
+        float: Estimated cost.
+    """
+    # String literals may contain anything, matchers and metric names included
+    expr = _STRING.sub('""', expr)
+    cost = REGEX_MATCHER_COST * (expr.count("=~") + expr.count("!~"))
+
+    for match in _RANGE.finditer(expr):
+        range_seconds = duration_seconds(match.group(1))
+        if ":" in match.group(0):
+            step_seconds = duration_seconds(match.group(2) or "") or DEFAULT_SUBQUERY_STEP_SECONDS
+            cost += SUBQUERY_STEP_COST * range_seconds / step_seconds
+        else:
+            cost += RANGE_COST_PER_5M * range_seconds / 300
+    expr = _RANGE.sub("", expr)
+
+    cost += UNGROUPED_AGGREGATION_COST * _ungrouped_aggregations(expr)
+
+    expr = _MATCHERS.sub("{}", _LABEL_LIST.sub("", expr))
+    selectors = 0
+    for match in _IDENTIFIER.finditer(expr):
+        if not match.group(2) and match.group(1).lower() not in KEYWORDS:
+            selectors += 1
+    # Selectors consisting of label matchers only, e.g. `{job="prometheus"}`
+    selectors += len(re.findall(r"(?<![\w:])\{", expr))
+    cost += SELECTOR_COST * selectors
+    return round(cost, 2)
+
+
+def report(tenant_groups: Dict[str, List[dict]]) -> dict:
+    """Estimates evaluation costs of alert rule groups of each tenant.
+
+    Args:
+        tenant_groups: Alert rule groups of each tenant.
+
+    Returns:
+        dict: Total cost (`cost`) and costs of each tenant (`tenants`), each with its total cost
+            (`cost`) and the cost of each of its groups (`groups`).
+    """
+    tenants = {}
+    total_cost = 0.0
+    for tenant, groups in tenant_groups.items():
+        group_costs = {
+            group["name"]: round(sum(estimate(rule["expr"]) for rule in group["rules"]), 2)
+            for group in groups
+        }
+        tenant_cost = round(sum(group_costs.values()), 2)
+        tenants[tenant] = {"cost": tenant_cost, "groups": group_costs}
+        total_cost += tenant_cost
+    return {"cost": round(total_cost, 2), "tenants": tenants}
+
+
+def as_metrics(cost_report: dict) -> str:
+    """Renders a cost report in the Prometheus text exposition format.
+
+    Args:
+        cost_report: Cost report, as returned by `report`.
+
+    Returns:
+        str: Estimated costs of each tenant and group as Prometheus metrics.
+    """
+    lines = [
+        "# HELP prometheus_configurer_rules_estimated_cost Estimated evaluation cost of rules.",
+        "# TYPE prometheus_configurer_rules_estimated_cost gauge",
+    ]
+    for tenant, tenant_report in sorted(cost_report["tenants"].items()):
+        for group, cost in sorted(tenant_report["groups"].items()):
+            lines.append(
+                "prometheus_configurer_rules_estimated_cost"
+                f'{{tenant="{_escape(tenant)}",group="{_escape(group)}"}} {cost}'
+            )
+    return "\n".join(lines) + "\n"
+
+
+def closing_parenthesis(expr: str, start: int) -> int:
+    """Finds the end of a parenthesised subexpression.
+
+    Args:
+        expr: PromQL expression.
+        start: Position of the opening parenthesis.
+
+    Returns:
+        int: Position following the matching closing parenthesis, the end of the expression if
+            there's none.
+    """
+    depth = 0
+    for idx in range(start, len(expr)):
+        if expr[idx] == "(":
+            depth += 1
+        elif expr[idx] == ")":
+            depth -= 1
+            if depth == 0:
+                return idx + 1
+    return len(expr)
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ungrouped_aggregations(expr: str) -> int:
+    ungrouped_aggregations = 0
+    for match in _AGGREGATION.finditer(expr):
+        if match.group(2):
+            continue
+        end = closing_parenthesis(expr, match.end() - 1)
+        if not re.match(r"\s*(by|without)\s*\(", expr[end:]):
+            ungrouped_aggregations += 1
+    return ungrouped_aggregations
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements detection of duplicate alert rules within a tenant.
+The same alert is often created more than once through the Prometheus Configurer API, under
+different names or in several rules files, and Prometheus then evaluates identical expressions
+many times. Rules are compared in a normal form, in which whitespace in expressions, the order of
+label matchers and of grouping labels, and the order of rule labels don't matter.
+Two kinds of duplicates are detected:
+- exact duplicates, which are identical in normal form,
+- semantic duplicates, which are alerts differing only in their names and annotations, so they
+  fire for the very same series.
+Recording rules are only ever considered exact duplicates, as their names are the names of the
+series they produce.
+"""
+
+import json
+import logging
+import re
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`[^`]*`')
+_PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+_SPACE_AROUND_SYMBOL = re.compile(r"\s*([(){}\[\],=!~<>+\-*/%^])\s*")
+_MATCHERS = re.compile(r"\{([^}]*)\}")
+_LABEL_LIST = re.compile(r"\b(by|without|on|ignoring|group_left|group_right)\(([^)]*)\)")
+
+
+def normalise_expr(expr: str) -> str:
+    """Returns the normal form of a PromQL expression.
+
+    Whitespace is collapsed (and dropped around symbols), and label matchers as well as label
+    lists of `by`, `without`, `on`, `ignoring`, `group_left` and `group_right` are sorted.
+    String literals are left untouched.
+
+    Args:
+        expr: PromQL expression.
+
+    Returns:
+        str: Normal form of the expression.
+    """
+    strings = []  # type: List[str]
+
+    def _hide_string(match: re.Match) -> str:
+        strings.append(match.group(0))
+        return f"\x00{len(strings) - 1}\x00"
+
+    def _restore_strings(text: str) -> str:
+        return _PLACEHOLDER.sub(lambda match: strings[int(match.group(1))], text)
+
+    expr = _STRING.sub(_hide_string, str(expr))
+    expr = _SPACE_AROUND_SYMBOL.sub(r"\1", " ".join(expr.split()))
+    expr = _MATCHERS.sub(
+        lambda match: "{"
+        + ",".join(sorted(_restore_strings(m) for m in match.group(1).split(",") if m))
+        + "}",
+        expr,
+    )
+    expr = _LABEL_LIST.sub(
+        lambda match: f"{match.group(1)}({','.join(sorted(match.group(2).split(',')))})", expr
+    )
+    return _restore_strings(expr)
+
+
+def deduplicate(groups: List[dict], collapse: bool) -> Tuple[List[dict], Dict[str, int]]:
+    """Detects duplicate rules in the alert rule groups of a tenant.
+
+    The first occurrence of a rule (in group order) is kept, later ones are duplicates.
+
+    Args:
+        groups: Alert rule groups of a single tenant, sorted by name.
+        collapse: Whether duplicates are dropped. Groups left without rules are dropped as well.
+
+    Returns:
+        tuple: Alert rule groups (without duplicates if collapsed) and the number of `exact` and
+            `semantic` duplicates.
+    """
+    duplicates = {"exact": 0, "semantic": 0}
+    exact_keys = set()
+    semantic_keys = {}  # type: Dict[str, str]
+    deduplicated_groups = []
+    for group in groups:
+        rules = []
+        for rule in group["rules"]:
+            exact_key = _key(rule)
+            semantic_key = _key({**rule, "alert": "", "annotations": {}})
+            if exact_key in exact_keys:
+                duplicates["exact"] += 1
+            elif "alert" in rule and semantic_key in semantic_keys:
+                duplicates["semantic"] += 1
+                logger.info(
+                    "Alert %s in group %s duplicates alert %s",
+                    rule["alert"],
+                    group["name"],
+                    semantic_keys[semantic_key],
+                )
+            else:
+                exact_keys.add(exact_key)
+                if "alert" in rule:
+                    semantic_keys[semantic_key] = rule["alert"]
+                rules.append(rule)
+                continue
+            if not collapse:
+                rules.append(rule)
+        if rules:
+            deduplicated_groups.append({**group, "rules": rules})
+    return deduplicated_groups, duplicates
+
+
+def _key(rule: dict) -> str:
+    return json.dumps({**rule, "expr": normalise_expr(rule["expr"])}, sort_keys=True)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements packing of alert rule groups.
+Prometheus evaluates rule groups concurrently, but rules within a group sequentially. Oversized
+groups are therefore split, so that their evaluation doesn't overrun the evaluation interval, and
+tiny groups are merged, so that Prometheus doesn't have to schedule many near-empty groups.
+Groups are packed by size, which is the number of rules by default or any other per-rule weight
+(e.g. estimated evaluation cost).
+Prometheus keeps the state of alerts (e.g. pending `for` durations) across reloads per group, so
+rules are assigned to packed groups by hashing (rules by their name and labels, tiny groups by
+their name) rather than by position. The number of hash buckets is a power of two, so that when
+it grows, each bucket only sheds rules into a new one: adding or removing a rule leaves the other
+rules in groups of the same name, unless the number of buckets has to change.
+Names of packed groups are derived from the names of the original groups (or, for merged groups,
+from a prefix given by the caller) and never collide with the names of the original groups.
+"""
+
+import hashlib
+import json
+import re
+from typing import Callable, Dict, List, Set
+
+GROUP_NAME_SUFFIX = "_alerts"
+
+
+def pack(
+    groups: List[dict],
+    max_group_size: int = 0,
+    min_group_size: int = 0,
+    weigh: Callable[[dict], int] = lambda rule: 1,
+    merged_name_prefix: str = "",
+) -> List[dict]:
+    """Splits oversized alert rule groups and merges tiny ones.
+
+    Groups containing recording rules are never split, as rules of a group may depend on recording
+    rules evaluated earlier in the same group. Only tiny groups with the same settings (e.g.
+    `interval`) are merged. Packed groups are kept within `max_group_size`, save for rules which
+    are bigger on their own or which share their name and labels with many others, and merged
+    groups are about `min_group_size` big on average.
+
+    Args:
+        groups: Alert rule groups (of a single tenant), sorted by name.
+        max_group_size: Groups bigger than this are split. 0 means groups are not split.
+        min_group_size: Groups smaller than this are merged with each other, as long as the
+            merged group doesn't get bigger than `max_group_size`. 0 means groups are not
+            merged.
+        weigh: Function returning the size of a rule.
+        merged_name_prefix: Prefix of the names of merged groups, which should be unique to the
+            tenant (e.g. its name) when groups of several tenants are published together.
+
+    Returns:
+        list: Packed alert rule groups.
+    """
+    taken = {group["name"] for group in groups}
+    split_groups = []  # type: List[dict]
+    for group in groups:
+        split_groups.extend(_split(group, max_group_size, weigh, taken))
+    if not min_group_size or not split_groups:
+        return split_groups
+    return _merge(split_groups, min_group_size, max_group_size, weigh, merged_name_prefix, taken)
+
+
+def _split(
+    group: dict, max_group_size: int, weigh: Callable[[dict], int], taken: Set[str]
+) -> List[dict]:
+    rules = group["rules"]
+    if (
+        not max_group_size
+        or _group_size(rules, weigh) <= max_group_size
+        or any("record" in rule for rule in rules)
+    ):
+        return [group]
+    buckets = _buckets(rules, _rule_key, weigh, max_group_size, 2)
+    return [
+        {**group, "name": _unique(_derived_name(group["name"], str(idx)), taken), "rules": part}
+        for idx, part in sorted(buckets.items())
+    ]
+
+
+def _merge(
+    groups: List[dict],
+    min_group_size: int,
+    max_group_size: int,
+    weigh: Callable[[dict], int],
+    prefix: str,
+    taken: Set[str],
+) -> List[dict]:
+    packed_groups = []  # type: List[dict]
+    tiny_groups = {}  # type: Dict[str, List[dict]]
+    for group in groups:
+        if _group_size(group["rules"], weigh) >= min_group_size:
+            packed_groups.append(group)
+        else:
+            tiny_groups.setdefault(_settings_key(group), []).append(group)
+    for settings_key, same_settings_groups in tiny_groups.items():
+        total_size = sum(_group_size(group["rules"], weigh) for group in same_settings_groups)
+        count = 1
+        while count * 2 <= total_size // min_group_size:
+            count *= 2
+        buckets = _buckets(
+            same_settings_groups,
+            lambda group: group["name"],
+            lambda group: _group_size(group["rules"], weigh),
+            max_group_size,
+            count,
+        )
+        for idx, members in sorted(buckets.items()):
+            if len(members) == 1:
+                packed_groups.append(members[0])
+                continue
+            part = f"merged_{settings_key[:8]}_{idx}" if settings_key else f"merged_{idx}"
+            if prefix:
+                part = f"{prefix}_{part}"
+            packed_groups.append(
+                {
+                    **members[0],
+                    "name": _unique(f"{part}{GROUP_NAME_SUFFIX}", taken),
+                    "rules": [rule for member in members for rule in member["rules"]],
+                }
+            )
+    return packed_groups
+
+
+def _buckets(
+    items: List[dict],
+    key: Callable[[dict], str],
+    weigh: Callable[[dict], int],
+    max_size: int,
+    count: int,
+) -> Dict[int, List[dict]]:
+    """Assigns items to hash buckets, doubling their number until none is bigger than max_size.
+
+    Returns:
+        dict: Items of each non-empty bucket, in their original order, by bucket index.
+    """
+    hashes = [int(hashlib.sha256(key(item).encode()).hexdigest(), 16) for item in items]
+    # Buckets can't get smaller once each item hashes to a bucket of its own (save for
+    # collisions), which is very likely with 4 times as many buckets as items
+    max_count = 4 * len(items)
+    while True:
+        buckets = {}  # type: Dict[int, List[dict]]
+        for item, item_hash in zip(items, hashes):
+            buckets.setdefault(item_hash % count, []).append(item)
+        if (
+            not max_size
+            or count >= max_count
+            or all(_group_size(bucket, weigh) <= max_size for bucket in buckets.values())
+        ):
+            return buckets
+        count *= 2
+
+
+def _rule_key(rule: dict) -> str:
+    name = rule.get("alert") or rule.get("record", "")
+    return f"{name}/{json.dumps(rule.get('labels', {}), sort_keys=True)}"
+
+
+def _derived_name(group_name: str, part: str) -> str:
+    if group_name.endswith(GROUP_NAME_SUFFIX):
+        return re.sub(f"{GROUP_NAME_SUFFIX}$", f"_{part}{GROUP_NAME_SUFFIX}", group_name)
+    return f"{group_name}_{part}"
+
+
+def _unique(name: str, taken: Set[str]) -> str:
+    """Makes a derived group name unique among original and already derived group names."""
+    unique_name = name
+    suffix = 2
+    while unique_name in taken:
+        unique_name = _derived_name(name, str(suffix))
+        suffix += 1
+    taken.add(unique_name)
+    return unique_name
+
+
+def _group_size(items: List[dict], weigh: Callable[[dict], int]) -> int:
+    return sum(weigh(item) for item in items)
+
+
+def _settings_key(group: dict) -> str:
+    """Returns a short fingerprint of the group settings, empty if there are none."""
+    settings = {key: value for key, value in group.items() if key not in ("name", "rules")}
+    if not settings:
+        return ""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements serialisation of the alert rules payload which Prometheus Configurer
+publishes to Prometheus through the `prometheus` relation data bag.
+Serialisation is canonical: groups are sorted by name, dictionary keys are sorted and compact
+separators are used, so identical rule sets always produce identical bytes regardless of the order
+in which rule files were discovered. This makes the payload's fingerprint usable for change
+detection and caching by the charm and by the Prometheus side.
+`orjson` is used for serialisation when it's installed, standard library `json` otherwise.
+Serialised payloads can optionally be compressed before they are written to the data bag, provided
+the Prometheus side advertises support for the given encoding. Large payloads can also be split
+into chunks of whole groups, so that only chunks which changed need to be rewritten.
+Labels shared by all rules of a group (e.g. Juju topology labels) can be hoisted to the group
+level, provided the Prometheus side advertises support for it, which makes big payloads
+considerably smaller.
+"""
+
+import base64
+import hashlib
+import json
+import zlib
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+ENCODINGS = ["zlib"]
+
+# Groups whose name hashes to a multiple of this number end a chunk (once it's at least half full),
+# so that chunk boundaries don't shift when groups in preceding chunks change size.
+CHUNK_BOUNDARY_MODULUS = 8
+
+
+def canonicalise(alert_rules: dict) -> dict:
+    """Returns a copy of the alert rules with groups in deterministic order.
+
+    Rules within a group keep their order, as it's meaningful to Prometheus (rules in a group
+    are evaluated sequentially) and is already fixed by the rules file the group comes from.
+
+    Args:
+        alert_rules: Alert rules in the form returned by `AlertRules.as_dict()`.
+
+    Returns:
+        dict: Alert rules with groups sorted by name.
+    """
+    if "groups" not in alert_rules:
+        return alert_rules
+    return {
+        **alert_rules,
+        "groups": sorted(alert_rules["groups"], key=lambda group: group["name"]),
+    }
+
+
+def dumps(alert_rules: dict) -> str:
+    """Serialises alert rules to canonical, compact JSON.
+
+    Args:
+        alert_rules: Alert rules in the form returned by `AlertRules.as_dict()`.
+
+    Returns:
+        str: Canonical JSON representation of the alert rules.
+    """
+    return _dumps(canonicalise(alert_rules))
+
+
+def split(alert_rules: dict, chunk_size: int) -> List[str]:
+    """Splits alert rules into canonical payloads of whole groups.
+
+    Groups are added to a chunk until the next one would make it exceed `chunk_size` bytes or
+    until a chunk boundary group is reached. A single group bigger than `chunk_size` makes up a
+    chunk of its own.
+
+    Args:
+        alert_rules: Alert rules in the form returned by `AlertRules.as_dict()`.
+        chunk_size: Maximum size of a chunk in bytes.
+
+    Returns:
+        list: Canonical JSON payloads, each in the form of `{"groups": [...]}`.
+    """
+    chunks = []  # type: List[str]
+    chunk_groups = []  # type: List[str]
+    chunk_bytes = 0
+    for group in canonicalise(alert_rules).get("groups", []):
+        serialised_group = _dumps(group)
+        group_bytes = len(serialised_group.encode())
+        if chunk_groups and chunk_bytes + group_bytes > chunk_size:
+            chunks.append(_join_groups(chunk_groups))
+            chunk_groups, chunk_bytes = [], 0
+        chunk_groups.append(serialised_group)
+        chunk_bytes += group_bytes
+        if chunk_bytes >= chunk_size // 2 and _is_chunk_boundary(group["name"]):
+            chunks.append(_join_groups(chunk_groups))
+            chunk_groups, chunk_bytes = [], 0
+    if chunk_groups:
+        chunks.append(_join_groups(chunk_groups))
+    return chunks
+
+
+def hoist_labels(groups: List[dict]) -> List[dict]:
+    """Moves labels shared by all rules of each group to the group level.
+
+    Rules which are left without labels lose their `labels` field. Groups with a single rule are
+    left as they are, as hoisting their labels doesn't make them any smaller.
+
+    Args:
+        groups: Alert rule groups.
+
+    Returns:
+        list: Alert rule groups with shared labels in their `labels` field.
+    """
+    hoisted_groups = []
+    for group in groups:
+        rules = group["rules"]
+        if len(rules) < 2:
+            hoisted_groups.append(group)
+            continue
+        shared_labels = {
+            label: value
+            for label, value in rules[0].get("labels", {}).items()
+            if all(rule.get("labels", {}).get(label, None) == value for rule in rules[1:])
+        }
+        if not shared_labels:
+            hoisted_groups.append(group)
+            continue
+        hoisted_rules = []
+        for rule in rules:
+            rule = dict(rule)
+            labels = {
+                label: value
+                for label, value in rule.pop("labels").items()
+                if label not in shared_labels
+            }
+            if labels:
+                rule["labels"] = labels
+            hoisted_rules.append(rule)
+        hoisted_groups.append(
+            {
+                **group,
+                "labels": {**group.get("labels", {}), **shared_labels},
+                "rules": hoisted_rules,
+            }
+        )
+    return hoisted_groups
+
+
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+        except TypeError:
+            # Non-string keys and other types orjson is strict about are left to `json`
+            pass
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _join_groups(serialised_groups: List[str]) -> str:
+    return '{"groups":[' + ",".join(serialised_groups) + "]}"
+
+
+def _is_chunk_boundary(group_name: str) -> bool:
+    return (
+        int(hashlib.sha256(group_name.encode()).hexdigest()[:8], 16) % CHUNK_BOUNDARY_MODULUS == 0
+    )
+
+
+def fingerprint(payload: str) -> str:
+    """Returns a stable fingerprint of a serialised payload.
+
+    Args:
+        payload: Payload serialised with `dumps`.
+
+    Returns:
+        str: Hex encoded SHA-256 digest of the payload.
+    """
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def encode(payload: str, encoding: str) -> str:
+    """Encodes a serialised payload for the relation data bag.
+
+    Args:
+        payload: Payload serialised with `dumps`.
+        encoding: One of `ENCODINGS` or an empty string for no encoding.
+
+    Returns:
+        str: Encoded payload.
+
+    Raises:
+        ValueError: If the encoding isn't supported.
+    """
+    if not encoding:
+        return payload
+    if encoding == "zlib":
+        return base64.b64encode(zlib.compress(payload.encode())).decode()
+    raise ValueError(f"Unsupported alert rules encoding: {encoding}")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements on-demand profiling of the alert rules pipeline.
+A function (e.g. a full rebuild of alert rules) is run once under both `cProfile` and
+`tracemalloc`. The slowest functions are summarised in a table, along with the peak memory
+allocated while it ran, and the raw profile is saved for offline analysis (e.g. with `pstats` or
+`snakeviz`). Profiling slows the function down considerably, so durations are only meaningful
+relative to one another.
+"""
+
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Any, Callable
+
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+def profile(
+    function: Callable[[], Any], path: str, top: int = 20, sort: str = "cumulative"
+) -> dict:
+    """Profiles a function.
+
+    Args:
+        function: Function to profile, called without arguments.
+        path: Path to save the raw profile to.
+        top: Number of functions to report.
+        sort: Key to sort functions by, one of `SORT_KEYS`.
+
+    Returns:
+        dict: Hotspots table (`hotspots`), peak memory allocated in bytes (`peak_memory`),
+            duration in seconds (`duration`) and the return value of the function (`result`).
+
+    Raises:
+        ValueError: If the sort key is not supported.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"unsupported sort key: {sort}, expected one of: {', '.join(SORT_KEYS)}")
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Resets the peak as well
+        tracemalloc.clear_traces()
+    else:
+        tracemalloc.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = function()
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    profiler.dump_stats(path)
+    return {
+        "hotspots": hotspots(pstats.Stats(profiler), top, sort),
+        "peak_memory": peak_memory,
+        "duration": round(duration, 6),
+        "result": result,
+    }
+
+
+def hotspots(stats: pstats.Stats, top: int, sort: str) -> str:
+    """Renders the functions taking the most time as a table.
+
+    Args:
+        stats: Profile statistics.
+        top: Number of functions to report.
+        sort: Key to sort functions by, one of `SORT_KEYS`.
+
+    Returns:
+        str: Number of calls, own time and cumulative time (in seconds) of the top functions.
+    """
+    rows = []
+    entries = stats.stats.items()  # type: ignore[attr-defined]
+    for (file_name, line, function_name), (_, ncalls, tottime, cumtime, _) in entries:
+        rows.append((ncalls, tottime, cumtime, _location(file_name, line, function_name)))
+    key_index = {"ncalls": 0, "tottime": 1, "cumulative": 2}[sort]
+    rows.sort(key=lambda row: row[key_index], reverse=True)
+    lines = [f"{'ncalls':>10} {'tottime':>10} {'cumtime':>10}  function"]
+    for ncalls, tottime, cumtime, location in rows[:top]:
+        lines.append(f"{ncalls:>10} {tottime:>10.4f} {cumtime:>10.4f}  {location}")
+    return "\n".join(lines)
+
+
+def _location(file_name: str, line: int, function_name: str) -> str:
+    if file_name == "~":
+        # Built-in functions
+        return function_name
+    return f"{_short_path(file_name)}:{line}({function_name})"
+
+
+def _short_path(file_name: str) -> str:
+    parts = file_name.split(os.sep)
+    return os.sep.join(parts[-2:])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements admission control of alert rules of each tenant.
+A single tenant pushing too many or too expensive rules through the Prometheus Configurer API
+slows down rules evaluation for all tenants. Quotas (`max_rules`, `max_expr_length` and
+`max_cost`) can therefore be set for all tenants or for particular ones. Rules of a tenant
+exceeding any of its quotas are not admitted, and the charm keeps publishing the last rule set of
+that tenant which was within its quotas.
+"""
+
+from typing import Dict, List
+
+import yaml
+
+import alert_rules_cost
+
+QUOTAS = ("max_rules", "max_expr_length", "max_cost")
+
+
+def parse_quotas(quotas: dict) -> dict:
+    """Validates tenant quotas.
+
+    Args:
+        quotas: Tenant quotas, any of `max_rules`, `max_expr_length` and `max_cost`. Empty values
+            are ignored.
+
+    Returns:
+        dict: Tenant quotas with empty values dropped.
+
+    Raises:
+        ValueError: If quotas are invalid.
+    """
+    if not isinstance(quotas, dict):
+        raise ValueError(f"quotas must be a mapping, got: {quotas}")
+    parsed_quotas = {}
+    for key, value in quotas.items():
+        if key not in QUOTAS:
+            raise ValueError(f"unsupported quota: {key}")
+        if value in (None, "", 0):
+            continue
+        if key == "max_cost":
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"max_cost must be a non-negative number, got: {value}")
+        elif not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"{key} must be a non-negative integer, got: {value}")
+        parsed_quotas[key] = value
+    return parsed_quotas
+
+
+def parse_tenant_quotas(tenant_quotas: str) -> Dict[str, dict]:
+    """Parses and validates quotas of particular tenants.
+
+    Args:
+        tenant_quotas: YAML mapping of tenants to their quotas.
+
+    Returns:
+        dict: Quotas of each tenant.
+
+    Raises:
+        ValueError: If quotas are invalid.
+    """
+    try:
+        parsed_tenant_quotas = yaml.safe_load(tenant_quotas) or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"invalid YAML: {e}")
+    if not isinstance(parsed_tenant_quotas, dict):
+        raise ValueError("tenant quotas must be a mapping of tenants to quotas")
+    return {str(tenant): parse_quotas(quotas) for tenant, quotas in parsed_tenant_quotas.items()}
+
+
+def violations(groups: List[dict], quotas: dict) -> List[str]:
+    """Checks alert rule groups of a tenant against the tenant's quotas.
+
+    Args:
+        groups: Alert rule groups of a single tenant.
+        quotas: Quotas of the tenant, as returned by `parse_quotas`.
+
+    Returns:
+        list: Descriptions of the quotas exceeded, empty if the rules are within all quotas.
+    """
+    rules = [rule for group in groups for rule in group["rules"]]
+    exceeded = []
+    max_rules = quotas.get("max_rules")
+    if max_rules and len(rules) > max_rules:
+        exceeded.append(f"{len(rules)} rules exceed max_rules {max_rules}")
+    max_expr_length = quotas.get("max_expr_length")
+    if max_expr_length:
+        expr_length = max((len(str(rule["expr"])) for rule in rules), default=0)
+        if expr_length > max_expr_length:
+            exceeded.append(
+                f"expression of {expr_length} characters exceeds max_expr_length "
+                f"{max_expr_length}"
+            )
+    max_cost = quotas.get("max_cost")
+    if max_cost:
+        cost = round(sum(alert_rules_cost.estimate(str(rule["expr"])) for rule in rules), 2)
+        if cost > max_cost:
+            exceeded.append(f"estimated cost {cost} exceeds max_cost {max_cost}")
+    return exceeded
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements extraction of common subexpressions of alert rules to recording rules.
+Alerts of a tenant often repeat the same costly subexpressions, e.g. `rate(...)` or
+`histogram_quantile(...)`, which Prometheus then computes once per alert. Subexpressions shared
+by enough alerts of a tenant are extracted to recording rules, and the alerts are rewritten to
+select the recorded series instead, so that each subexpression is computed once per interval.
+Only calls of functions in `EXTRACTABLE_FUNCTIONS` are extracted, outermost calls first.
+Subexpressions are identified by their normal form, so that differences in whitespace or label
+matchers order don't prevent them from being shared. Names of recording rules are derived from
+the normal form, so they are stable as long as the subexpressions don't change.
+Recording rules of a tenant are published in a group of their own. As groups are evaluated
+independently, alerts may see recorded series up to one evaluation interval old.
+Recording rules are labelled with the Juju topology and the tenant, like the alerts using them,
+as Prometheus tells which application and tenant a rule belongs to by its labels.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import alert_rules_cost
+import alert_rules_dedup
+import alert_rules_payload
+
+EXTRACTABLE_FUNCTIONS = (
+    "rate",
+    "irate",
+    "increase",
+    "delta",
+    "idelta",
+    "deriv",
+    "histogram_quantile",
+    "avg_over_time",
+    "min_over_time",
+    "max_over_time",
+    "sum_over_time",
+    "count_over_time",
+    "quantile_over_time",
+)
+RECORDING_GROUP_NAME = "recording_rules"
+
+_EXTRACTABLE_CALL = re.compile(r"(?<![\w:])({})\s*\(".format("|".join(EXTRACTABLE_FUNCTIONS)))
+_EQUALITY_MATCHER = re.compile(r'([a-zA-Z_]\w*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+
+
+def extract(
+    groups: List[dict], tenant: str, min_alerts: int, labels: Optional[Dict[str, str]] = None
+) -> List[dict]:
+    """Extracts subexpressions shared by alerts of a tenant to recording rules.
+
+    Args:
+        groups: Alert rule groups of a single tenant.
+        tenant: The tenant, used to name the group of recording rules.
+        min_alerts: Minimum number of alerts sharing a subexpression for it to be extracted.
+        labels: Labels set on every recording rule (e.g. Juju topology and the tenant).
+
+    Returns:
+        list: Alert rule groups with alerts rewritten, followed by a group of recording rules if
+            any subexpression was extracted.
+    """
+    users = {}  # type: Dict[str, List[dict]]
+    subexpressions = {}  # type: Dict[str, str]
+    for group in groups:
+        for rule in group["rules"]:
+            if "alert" not in rule:
+                continue
+            for key, subexpression in {
+                alert_rules_dedup.normalise_expr(subexpression): subexpression
+                for _, _, subexpression in _calls(str(rule["expr"]))
+            }.items():
+                users.setdefault(key, []).append(rule)
+                subexpressions.setdefault(key, subexpression)
+    records = {
+        key: _record_name(key) for key, rules in users.items() if len(rules) >= max(min_alerts, 2)
+    }
+    if not records:
+        return groups
+
+    rewritten_groups = [
+        {
+            **group,
+            "rules": [
+                {**rule, "expr": _rewrite(str(rule["expr"]), records)} if "alert" in rule else rule
+                for rule in group["rules"]
+            ],
+        }
+        for group in groups
+    ]
+    recording_rules = [
+        {
+            "record": record,
+            "expr": subexpressions[key],
+            "labels": {
+                **_common_matched_labels(subexpressions[key], users[key]),
+                **(labels or {}),
+            },
+        }
+        for key, record in sorted(records.items(), key=lambda item: item[1])
+    ]
+    group_name = f"{RECORDING_GROUP_NAME}_{tenant}" if tenant else RECORDING_GROUP_NAME
+    return rewritten_groups + [{"name": group_name, "rules": recording_rules}]
+
+
+def _calls(expr: str) -> List[Tuple[int, int, str]]:
+    calls = []  # type: List[Tuple[int, int, str]]
+    position = 0
+    while True:
+        match = _EXTRACTABLE_CALL.search(expr, position)
+        if not match:
+            return calls
+        start = match.start()
+        end = alert_rules_cost.closing_parenthesis(expr, match.end() - 1)
+        calls.append((start, end, expr[start:end]))
+        position = end
+
+
+def _rewrite(expr: str, records: Dict[str, str]) -> str:
+    for start, end, subexpression in reversed(_calls(expr)):
+        record = records.get(alert_rules_dedup.normalise_expr(subexpression))
+        if record:
+            expr = expr[:start] + record + expr[end:]
+    return expr
+
+
+def _record_name(key: str) -> str:
+    function = key.split("(", 1)[0]
+    return f"cse:{function}:{alert_rules_payload.fingerprint(key)[:12]}"
+
+
+def _common_matched_labels(subexpression: str, rules: List[dict]) -> dict:
+    # Only labels the recorded series already have (as they're matched by equality) are set, so
+    # that the recorded series have the same labels as the subexpression itself.
+    matchers = dict(_EQUALITY_MATCHER.findall(subexpression))
+    return {
+        label: value
+        for label, value in rules[0].get("labels", {}).items()
+        if matchers.get(label) == str(value)
+        and all(rule.get("labels", {}).get(label) == value for rule in rules)
+    }
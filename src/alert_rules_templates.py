@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements rule templates expanded for each tenant bound to them.
+Baseline rule packs shared by many tenants are stored once, as rule templates, rather than as a
+copy per tenant on the rules volume. A template is a rules file (in the official Prometheus format
+or in the single rule format) whose name, without suffix, is the name of the template. Templates
+are bound to tenants in the charm config and expanded for each of them when the alert rules
+payload is built: `%%tenant%%` placeholders are replaced with the tenant and every rule is labelled
+with the tenant it's expanded for.
+A template bound to many tenants is parsed once per hook: parsed templates are only cached in the
+memory of the hook's process, so every hook parses the templates it expands anew.
+"""
+
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = (".rule", ".rules", ".yml", ".yaml")
+TENANT_PLACEHOLDER = "%%tenant%%"
+
+
+def parse_bindings(bindings: str) -> Dict[str, List[str]]:
+    """Parses and validates bindings of rule templates to tenants.
+
+    Args:
+        bindings: YAML mapping of tenants to lists of template names.
+
+    Returns:
+        dict: Template names bound to each tenant.
+
+    Raises:
+        ValueError: If bindings are invalid.
+    """
+    try:
+        parsed_bindings = yaml.safe_load(bindings) or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"invalid YAML: {e}")
+    if not isinstance(parsed_bindings, dict) or not all(
+        isinstance(templates, list) for templates in parsed_bindings.values()
+    ):
+        raise ValueError("rule template bindings must be a mapping of tenants to template lists")
+    return {
+        str(tenant): [str(template) for template in templates]
+        for tenant, templates in parsed_bindings.items()
+    }
+
+
+def find(templates_dir: str, name: str) -> Optional[Path]:
+    """Finds the file of a rule template.
+
+    Args:
+        templates_dir: Directory holding rule templates.
+        name: Name of the template.
+
+    Returns:
+        Path: The template file, None if there's no such template.
+    """
+    for suffix in TEMPLATE_SUFFIXES:
+        path = Path(templates_dir) / f"{name}{suffix}"
+        if path.is_file():
+            return path
+    return None
+
+
+def load(path: Path) -> str:
+    """Loads a rule template.
+
+    Args:
+        path: The template file.
+
+    Returns:
+        str: Alert rule groups of the template, serialised to JSON. Empty list if the template is
+            invalid.
+    """
+    stat = os.stat(path)
+    return _load(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def expand(template: str, template_name: str, tenant: str, multitenant_label: str) -> List[dict]:
+    """Expands a rule template for a tenant.
+
+    Args:
+        template: Alert rule groups of the template, as returned by `load`.
+        template_name: Name of the template.
+        tenant: The tenant to expand the template for.
+        multitenant_label: Name of the label holding the tenant.
+
+    Returns:
+        list: Alert rule groups of the tenant, named after the tenant and the template.
+    """
+    groups = json.loads(template.replace(TENANT_PLACEHOLDER, json.dumps(tenant)[1:-1]))
+    for group in groups:
+        group["name"] = f"{tenant}_{template_name}_{group['name']}"
+        for rule in group["rules"]:
+            rule.setdefault("labels", {})[multitenant_label] = tenant
+    return groups
+
+
+@functools.lru_cache(maxsize=None)
+def _load(path: str, mtime_ns: int, size: int) -> str:
+    logger.debug("Parsing rule template %s", path)
+    try:
+        with open(path) as template_file:
+            rules_file = yaml.safe_load(template_file)
+    except (OSError, yaml.YAMLError) as e:
+        logger.error("Failed to read rule template %s: %s", path, e)
+        return "[]"
+    if isinstance(rules_file, dict) and "groups" in rules_file:
+        groups = rules_file["groups"]
+    elif isinstance(rules_file, dict) and "expr" in rules_file:
+        groups = [{"name": Path(path).stem, "rules": [rules_file]}]
+    else:
+        logger.error("Invalid rule template: %s", path)
+        return "[]"
+    return json.dumps(groups)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements partitioning of alert rule groups by tenant.
+Prometheus Configurer writes a separate rules file for each tenant and labels every rule with
+the tenant it belongs to (the label name is configured by the `multitenant_label` config option).
+Building and fingerprinting alert rule groups per tenant lets the charm tell which tenants changed
+since the alert rules were last published, so that processing on the Prometheus side can be
+limited to those tenants.
+"""
+
+from typing import Dict, List
+
+import alert_rules_payload
+
+DEFAULT_MULTITENANT_LABEL = "tenant"
+
+
+def tenant_of(group: dict, multitenant_label: str) -> str:
+    """Returns the tenant an alert rule group belongs to.
+
+    Args:
+        group: Alert rule group.
+        multitenant_label: Name of the label holding the tenant.
+
+    Returns:
+        str: The tenant of the first rule in the group which has one, an empty string if none has.
+    """
+    for rule in group.get("rules", []):
+        tenant = rule.get("labels", {}).get(multitenant_label)
+        if tenant:
+            return str(tenant)
+    return ""
+
+
+def partition(groups: List[dict], multitenant_label: str) -> Dict[str, List[dict]]:
+    """Partitions alert rule groups by tenant.
+
+    Args:
+        groups: Alert rule groups.
+        multitenant_label: Name of the label holding the tenant.
+
+    Returns:
+        dict: Alert rule groups of each tenant, sorted by group name.
+    """
+    tenant_groups = {}  # type: Dict[str, List[dict]]
+    for group in groups:
+        tenant_groups.setdefault(tenant_of(group, multitenant_label), []).append(group)
+    for groups_of_tenant in tenant_groups.values():
+        groups_of_tenant.sort(key=lambda group: group["name"])
+    return tenant_groups
+
+
+def fingerprints(tenant_groups: Dict[str, List[dict]]) -> Dict[str, str]:
+    """Returns fingerprints of the alert rule groups of each tenant.
+
+    Args:
+        tenant_groups: Alert rule groups of each tenant.
+
+    Returns:
+        dict: Fingerprint of each tenant's canonically serialised alert rule groups.
+    """
+    return {
+        tenant: alert_rules_payload.fingerprint(alert_rules_payload.dumps({"groups": groups}))
+        for tenant, groups in tenant_groups.items()
+    }
+
+
+def changed(
+    previous_fingerprints: Dict[str, str], current_fingerprints: Dict[str, str]
+) -> List[str]:
+    """Returns tenants whose alert rule groups were added, changed or removed.
+
+    Args:
+        previous_fingerprints: Tenant fingerprints as last published.
+        current_fingerprints: Current tenant fingerprints.
+
+    Returns:
+        list: Sorted list of changed tenants.
+    """
+    return sorted(
+        tenant
+        for tenant in set(previous_fingerprints) | set(current_fingerprints)
+        if previous_fingerprints.get(tenant) != current_fingerprints.get(tenant)
+    )
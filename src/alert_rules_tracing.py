@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements tracing of alert rules changes, from the change to its publishing.
+The background process detecting a change (the rules directory watcher or the reload webhook)
+starts a trace: it creates a trace context carrying a trace ID and the times the change was
+written, observed and dispatched. The context travels to the charm along with the change, in the
+environment of the dispatched hook or in the data of the Pebble custom notice. The charm then
+closes the trace once it's done handling the change, giving one span per leg:
+- `alert_rules.detect`, from the write of the change to its observation,
+- `alert_rules.dispatch`, from the observation of the change to the start of the hook,
+- `alert_rules.hook`, for the whole hook, with the stages of interest (e.g. rebuilding and
+  publishing alert rules) as child spans,
+all under an `alert_rules.change` root span covering the change end to end.
+Spans are appended as JSON lines to a local, bounded file and, optionally, exported to an
+OpenTelemetry collector with OTLP over HTTP (JSON encoding).
+Pebble coalesces notices of changes arriving while one is pending, keeping the data of the last
+one, so only the last of coalesced changes is traced.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Set in the environment of hooks dispatched by background processes
+TRACE_CONTEXT_ENV = "ALERT_RULES_TRACE_CONTEXT"
+TIMESTAMPS = ("written", "observed", "dispatched")
+MAX_TRACES_FILE_SIZE = 1024 * 1024
+OTLP_TRACES_PATH = "/v1/traces"
+OTLP_TIMEOUT = 2.0
+SERVICE_NAME = "prometheus-configurer-k8s"
+
+
+def new_context(source: str, written: Optional[float] = None) -> Dict[str, str]:
+    """Starts a trace for a change observed now.
+
+    Args:
+        source: What observed the change (e.g. `watchdog`).
+        written: Time the change was written (e.g. modification time of the changed file), if
+            known, otherwise the change is assumed to have been written when it was observed.
+
+    Returns:
+        dict: Trace context, with all values as strings so that it fits Pebble notice data.
+    """
+    observed = time.time()
+    return {
+        "trace_id": os.urandom(16).hex(),
+        "span_id": os.urandom(8).hex(),
+        "source": source,
+        "written": repr(min(written, observed) if written is not None else observed),
+        "observed": repr(observed),
+    }
+
+
+def dispatched(context: Dict[str, str]) -> Dict[str, str]:
+    """Stamps a trace context with the time the change is dispatched to the charm.
+
+    Args:
+        context: Trace context, as returned by `new_context`.
+
+    Returns:
+        dict: Trace context, with the dispatch time added.
+    """
+    return {**context, "dispatched": repr(time.time())}
+
+
+def parse_context(data: Optional[Mapping[str, str]]) -> Optional[Dict[str, str]]:
+    """Validates a trace context received by the charm.
+
+    Args:
+        data: Trace context, e.g. Pebble notice data.
+
+    Returns:
+        dict: Trace context, or None if there's none or it's invalid.
+    """
+    if not data or "trace_id" not in data:
+        return None
+    try:
+        int(data["trace_id"], 16)
+        int(data["span_id"], 16)
+        for timestamp in TIMESTAMPS:
+            float(data[timestamp])
+    except (KeyError, ValueError) as e:
+        logger.debug("Invalid trace context %s: %s", data, e)
+        return None
+    return dict(data)
+
+
+def context_from_environment() -> Optional[Dict[str, str]]:
+    """Reads the trace context set in the environment of a dispatched hook.
+
+    Returns:
+        dict: Trace context, or None if there's none or it's invalid.
+    """
+    value = os.environ.get(TRACE_CONTEXT_ENV)
+    if not value:
+        return None
+    try:
+        data = json.loads(value)
+    except ValueError:
+        logger.debug("Invalid trace context in the environment: %s", value)
+        return None
+    return parse_context(data) if isinstance(data, dict) else None
+
+
+class Trace:
+    def __init__(self, context: Optional[Dict[str, str]], hook: str, hook_started: float):
+        """Trace of the handling of an alert rules change by a hook.
+
+        Args:
+            context: Trace context of the change, or None if the hook doesn't handle a traced
+                change, in which case nothing is recorded.
+            hook: Name of the hook.
+            hook_started: Time the hook started.
+        """
+        self.context = context
+        self.hook = hook
+        self.hook_started = hook_started
+        self.hook_span_id = os.urandom(8).hex()
+        self.spans: List[dict] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[dict]:
+        """Records a stage of the hook as a child span of the hook span.
+
+        Args:
+            name: Name of the span.
+            attributes: Attributes of the span known upfront.
+
+        Yields:
+            dict: Attributes of the span, which more attributes can be added to.
+        """
+        start = time.time()
+        try:
+            yield attributes
+        finally:
+            if self.context:
+                self.spans.append(
+                    self._span(name, start, time.time(), self.hook_span_id, attributes)
+                )
+
+    def finish(self) -> List[dict]:
+        """Closes the trace with the hook ending now.
+
+        Returns:
+            list: All spans of the trace, the root span first, or none if the hook doesn't
+                handle a traced change.
+        """
+        if not self.context:
+            return []
+        ended = time.time()
+        written, observed = float(self.context["written"]), float(self.context["observed"])
+        dispatched = float(self.context["dispatched"])
+        root_span_id = self.context["span_id"]
+        spans = [
+            self._span(
+                "alert_rules.change",
+                written,
+                ended,
+                "",
+                {"source": self.context.get("source", ""), "latency_ms": _ms(ended - written)},
+                span_id=root_span_id,
+            ),
+            self._span("alert_rules.detect", written, observed, root_span_id, {}),
+            self._span(
+                "alert_rules.dispatch",
+                observed,
+                self.hook_started,
+                root_span_id,
+                {"queued_ms": _ms(self.hook_started - dispatched)},
+            ),
+            self._span(
+                "alert_rules.hook",
+                self.hook_started,
+                ended,
+                root_span_id,
+                {"hook": self.hook},
+                span_id=self.hook_span_id,
+            ),
+            *self.spans,
+        ]
+        self.spans = []
+        return spans
+
+    def _span(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        parent_span_id: str,
+        attributes: dict,
+        span_id: Optional[str] = None,
+    ) -> dict:
+        return {
+            "trace_id": self.context["trace_id"] if self.context else "",
+            "span_id": span_id or os.urandom(8).hex(),
+            "parent_span_id": parent_span_id,
+            "name": name,
+            "start_time_unix_nano": int(start * 1e9),
+            "end_time_unix_nano": int(max(start, end) * 1e9),
+            "attributes": dict(attributes),
+        }
+
+
+def write(spans: List[dict], path: str, max_size: int = MAX_TRACES_FILE_SIZE) -> None:
+    """Appends spans to a file, one JSON line per span.
+
+    Args:
+        spans: Spans, as returned by `Trace.finish`.
+        path: Path of the traces file.
+        max_size: Size in bytes the traces file is rotated at.
+    """
+    if not spans:
+        return
+    lines = "".join(json.dumps(span) + "\n" for span in spans)
+    try:
+        if os.path.exists(path) and os.path.getsize(path) + len(lines) > max_size:
+            os.replace(path, f"{path}.1")
+        with open(path, "a") as traces_file:
+            traces_file.write(lines)
+    except OSError as e:
+        logger.warning("Failed to write alert rules traces: %s", e)
+
+
+def export(spans: List[dict], endpoint: str, timeout: float = OTLP_TIMEOUT) -> bool:
+    """Exports spans to an OpenTelemetry collector with OTLP over HTTP, JSON encoded.
+
+    Args:
+        spans: Spans, as returned by `Trace.finish`.
+        endpoint: Base URL of the collector's OTLP HTTP receiver (e.g. `http://localhost:4318`).
+        timeout: Timeout of the export request, in seconds.
+
+    Returns:
+        bool: Whether spans were exported.
+    """
+    if not spans:
+        return False
+    import urllib.error
+    import urllib.request
+
+    request = urllib.request.Request(
+        endpoint.rstrip("/") + OTLP_TRACES_PATH,
+        data=json.dumps(otlp_payload(spans)).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.warning("Failed to export alert rules traces to %s: %s", endpoint, e)
+        return False
+    return True
+
+
+def otlp_payload(spans: List[dict]) -> dict:
+    """Converts spans to an OTLP `ExportTraceServiceRequest`, JSON encoded.
+
+    Args:
+        spans: Spans, as returned by `Trace.finish`.
+
+    Returns:
+        dict: Request body.
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [
+                            {
+                                "traceId": span["trace_id"],
+                                "spanId": span["span_id"],
+                                "parentSpanId": span["parent_span_id"],
+                                "name": span["name"],
+                                "kind": 1,
+                                "startTimeUnixNano": str(span["start_time_unix_nano"]),
+                                "endTimeUnixNano": str(span["end_time_unix_nano"]),
+                                "attributes": _otlp_attributes(span["attributes"]),
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_attributes(attributes: dict) -> List[dict]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            values.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            values.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            values.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            values.append({"key": key, "value": {"stringValue": str(value)}})
+    return values
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements tuning of alert rule groups evaluation.
+By default, every rule group inherits the global `evaluation_interval` of Prometheus. Group
+settings (`interval`, `limit` and `query_offset`) can be set for all groups or for the groups of
+particular tenants, so that e.g. low-priority tenants are evaluated less often.
+Evaluation of groups sharing the same interval is staggered by Prometheus itself: each group is
+evaluated at an offset within its interval derived from a hash of the group's name. As group names
+are deterministic, so are these offsets.
+"""
+
+import re
+from typing import Dict, List
+
+import yaml
+
+GROUP_SETTINGS = ("interval", "limit", "query_offset")
+DURATION_PATTERN = re.compile(r"^(\d+(ms|s|m|h|d|w|y))+$")
+
+
+def parse_settings(settings: dict) -> dict:
+    """Validates group settings.
+
+    Args:
+        settings: Group settings, any of `interval`, `limit` and `query_offset`. Empty values are
+            ignored.
+
+    Returns:
+        dict: Group settings with empty values dropped.
+
+    Raises:
+        ValueError: If settings are invalid.
+    """
+    if not isinstance(settings, dict):
+        raise ValueError(f"group settings must be a mapping, got: {settings}")
+    parsed_settings = {}
+    for key, value in settings.items():
+        if key not in GROUP_SETTINGS:
+            raise ValueError(f"unsupported group setting: {key}")
+        if value in (None, "", 0):
+            continue
+        if key == "limit":
+            if not isinstance(value, int) or value < 0:
+                raise ValueError(f"limit must be a non-negative integer, got: {value}")
+        elif not DURATION_PATTERN.match(str(value)):
+            raise ValueError(f"{key} must be a duration (e.g. 1m), got: {value}")
+        parsed_settings[key] = value
+    return parsed_settings
+
+
+def parse_tenant_settings(tenant_settings: str) -> Dict[str, dict]:
+    """Parses and validates per-tenant group settings.
+
+    Args:
+        tenant_settings: YAML mapping of tenants to their group settings.
+
+    Returns:
+        dict: Group settings of each tenant.
+
+    Raises:
+        ValueError: If settings are invalid.
+    """
+    try:
+        parsed_tenant_settings = yaml.safe_load(tenant_settings) or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"invalid YAML: {e}")
+    if not isinstance(parsed_tenant_settings, dict):
+        raise ValueError("tenant group settings must be a mapping of tenants to group settings")
+    return {
+        str(tenant): parse_settings(settings)
+        for tenant, settings in parsed_tenant_settings.items()
+    }
+
+
+def apply(groups: List[dict], settings: dict) -> List[dict]:
+    """Applies group settings to alert rule groups which don't set them already.
+
+    Args:
+        groups: Alert rule groups.
+        settings: Group settings, as returned by `parse_settings`.
+
+    Returns:
+        list: Alert rule groups with settings applied.
+    """
+    if not settings:
+        return groups
+    return [{**settings, **group} for group in groups]
@@ -2,49 +2,106 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import hashlib
 import json
 import logging
+import math
+import os
+import signal
+import time
+from typing import Dict, List, Optional, Tuple
 
 from charms.observability_libs.v0.juju_topology import JujuTopology
-from charms.observability_libs.v1.kubernetes_service_patch import (
-    KubernetesServicePatch,
-    ServicePort,
+from ops.charm import (
+    ActionEvent,
+    CharmBase,
+    ConfigChangedEvent,
+    LeaderElectedEvent,
+    PebbleCustomNoticeEvent,
+    PebbleReadyEvent,
+    RelationJoinedEvent,
+    UpdateStatusEvent,
+    UpgradeCharmEvent,
 )
-from charms.prometheus_k8s.v0.prometheus_remote_write import AlertRules
-from ops.charm import CharmBase, PebbleReadyEvent, RelationJoinedEvent
+from ops.framework import EventBase, StoredState
 from ops.main import main
 from ops.model import (
     ActiveStatus,
     BlockedStatus,
+    Container,
     MaintenanceStatus,
     ModelError,
+    Relation,
+    RelationDataContent,
     WaitingStatus,
 )
-from ops.pebble import Layer
+from ops.pebble import Layer, LayerDict, PathError, ProtocolError
 
-from rules_dir_watcher import AlertRulesChangedCharmEvents, AlertRulesDirWatcher
+import alert_rules_cardinality
+import alert_rules_cost
+import alert_rules_dedup
+import alert_rules_packing
+import alert_rules_payload
+import alert_rules_quotas
+import alert_rules_recording
+import alert_rules_templates
+import alert_rules_tenants
+import alert_rules_tracing
+import alert_rules_tuning
+import go_runtime
+from rules_dir_watcher import (
+    ALERT_RULES_CHANGED_NOTICE_KEY,
+    AlertRulesChangedCharmEvents,
+    AlertRulesChangedEvent,
+    AlertRulesDirWatcher,
+)
+from stage_timings import StageTimer
 
 logger = logging.getLogger(__name__)
 
+WATCHER_SCRIPTS = ("src/rules_dir_watcher.py", "src/reload_webhook.py")
+
 
 class PrometheusConfigurerOperatorCharm(CharmBase):
     RULES_DIR = "/etc/prometheus/rules"
+    RULE_TEMPLATES_DIR = "/etc/prometheus/rule_templates"
     DUMMY_HTTP_SERVER_HOST = "localhost"
     DUMMY_HTTP_SERVER_SERVICE_NAME = "dummy-http-server"
     DUMMY_HTTP_SERVER_PORT = 80
     PROMETHEUS_CONFIGURER_SERVICE_NAME = "prometheus-configurer"
     PROMETHEUS_CONFIGURER_PORT = 9100
+    RELOAD_WEBHOOK_PORT = 9101
+    RULE_COSTS_METRICS_PATH = "/var/log/prometheus-configurer-rule-costs.prom"
+    STAGE_TIMINGS_PATH = "/var/log/prometheus-configurer-stage-timings.jsonl"
+    ALERT_RULES_PROFILE_PATH = "/var/log/prometheus-configurer-alert-rules.prof"
+    ALERT_RULES_TRACES_PATH = "/var/log/prometheus-configurer-alert-rules-traces.jsonl"
+    ADMITTED_ALERT_RULES_DIR = "/var/lib/juju/prometheus-configurer-admitted-alert-rules"
 
     on = AlertRulesChangedCharmEvents()
+    _stored = StoredState()
 
     def __init__(self, *args):
+        self._hook_started = time.time()
         super().__init__(*args)
-        self._prometheus_configurer_container_name = (
-            self._prometheus_configurer_layer_name
-        ) = self._prometheus_configurer_service_name = self.PROMETHEUS_CONFIGURER_SERVICE_NAME
-        self._dummy_http_server_container_name = (
-            self._dummy_http_server_layer_name
-        ) = self._dummy_http_server_service_name = self.DUMMY_HTTP_SERVER_SERVICE_NAME
+        self._stored.set_default(
+            alert_rules_admitted_hashes={},
+            alert_rules_tenant_hashes={},
+            alert_rules_writes=0,
+            alert_rules_writes_skipped=0,
+            alert_rules_inputs_hash="",
+            alert_rules_problems="",
+            alert_rules_watcher_pid=0,
+            alert_rules_watcher_settings={},
+            layer_hashes={},
+            prometheus_configurer_limits={},
+            resource_requirements_error="",
+        )
+        self._prometheus_configurer_container_name = self._prometheus_configurer_layer_name = (
+            self._prometheus_configurer_service_name
+        ) = self.PROMETHEUS_CONFIGURER_SERVICE_NAME
+        self._dummy_http_server_container_name = self._dummy_http_server_layer_name = (
+            self._dummy_http_server_service_name
+        ) = self.DUMMY_HTTP_SERVER_SERVICE_NAME
         self._prometheus_configurer_container = self.unit.get_container(
             self._prometheus_configurer_container_name
         )
@@ -52,105 +109,1201 @@ class PrometheusConfigurerOperatorCharm(CharmBase):
             self._dummy_http_server_container_name
         )
 
-        self.service_patch = KubernetesServicePatch(
-            charm=self,
-            ports=[
-                ServicePort(name="prom-configmanager", port=self.PROMETHEUS_CONFIGURER_PORT),
-                ServicePort(name="dummy-http-server", port=self.DUMMY_HTTP_SERVER_PORT),
-            ],
-        )
+        self._stage_timer = StageTimer(_dispatched_hook())
+        self._trace = alert_rules_tracing.Trace(None, _dispatched_hook(), self._hook_started)
 
-        self.framework.observe(self.on.start, self._on_start)
-        self.framework.observe(
+        # Kubernetes patches pull in lightkube, so they're only set up in the hooks using them
+        hook = _dispatched_hook()
+        if hook in ("install", "upgrade-charm"):
+            self._setup_kubernetes_service_patch()
+        if hook in ("install", "upgrade-charm", "config-changed"):
+            self._setup_kubernetes_resources_patch()
+
+        for event in (
+            self.on.start,
+            self.on.upgrade_charm,
+            self.on.config_changed,
+            self.on.leader_elected,
             self.on.prometheus_configurer_pebble_ready,
-            self._on_prometheus_configurer_pebble_ready,
+            self.on.dummy_http_server_pebble_ready,
+            self.on.prometheus_configurer_pebble_custom_notice,
+            self.on.alert_rules_changed,
+            self.on.prometheus_relation_joined,
+            self.on.prometheus_relation_changed,
+            self.on.prometheus_relation_departed,
+            self.on.update_status,
+        ):
+            self.framework.observe(event, self._reconcile)
+        self.framework.observe(self.on.get_rule_costs_action, self._on_get_rule_costs_action)
+        self.framework.observe(
+            self.on.get_alert_cardinality_action, self._on_get_alert_cardinality_action
         )
         self.framework.observe(
-            self.on.dummy_http_server_pebble_ready, self._on_dummy_http_server_pebble_ready
+            self.on.profile_alert_rules_action, self._on_profile_alert_rules_action
         )
-        self.framework.observe(self.on.alert_rules_changed, self._on_alert_rules_changed)
         self.framework.observe(
             self.on.prometheus_configurer_relation_joined,
             self._on_prometheus_configurer_relation_joined,
         )
 
-    def _on_start(self, _) -> None:
-        """Starts AlertRulesDirWatcher upon unit start."""
-        watchdog = AlertRulesDirWatcher(self, self.RULES_DIR)
-        watchdog.start_watchdog()
+    def _reconcile(self, event: EventBase) -> None:
+        """Brings the unit to its desired state, whatever the event.
+
+        All preconditions are checked once per hook and nothing is deferred: each step is
+        idempotent and cheap when there's nothing to change, so the next hook simply picks up
+        where this one couldn't proceed.
+        """
+        if (
+            isinstance(event, PebbleCustomNoticeEvent)
+            and event.notice.key != ALERT_RULES_CHANGED_NOTICE_KEY
+        ):
+            return
+        self._stage_timer = StageTimer(event.handle.kind)
+        self._trace = alert_rules_tracing.Trace(
+            self._alert_rules_trace_context(event), event.handle.kind, self._hook_started
+        )
+        try:
+            self._reconcile_stages(event)
+        finally:
+            self._stage_timer.write(self.STAGE_TIMINGS_PATH)
+            self._write_alert_rules_trace()
+
+    def _reconcile_stages(self, event: EventBase) -> None:
+        self._reconcile_alert_rules_watcher()
+        self._reconcile_workloads(verify=isinstance(event, (PebbleReadyEvent, UpdateStatusEvent)))
+        if isinstance(event, (ConfigChangedEvent, UpgradeCharmEvent)):
+            try:
+                self._workload_resource_requirements()
+                self._stored.resource_requirements_error = ""
+            except ValueError as e:
+                self._stored.resource_requirements_error = str(e)
+        if self._stored.resource_requirements_error:
+            self.unit.status = BlockedStatus(
+                f"Invalid resource requirements: {self._stored.resource_requirements_error}"
+            )
+        with self._trace.span("alert_rules.reconcile"):
+            self._reconcile_alert_rules(
+                force=isinstance(
+                    event, (AlertRulesChangedEvent, PebbleCustomNoticeEvent, LeaderElectedEvent)
+                )
+            )
+
+    @staticmethod
+    def _alert_rules_trace_context(event: EventBase) -> Optional[Dict[str, str]]:
+        """Returns the trace context of the alert rules change an event signals, if any."""
+        if isinstance(event, PebbleCustomNoticeEvent):
+            return alert_rules_tracing.parse_context(event.notice.last_data)
+        if isinstance(event, AlertRulesChangedEvent):
+            return alert_rules_tracing.context_from_environment()
+        return None
+
+    def _write_alert_rules_trace(self) -> None:
+        """Writes spans of the alert rules change handled by the hook, and exports them."""
+        spans = self._trace.finish()
+        if not spans:
+            return
+        logger.info(
+            "Alert rules change handled %.1f ms after it was written",
+            spans[0]["attributes"]["latency_ms"],
+        )
+        alert_rules_tracing.write(spans, self.ALERT_RULES_TRACES_PATH)
+        endpoint = str(self.model.config.get("tracing_otlp_endpoint", ""))
+        if endpoint:
+            alert_rules_tracing.export(spans, endpoint)
+
+    def _setup_kubernetes_service_patch(self) -> None:
+        """Sets up patching of the Kubernetes service to expose workload ports."""
+        from charms.observability_libs.v1.kubernetes_service_patch import (
+            KubernetesServicePatch,
+            ServicePort,
+        )
+
+        self.service_patch = KubernetesServicePatch(
+            charm=self,
+            ports=[
+                ServicePort(name="prom-configmanager", port=self.PROMETHEUS_CONFIGURER_PORT),
+                ServicePort(name="dummy-http-server", port=self.DUMMY_HTTP_SERVER_PORT),
+            ],
+        )
+
+    def _setup_kubernetes_resources_patch(self) -> None:
+        """Sets up patching of resource requirements of workload containers."""
+        from kubernetes_resources_patch import KubernetesResourcesPatch
 
-    def _on_prometheus_configurer_pebble_ready(self, event: PebbleReadyEvent):
-        """Checks whether all conditions to start Prometheus Configurer are met and, if yes,
-        triggers start of the prometheus-configurer service.
+        self.resources_patch = KubernetesResourcesPatch(
+            self,
+            self._workload_resource_requirements,
+            refresh_event=self.on.config_changed,
+        )
+
+    def _workload_resource_requirements(self) -> Dict[str, dict]:
+        """Resource requirements of each workload container, as set in config.
+
+        Returns:
+            dict: Resource requirements (`requests` and `limits`) of each workload container.
+
+        Raises:
+            ValueError: If resource requirements of any container are invalid.
+        """
+        import kubernetes_resources_patch
+
+        requirements = {}
+        for container_name in (
+            self._prometheus_configurer_container_name,
+            self._dummy_http_server_container_name,
+        ):
+            option_prefix = container_name.replace("-", "_")
+            try:
+                requirements[container_name] = kubernetes_resources_patch.resource_requirements(
+                    requests={
+                        resource: str(self.model.config.get(f"{option_prefix}_{resource}_request"))
+                        for resource in kubernetes_resources_patch.RESOURCES
+                    },
+                    limits={
+                        resource: str(self.model.config.get(f"{option_prefix}_{resource}_limit"))
+                        for resource in kubernetes_resources_patch.RESOURCES
+                    },
+                )
+            except ValueError as e:
+                raise ValueError(f"{container_name}: {e}")
+        return requirements
+
+    def _reconcile_alert_rules_watcher(self) -> None:
+        """Makes sure the source of alert_rules_changed events is running.
+
+        Alert rules changes are signalled either by reload requests of Prometheus Configurer, if
+        the reload webhook is enabled, or by changes in the rules directory otherwise. Either is
+        delivered as a Pebble custom notice if enabled, by running the dispatch script through
+        `juju-exec` otherwise. The background process is started only if the one started last is
+        no longer running or was started with different settings, in which case it's stopped.
         """
-        watchdog = AlertRulesDirWatcher(self, self.RULES_DIR)
-        watchdog.start_watchdog()
+        settings = {
+            "reload_webhook": self._reload_webhook_enabled,
+            "notice_socket": self._notice_socket or "",
+        }
+        pid = self._stored.alert_rules_watcher_pid
+        if _watcher_running(pid):
+            if self._stored.alert_rules_watcher_settings == settings:
+                return
+            logger.info("Stopping alert rules watcher process with PID %d", pid)
+            os.kill(pid, signal.SIGTERM)
+        from reload_webhook import ReloadWebhook
+
+        if self._reload_webhook_enabled:
+            pid = ReloadWebhook(
+                self, self.RELOAD_WEBHOOK_PORT, [self.RULE_TEMPLATES_DIR], self._notice_socket
+            ).start()
+        else:
+            pid = AlertRulesDirWatcher(
+                self, self.RULES_DIR, [self.RULE_TEMPLATES_DIR], self._notice_socket
+            ).start_watchdog()
+        self._stored.alert_rules_watcher_pid = pid
+        self._stored.alert_rules_watcher_settings = settings
+
+    def _reconcile_workloads(self, verify: bool = False) -> None:
+        """Starts or stops workload services as needed and sets the unit status accordingly.
+
+        Args:
+            verify: Whether to check Pebble plans even if layers are unchanged.
+        """
+        dummy_http_server_connected = self._dummy_http_server_container.can_connect()
+        if dummy_http_server_connected:
+            if not self._reload_webhook_enabled:
+                self._start_dummy_http_server(verify)
+            elif self._dummy_http_server_running(verify):
+                with self._stage_timer.stage(
+                    "pebble.stop", container=self._dummy_http_server_container_name
+                ):
+                    self._dummy_http_server_container.stop(self._dummy_http_server_service_name)
+                self._stored.layer_hashes.pop(self._dummy_http_server_container_name, None)
+                logger.info(f"Stopped container {self._dummy_http_server_service_name}")
         if not self.model.get_relation("prometheus"):
             self.unit.status = BlockedStatus("Waiting for prometheus relation to be created")
-            event.defer()
             return
         if not self._prometheus_configurer_container.can_connect():
             self.unit.status = WaitingStatus(
                 f"Waiting for {self._prometheus_configurer_container_name} container to be ready"
             )
-            event.defer()
             return
-        if not self._dummy_http_server_running:
+        if not self._reload_webhook_enabled and not (
+            dummy_http_server_connected and self._dummy_http_server_started
+        ):
             self.unit.status = WaitingStatus("Waiting for the dummy HTTP server to be ready")
-            event.defer()
             return
-        self._start_prometheus_configurer()
+        if verify or not self._stored.prometheus_configurer_limits:
+            self._read_prometheus_configurer_limits()
+        self._start_prometheus_configurer(verify)
         self.unit.status = ActiveStatus()
 
-    def _on_dummy_http_server_pebble_ready(self, event: PebbleReadyEvent):
-        if self._dummy_http_server_container.can_connect():
-            self._start_dummy_http_server()
+    def _start_prometheus_configurer(self, verify: bool = False) -> None:
+        """Starts Prometheus Configurer service.
+
+        Args:
+            verify: Whether to check the Pebble plan even if the layer is unchanged.
+        """
+        self._apply_layer(
+            self._prometheus_configurer_container,
+            self._prometheus_configurer_service_name,
+            self._prometheus_configurer_layer,
+            verify,
+        )
+
+    def _start_dummy_http_server(self, verify: bool = False) -> None:
+        """Starts dummy HTTP server service.
+
+        Args:
+            verify: Whether to check the Pebble plan even if the layer is unchanged.
+        """
+        self._apply_layer(
+            self._dummy_http_server_container,
+            self._dummy_http_server_service_name,
+            self._dummy_http_server_layer,
+            verify,
+        )
+
+    def _read_prometheus_configurer_limits(self) -> None:
+        """Reads CPU and memory limits of the Prometheus Configurer container from its cgroup.
+
+        Limits only change when the pod is recreated, so they are kept rather than read in every
+        hook, and read again whenever Pebble plans are verified.
+        """
+        read = self._read_prometheus_configurer_file
+        limits = {"cpus": go_runtime.cpu_limit(read), "memory": go_runtime.memory_limit(read)}
+        if limits != dict(self._stored.prometheus_configurer_limits):
+            logger.info("Prometheus Configurer container limits: %s", limits)
+            self._stored.prometheus_configurer_limits = limits
+
+    def _read_prometheus_configurer_file(self, path: str) -> Optional[str]:
+        with self._stage_timer.stage(
+            "pebble.pull", container=self._prometheus_configurer_container_name, path=path
+        ):
+            try:
+                return self._prometheus_configurer_container.pull(path).read()
+            except (PathError, ProtocolError):
+                return None
+
+    def _apply_layer(
+        self, container: Container, service_name: str, layer: LayerDict, verify: bool
+    ) -> None:
+        """Adds a Pebble layer to a container and restarts its service if the layer changed.
+
+        The hash of the layer applied last to each container is kept, so that the Pebble plan
+        doesn't have to be fetched when the layer is unchanged. As the plan may still drift, e.g.
+        if the workload container was restarted, it's fetched anyway if verification is asked
+        for.
+
+        Args:
+            container: Workload container.
+            service_name: Name of the service defined in the layer.
+            layer: Pebble layer.
+            verify: Whether to check the Pebble plan even if the layer is unchanged.
+        """
+        layer_hash = hashlib.sha256(json.dumps(layer, sort_keys=True).encode()).hexdigest()
+        if not verify and self._stored.layer_hashes.get(container.name) == layer_hash:
+            return
+        pebble_layer = Layer(layer)
+        with self._stage_timer.stage("pebble.get_plan", container=container.name):
+            plan = container.get_plan()
+        if plan.services != pebble_layer.services:
+            self.unit.status = MaintenanceStatus(f"Configuring pebble layer for {service_name}")
+            with self._stage_timer.stage("pebble.add_layer", container=container.name):
+                container.add_layer(container.name, pebble_layer, combine=True)
+            with self._stage_timer.stage("pebble.restart", container=container.name):
+                container.restart(service_name)
+            logger.info(f"Restarted container {service_name}")
+        self._stored.layer_hashes[container.name] = layer_hash
+
+    def _reconcile_alert_rules(self, force: bool = False) -> None:
+        """Pushes alert rules to Prometheus through the relation data bag.
+
+        Unless forced, rebuilding alert rules is skipped altogether if none of its inputs (rule
+        files, config and features supported by Prometheus) changed since the last build, in
+        which case the outcome of that build is reused. Otherwise, the relation data bag is only
+        written when the content hash of the alert rules differs from the one published last, so
+        that unchanged rule sets don't trigger relation-changed events (and rules reloads) on the
+        Prometheus side.
+
+        Only the leader publishes alert rules. A newly elected leader rebuilds them whatever its
+        state says, as alert rules were published by another unit in the meantime.
+
+        Args:
+            force: Whether to rebuild alert rules even if their inputs didn't change, e.g. upon
+                explicit alert rules changes signals.
+        """
+        if not self.unit.is_leader():
+            logger.debug("Not the leader, alert rules not published")
+            return
+        prometheus_relation = self.model.get_relation("prometheus")
+        if not prometheus_relation:
+            logger.debug("No prometheus relation, alert rules not published")
+            return
+        inputs_hash = self._alert_rules_inputs_hash(prometheus_relation)
+        if not force and inputs_hash == self._stored.alert_rules_inputs_hash:
+            logger.debug("Alert rules inputs unchanged, alert rules not rebuilt")
         else:
-            self.unit.status = WaitingStatus(
-                f"Waiting for {self._dummy_http_server_container_name} container to be ready"
+            self._stored.alert_rules_problems = self._update_alert_rules(prometheus_relation)
+            self._stored.alert_rules_inputs_hash = inputs_hash
+        if self._stored.alert_rules_problems:
+            self.unit.status = BlockedStatus(self._stored.alert_rules_problems)
+
+    def _update_alert_rules(self, prometheus_relation: Relation) -> str:
+        """Builds alert rules and publishes them if they pass all checks.
+
+        Args:
+            prometheus_relation: Relation to publish alert rules in.
+
+        Returns:
+            str: Problems found with alert rules, empty if there are none.
+        """
+        try:
+            tenant_groups, duplicates = self._build_tenant_groups()
+        except ValueError as e:
+            logger.error("Invalid alert rules settings: %s", e)
+            return f"Invalid alert rules settings: {e}"
+        with self._stage_timer.stage("validate") as stage:
+            tenant_groups, blocked_rules = self._block_risky_rules(tenant_groups)
+            try:
+                tenant_groups, tenant_violations = self._admit_tenant_groups(tenant_groups)
+            except ValueError as e:
+                logger.error("Invalid tenant quotas: %s", e)
+                return f"Invalid tenant quotas: {e}"
+            cost_report = alert_rules_cost.report(tenant_groups)
+            self._write_rule_costs_metrics(cost_report)
+            cost = cost_report["cost"]
+            stage.update(
+                rules=_count_rules(tenant_groups),
+                blocked_rules=len(blocked_rules),
+                cost=cost,
+            )
+            max_rules_cost = float(self.model.config.get("max_rules_cost", 0))
+            if max_rules_cost and cost > max_rules_cost:
+                logger.error(
+                    "Estimated rules cost %s exceeds budget %s, alert rules not published",
+                    cost,
+                    max_rules_cost,
+                )
+                return f"Estimated rules cost {cost} exceeds budget {max_rules_cost}"
+        self._publish_alert_rules(prometheus_relation, tenant_groups, duplicates)
+        self._save_admitted_groups(tenant_groups, tenant_violations)
+        problems = []
+        if tenant_violations:
+            problems.append(f"Quotas exceeded by tenants: {', '.join(sorted(tenant_violations))}")
+        if blocked_rules:
+            problems.append(f"Rules blocked for cardinality risk: {len(blocked_rules)}")
+        return "; ".join(problems)
+
+    def _alert_rules_inputs_hash(self, prometheus_relation: Relation) -> str:
+        """Hashes everything alert rules are built from.
+
+        Rule and template files are represented by their paths, sizes and modification times, so
+        that they don't have to be read.
+
+        Args:
+            prometheus_relation: Relation alert rules are published in.
+
+        Returns:
+            str: Hash of the inputs of alert rules.
+        """
+        files = []
+        total_size = 0
+        with self._stage_timer.stage("discover") as stage:
+            for directory in (self.RULES_DIR, self.RULE_TEMPLATES_DIR):
+                for root, _, file_names in os.walk(directory):
+                    for file_name in file_names:
+                        path = os.path.join(root, file_name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        files.append([path, stat.st_size, stat.st_mtime_ns])
+                        total_size += stat.st_size
+            stage.update(files=len(files), bytes=total_size)
+        features = {
+            unit.name: prometheus_relation.data[unit].get("alert_rules_features", "")
+            for unit in prometheus_relation.units
+        }
+        inputs = {
+            "files": sorted(files),
+            "config": dict(self.model.config),
+            "relation": prometheus_relation.id,
+            "features": features,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _on_get_rule_costs_action(self, event: ActionEvent) -> None:
+        """Returns the estimated evaluation costs of alert rules of each tenant and group."""
+        try:
+            tenant_groups, _ = self._build_tenant_groups()
+        except ValueError as e:
+            event.fail(f"Invalid alert rules settings: {e}")
+            return
+        event.set_results({"costs": json.dumps(alert_rules_cost.report(tenant_groups))})
+
+    def _on_get_alert_cardinality_action(self, event: ActionEvent) -> None:
+        """Returns the estimated `ALERTS` cardinality risk of alert rules of each tenant."""
+        try:
+            tenant_groups, _ = self._build_tenant_groups()
+        except ValueError as e:
+            event.fail(f"Invalid alert rules settings: {e}")
+            return
+        event.set_results(
+            {"cardinality": json.dumps(alert_rules_cardinality.report(tenant_groups))}
+        )
+
+    def _on_profile_alert_rules_action(self, event: ActionEvent) -> None:
+        """Profiles a full rebuild of alert rules, without publishing them."""
+        import alert_rules_profiling
+
+        try:
+            profile = alert_rules_profiling.profile(
+                self._rebuild_alert_rules,
+                self.ALERT_RULES_PROFILE_PATH,
+                int(event.params.get("top", 20)),
+                str(event.params.get("sort", "cumulative")),
+            )
+        except ValueError as e:
+            event.fail(f"Profiling failed: {e}")
+            return
+        event.set_results(
+            {
+                "hotspots": profile["hotspots"],
+                "peak-memory-bytes": str(profile["peak_memory"]),
+                "duration-seconds": str(profile["duration"]),
+                "rules": str(_count_rules(profile["result"])),
+                "profile-path": self.ALERT_RULES_PROFILE_PATH,
+            }
+        )
+
+    def _rebuild_alert_rules(self) -> Dict[str, List[dict]]:
+        """Builds, checks and serialises alert rules the same way as for publishing.
+
+        Returns:
+            dict: Alert rule groups of each tenant which would be published.
+
+        Raises:
+            ValueError: If group settings or tenant quotas in charm config are invalid.
+        """
+        tenant_groups, _ = self._build_tenant_groups()
+        tenant_groups, _ = self._block_risky_rules(tenant_groups)
+        tenant_groups, _ = self._admit_tenant_groups(tenant_groups)
+        alert_rules_cost.report(tenant_groups)
+        alert_rules_payload.dumps(
+            {"groups": [group for groups in tenant_groups.values() for group in groups]}
+        )
+        return tenant_groups
+
+    def _block_risky_rules(
+        self, tenant_groups: Dict[str, List[dict]]
+    ) -> Tuple[Dict[str, List[dict]], List[str]]:
+        """Drops alert rules whose `ALERTS` cardinality risk exceeds the configured threshold.
+
+        Args:
+            tenant_groups: Alert rule groups of each tenant.
+
+        Returns:
+            tuple: Alert rule groups of each tenant without the risky rules and the names of the
+                dropped rules.
+        """
+        max_risk = float(self.model.config.get("max_alert_cardinality_risk", 0))
+        if not max_risk:
+            return tenant_groups, []
+        allowed_tenant_groups = {}
+        blocked_rules = []  # type: List[str]
+        for tenant, groups in tenant_groups.items():
+            allowed_groups, blocked = alert_rules_cardinality.block(groups, max_risk)
+            if allowed_groups:
+                allowed_tenant_groups[tenant] = allowed_groups
+            blocked_rules.extend(blocked)
+        if blocked_rules:
+            logger.warning(
+                "Rules blocked for cardinality risk over %s: %s",
+                max_risk,
+                ", ".join(blocked_rules),
             )
-            event.defer()
+        return allowed_tenant_groups, blocked_rules
+
+    def _build_tenant_groups(self) -> Tuple[Dict[str, List[dict]], Dict[str, int]]:
+        """Builds the alert rule groups of each tenant from the rules directory.
+
+        Returns:
+            tuple: Alert rule groups of each tenant, deduplicated, with common subexpressions
+                extracted, tuned and packed according to charm config, and the number of `exact`
+                and `semantic` duplicate rules found.
+
+        Raises:
+            ValueError: If group settings or rule templates in charm config are invalid, or if
+                rule templates can't be restricted to their tenants.
+        """
+        from charms.prometheus_k8s.v0.prometheus_remote_write import AlertRules
 
-    def _start_prometheus_configurer(self):
-        """Starts Prometheus Configurer service."""
-        plan = self._prometheus_configurer_container.get_plan()
-        layer = self._prometheus_configurer_layer
-        if plan.services != layer.services:
-            self.unit.status = MaintenanceStatus(
-                f"Configuring pebble layer for {self._prometheus_configurer_service_name}"
+        topology = JujuTopology.from_charm(self)
+        # Rules are annotated with Juju topology by the library as they're parsed
+        with self._stage_timer.stage("parse") as stage:
+            alert_rules = AlertRules(topology=topology)
+            alert_rules.add_path(self.RULES_DIR, recursive=True)
+            groups = alert_rules.as_dict().get("groups", [])
+            stage.update(groups=len(groups), rules=_count_rules({"": groups}))
+        with self._stage_timer.stage("annotate") as stage:
+            templated_groups = self._expand_rule_templates(topology)
+            tenant_groups = alert_rules_tenants.partition(
+                groups + templated_groups, self._multitenant_label
             )
-            self._prometheus_configurer_container.add_layer(
-                self._prometheus_configurer_container_name, layer, combine=True
+            stage.update(templated_groups=len(templated_groups), tenants=len(tenant_groups))
+        with self._stage_timer.stage("transform") as stage:
+            tenant_groups, duplicates = self._deduplicate_groups(tenant_groups)
+            min_alerts = int(self.model.config.get("extract_common_subexpressions", 0))
+            if min_alerts:
+                tenant_groups = {
+                    tenant: alert_rules_recording.extract(
+                        groups,
+                        tenant,
+                        min_alerts,
+                        {
+                            **topology.label_matcher_dict,
+                            **({self._multitenant_label: tenant} if tenant else {}),
+                        },
+                    )
+                    for tenant, groups in tenant_groups.items()
+                }
+            tenant_groups = self._tune_groups(tenant_groups)
+            tenant_groups = self._pack_groups(tenant_groups, topology)
+            stage.update(rules=_count_rules(tenant_groups), **duplicates)
+        return tenant_groups, duplicates
+
+    def _pack_groups(
+        self, tenant_groups: Dict[str, List[dict]], topology: JujuTopology
+    ) -> Dict[str, List[dict]]:
+        """Splits oversized rule groups and merges tiny ones, according to charm config.
+
+        Args:
+            tenant_groups: Alert rule groups of each tenant.
+            topology: Juju topology of the charm, prefixing the names of merged groups.
+
+        Returns:
+            dict: Packed alert rule groups of each tenant.
+
+        Raises:
+            ValueError: If the group size measure in charm config is invalid.
+        """
+        max_group_size = int(self.model.config.get("max_rules_per_group", 0))
+        min_group_size = int(self.model.config.get("min_rules_per_group", 0))
+        if not max_group_size and not min_group_size:
+            return tenant_groups
+        size_by = self.model.config.get("group_size_by", "rules")
+        if size_by == "rules":
+            weigh = _rule_count
+        elif size_by == "cost":
+            weigh = _rule_cost
+        else:
+            raise ValueError(f"unsupported group size measure: {size_by}")
+        return {
+            tenant: alert_rules_packing.pack(
+                groups,
+                max_group_size,
+                min_group_size,
+                weigh,
+                f"{topology.identifier}_{tenant}" if tenant else topology.identifier,
             )
-            self._prometheus_configurer_container.restart(self._prometheus_configurer_service_name)
-            logger.info(f"Restarted container {self._prometheus_configurer_service_name}")
+            for tenant, groups in tenant_groups.items()
+        }
 
-    def _start_dummy_http_server(self):
-        """Starts dummy HTTP server service."""
-        plan = self._dummy_http_server_container.get_plan()
-        layer = self._dummy_http_server_layer
-        if plan.services != layer.services:
-            self.unit.status = MaintenanceStatus(
-                f"Configuring pebble layer for {self._dummy_http_server_service_name}"
+    def _expand_rule_templates(self, topology: JujuTopology) -> List[dict]:
+        """Expands rule templates for the tenants bound to them.
+
+        Expanded rules are annotated with Juju topology the same way as rules from the rules
+        directory, and their expressions are restricted to the series of their tenant by
+        cos-tool. Rules which can't be restricted would evaluate against the series of every
+        tenant, so templates aren't expanded at all without cos-tool, nor if any of their rules
+        can't be restricted (e.g. expressions without any selector).
+
+        Args:
+            topology: Juju topology of the charm.
+
+        Returns:
+            list: Alert rule groups expanded from rule templates.
+
+        Raises:
+            ValueError: If rule template bindings in charm config are invalid or if rule templates
+                can't be restricted to their tenants.
+        """
+        from charms.prometheus_k8s.v0.prometheus_remote_write import CosTool
+
+        bindings = alert_rules_templates.parse_bindings(
+            str(self.model.config.get("tenant_rule_templates", ""))
+        )
+        if bindings and not os.path.isdir(self.RULE_TEMPLATES_DIR):
+            logger.warning(
+                "Rule templates storage is not attached, redeploy the application to use rule "
+                "templates"
             )
-            self._dummy_http_server_container.add_layer(
-                self._dummy_http_server_container_name, layer, combine=True
+            return []
+        tool = CosTool(self)
+        if bindings and not tool.path:
+            raise ValueError("cos-tool not found, rule templates can't be restricted to tenants")
+        groups = []
+        for tenant, template_names in bindings.items():
+            for template_name in template_names:
+                path = alert_rules_templates.find(self.RULE_TEMPLATES_DIR, template_name)
+                if not path:
+                    logger.warning("Rule template %s not found", template_name)
+                    continue
+                for group in alert_rules_templates.expand(
+                    alert_rules_templates.load(path),
+                    template_name,
+                    tenant,
+                    self._multitenant_label,
+                ):
+                    group["name"] = f"{topology.identifier}_{group['name']}_alerts"
+                    for rule in group["rules"]:
+                        for label, value in topology.label_matcher_dict.items():
+                            rule["labels"].setdefault(label, value)
+                        rule["expr"] = tool.inject_label_matchers(
+                            rule["expr"],
+                            {**topology.label_matcher_dict, self._multitenant_label: tenant},
+                        )
+                        # cos-tool falls back to the original expression if it fails
+                        if f"{self._multitenant_label}={json.dumps(tenant)}" not in rule["expr"]:
+                            raise ValueError(
+                                f"rule template {template_name} can't be restricted to tenant "
+                                f"{tenant}"
+                            )
+                    groups.append(group)
+        return groups
+
+    def _deduplicate_groups(
+        self, tenant_groups: Dict[str, List[dict]]
+    ) -> Tuple[Dict[str, List[dict]], Dict[str, int]]:
+        """Detects duplicate rules within the alert rule groups of each tenant.
+
+        Depending on the `deduplicate_rules` config option, duplicates are only reported
+        (`report`), dropped (`collapse`) or not looked for at all (`off`).
+
+        Args:
+            tenant_groups: Alert rule groups of each tenant.
+
+        Returns:
+            tuple: Alert rule groups of each tenant and the number of `exact` and `semantic`
+                duplicate rules found across all tenants.
+        """
+        duplicates = {"exact": 0, "semantic": 0}
+        mode = self.model.config.get("deduplicate_rules", "report")
+        if mode not in ("off", "report", "collapse"):
+            logger.warning("Unsupported rules deduplication mode: %s", mode)
+            mode = "report"
+        if mode == "off":
+            return tenant_groups, duplicates
+        deduplicated_tenant_groups = {}
+        for tenant, groups in tenant_groups.items():
+            deduplicated_groups, tenant_duplicates = alert_rules_dedup.deduplicate(
+                groups, collapse=mode == "collapse"
             )
-            self._dummy_http_server_container.restart(self._dummy_http_server_service_name)
-            logger.info(f"Restarted container {self._dummy_http_server_service_name}")
+            if deduplicated_groups:
+                deduplicated_tenant_groups[tenant] = deduplicated_groups
+            for kind, count in tenant_duplicates.items():
+                duplicates[kind] += count
+        return deduplicated_tenant_groups, duplicates
 
-    def _on_alert_rules_changed(self, _):
-        """Pushes alert rules to Prometheus through the relation data bag."""
-        topology = JujuTopology.from_charm(self)
-        alert_rules = AlertRules(topology=topology)
-        alert_rules.add_path(self.RULES_DIR, recursive=True)
-        alert_rules_as_dict = alert_rules.as_dict()
-        alert_rules_content = (
-            alert_rules_as_dict if alert_rules_as_dict["groups"][0]["rules"] else []
+    def _write_rule_costs_metrics(self, cost_report: dict) -> None:
+        """Writes estimated alert rules costs to a file in the Prometheus text exposition format.
+
+        The file can be picked up by a node exporter's textfile collector or a log forwarder.
+
+        Args:
+            cost_report: Cost report, as returned by `alert_rules_cost.report`.
+        """
+        try:
+            with open(self.RULE_COSTS_METRICS_PATH, "w") as metrics_file:
+                metrics_file.write(alert_rules_cost.as_metrics(cost_report))
+        except OSError as e:
+            logger.warning("Failed to write rule costs metrics: %s", e)
+
+    def _admit_tenant_groups(
+        self, tenant_groups: Dict[str, List[dict]]
+    ) -> Tuple[Dict[str, List[dict]], Dict[str, List[str]]]:
+        """Checks alert rule groups of each tenant against the tenant's quotas.
+
+        Tenants exceeding any of their quotas are held at the last rule set admitted for them, or
+        left out if none was admitted yet. Quotas of particular tenants (`tenant_quotas`) take
+        precedence over those set for all tenants (`tenant_max_rules`, `tenant_max_expr_length`
+        and `tenant_max_cost`).
+
+        Args:
+            tenant_groups: Alert rule groups of each tenant.
+
+        Returns:
+            tuple: Admitted alert rule groups of each tenant and quota violations of each tenant
+                which exceeded its quotas.
+
+        Raises:
+            ValueError: If quotas in charm config are invalid.
+        """
+        default_quotas = alert_rules_quotas.parse_quotas(
+            {
+                "max_rules": self.model.config.get("tenant_max_rules"),
+                "max_expr_length": self.model.config.get("tenant_max_expr_length"),
+                "max_cost": self.model.config.get("tenant_max_cost"),
+            }
+        )
+        tenant_quotas = alert_rules_quotas.parse_tenant_quotas(
+            str(self.model.config.get("tenant_quotas", ""))
+        )
+        admitted_groups = {}
+        tenant_violations = {}
+        for tenant, groups in tenant_groups.items():
+            violations = alert_rules_quotas.violations(
+                groups, {**default_quotas, **tenant_quotas.get(tenant, {})}
+            )
+            if not violations:
+                admitted_groups[tenant] = groups
+                continue
+            logger.warning(
+                "Rules of tenant %s not admitted, holding last admitted rules: %s",
+                tenant,
+                "; ".join(violations),
+            )
+            tenant_violations[tenant] = violations
+            last_admitted_groups = self._load_admitted_groups(tenant)
+            if last_admitted_groups is not None:
+                admitted_groups[tenant] = last_admitted_groups
+        return admitted_groups, tenant_violations
+
+    def _save_admitted_groups(
+        self, tenant_groups: Dict[str, List[dict]], tenant_violations: Dict[str, List[str]]
+    ) -> None:
+        """Saves alert rule groups admitted for each tenant, so that it can be held at them.
+
+        Groups are written to a file per tenant, only when they changed since they were last
+        written, which is told by their fingerprint kept in the charm's state. Files of tenants
+        which are gone are removed.
+
+        Args:
+            tenant_groups: Published alert rule groups of each tenant.
+            tenant_violations: Quota violations of each tenant which exceeded its quotas.
+        """
+        admitted_hashes = dict(self._stored.alert_rules_admitted_hashes)
+        admitted_tenant_groups = {
+            tenant: groups
+            for tenant, groups in tenant_groups.items()
+            if tenant not in tenant_violations
+        }
+        for tenant, tenant_hash in alert_rules_tenants.fingerprints(
+            admitted_tenant_groups
+        ).items():
+            path = self._admitted_groups_path(tenant)
+            if admitted_hashes.get(tenant) == tenant_hash and os.path.exists(path):
+                continue
+            try:
+                os.makedirs(self.ADMITTED_ALERT_RULES_DIR, exist_ok=True)
+                with open(f"{path}.tmp", "w") as admitted_groups_file:
+                    admitted_groups_file.write(
+                        alert_rules_payload.dumps({"groups": admitted_tenant_groups[tenant]})
+                    )
+                os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                logger.warning("Failed to save admitted alert rules of tenant %s: %s", tenant, e)
+                admitted_hashes.pop(tenant, None)
+                continue
+            admitted_hashes[tenant] = tenant_hash
+        for tenant in set(admitted_hashes) - set(tenant_groups) - set(tenant_violations):
+            try:
+                os.remove(self._admitted_groups_path(tenant))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Failed to remove admitted alert rules of tenant %s: %s", tenant, e)
+                continue
+            del admitted_hashes[tenant]
+        self._stored.alert_rules_admitted_hashes = admitted_hashes
+
+    def _load_admitted_groups(self, tenant: str) -> Optional[List[dict]]:
+        """Loads alert rule groups last admitted for a tenant.
+
+        Args:
+            tenant: Tenant.
+
+        Returns:
+            list: Alert rule groups, or None if none were admitted or they can't be loaded.
+        """
+        if tenant not in self._stored.alert_rules_admitted_hashes:
+            return None
+        try:
+            with open(self._admitted_groups_path(tenant)) as admitted_groups_file:
+                return json.load(admitted_groups_file)["groups"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Failed to load admitted alert rules of tenant %s: %s", tenant, e)
+            return None
+
+    def _admitted_groups_path(self, tenant: str) -> str:
+        """Returns the path of the file holding alert rule groups admitted for a tenant."""
+        return os.path.join(
+            self.ADMITTED_ALERT_RULES_DIR, f"{alert_rules_payload.fingerprint(tenant)}.json"
+        )
+
+    def _tune_groups(self, tenant_groups: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+        """Applies evaluation settings from charm config to the alert rule groups of each tenant.
+
+        Settings of particular tenants (`tenant_group_settings`) take precedence over those set
+        for all groups (`group_interval`, `group_limit` and `group_query_offset`).
+
+        Args:
+            tenant_groups: Alert rule groups of each tenant.
+
+        Returns:
+            dict: Tuned alert rule groups of each tenant.
+
+        Raises:
+            ValueError: If group settings in charm config are invalid.
+        """
+        default_settings = alert_rules_tuning.parse_settings(
+            {
+                "interval": self.model.config.get("group_interval"),
+                "limit": self.model.config.get("group_limit"),
+                "query_offset": self.model.config.get("group_query_offset"),
+            }
+        )
+        tenant_settings = alert_rules_tuning.parse_tenant_settings(
+            str(self.model.config.get("tenant_group_settings", ""))
+        )
+        return {
+            tenant: alert_rules_tuning.apply(
+                groups, {**default_settings, **tenant_settings.get(tenant, {})}
+            )
+            for tenant, groups in tenant_groups.items()
+        }
+
+    def _publish_alert_rules(
+        self,
+        relation: Relation,
+        tenant_groups: Dict[str, List[dict]],
+        duplicates: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Writes alert rules to the relation data bag unless they're already there.
+
+        Whether they're already there is told by the fingerprint of the alert rules and of the
+        way they're published, which is written to the relation data bag along with them. It's
+        read back from the data bag rather than from the charm's state, so that alert rules are
+        rewritten after a leader change or whenever the data bag was overwritten.
+        Alert rules are fingerprinted per tenant. Along with alert rule groups, the published
+        payload carries the fingerprint of each tenant and the list of tenants which changed
+        since the last publish.
+        Only the leader can read and write the application data bag, so other units publish
+        nothing.
+
+        Args:
+            relation: The prometheus relation to publish the alert rules to.
+            tenant_groups: Alert rule groups of each tenant.
+            duplicates: Number of `exact` and `semantic` duplicate rules found, for the summary.
+        """
+        if not self.unit.is_leader():
+            logger.debug("Not the leader, alert rules not published")
+            return
+        with self._stage_timer.stage("fingerprint"):
+            tenant_hashes = alert_rules_tenants.fingerprints(tenant_groups)
+            alert_rules_hash = alert_rules_payload.fingerprint(
+                alert_rules_payload.dumps(tenant_hashes)
+            )
+        encoding = self._alert_rules_encoding(relation)
+        chunk_size = self._alert_rules_chunk_size(relation)
+        storage = self._alert_rules_storage(relation)
+        group_labels = self._alert_rules_group_labels(relation)
+        publish_state = {
+            "hash": alert_rules_hash,
+            "encoding": encoding,
+            "chunk_size": chunk_size,
+            "storage": storage,
+            "group_labels": group_labels,
+        }
+        relation_key = str(relation.id)
+        relation_data = relation.data[self.app]
+        if relation_data.get("alert_rules_hash") == _publish_hash(publish_state):
+            self._stored.alert_rules_writes_skipped += 1
+            logger.debug(
+                "Alert rules unchanged (%s), skipping relation data bag write", alert_rules_hash
+            )
+            return
+        changed_tenants = alert_rules_tenants.changed(
+            dict(self._stored.alert_rules_tenant_hashes.get(relation_key, {})), tenant_hashes
+        )
+        logger.info("Alert rules of tenants changed: %s", ", ".join(changed_tenants))
+        with self._stage_timer.stage("serialise") as stage:
+            groups = [
+                group for groups_of_tenant in tenant_groups.values() for group in groups_of_tenant
+            ]
+            if group_labels:
+                groups = alert_rules_payload.hoist_labels(groups)
+            alert_rules = (
+                {
+                    "groups": groups,
+                    "tenants": tenant_hashes,
+                    "changed_tenants": changed_tenants,
+                }
+                if tenant_groups
+                else {}
+            )
+            payload = alert_rules_payload.dumps(alert_rules)
+            stage.update(groups=len(groups), bytes=len(payload.encode()))
+        with self._stage_timer.stage(
+            "publish", storage=storage, encoding=encoding
+        ) as stage, self._trace.span("alert_rules.publish", storage=storage):
+            if storage == "configmap" and not self._write_alert_rules_configmaps(
+                relation_data, alert_rules, encoding, alert_rules_hash
+            ):
+                logger.warning(
+                    "Falling back to publishing alert rules through the relation data bag"
+                )
+                publish_state["storage"] = "relation-data"
+            if publish_state["storage"] != "configmap":
+                self._remove_alert_rules_configmaps(relation_data)
+                if chunk_size:
+                    self._write_alert_rules_chunks(
+                        relation_data, alert_rules, chunk_size, encoding
+                    )
+                else:
+                    relation_data["alert_rules"] = alert_rules_payload.encode(payload, encoding)
+                    self._remove_alert_rules_chunks(relation_data)
+            if encoding:
+                relation_data["alert_rules_encoding"] = encoding
+            else:
+                relation_data.pop("alert_rules_encoding", None)
+            stage["bytes"] = sum(
+                len(value) for key, value in relation_data.items() if key.startswith("alert_rules")
+            )
+            relation_data["alert_rules_hash"] = _publish_hash(publish_state)
+        self._stored.alert_rules_tenant_hashes[relation_key] = tenant_hashes
+        self._stored.alert_rules_writes += 1
+        duplicates = duplicates or {}
+        logger.info(
+            "Published alert rules (%s): %d groups, %d rules, %d exact and %d semantic duplicates",
+            alert_rules_hash,
+            len(groups),
+            sum(len(group["rules"]) for group in groups),
+            duplicates.get("exact", 0),
+            duplicates.get("semantic", 0),
+        )
+        logger.debug(
+            "Alert rules writes: %d performed, %d skipped",
+            self._stored.alert_rules_writes,
+            self._stored.alert_rules_writes_skipped,
+        )
+
+    @staticmethod
+    def _write_alert_rules_chunks(
+        relation_data: RelationDataContent, alert_rules: dict, chunk_size: int, encoding: str
+    ) -> None:
+        """Writes alert rules chunks which changed since last publish and their manifest.
+
+        Alert rules metadata (anything but groups) is written to the manifest.
+
+        Args:
+            relation_data: The application's prometheus relation data bag.
+            alert_rules: Alert rules payload.
+            chunk_size: Maximum size of a chunk in bytes.
+            encoding: The encoding to write the chunks with.
+        """
+        chunks = alert_rules_payload.split(alert_rules, chunk_size)
+        previous_chunk_hashes = json.loads(
+            relation_data.get("alert_rules_manifest", '{"chunks": []}')
+        )["chunks"]
+        if relation_data.get("alert_rules_encoding", "") != encoding:
+            previous_chunk_hashes = [None] * len(previous_chunk_hashes)
+        chunk_hashes = [alert_rules_payload.fingerprint(chunk) for chunk in chunks]
+        rewritten_chunks = 0
+        for idx, chunk in enumerate(chunks):
+            if (
+                idx < len(previous_chunk_hashes)
+                and previous_chunk_hashes[idx] == chunk_hashes[idx]
+            ):
+                continue
+            relation_data[f"alert_rules_chunk_{idx}"] = alert_rules_payload.encode(chunk, encoding)
+            rewritten_chunks += 1
+        for idx in range(len(chunks), len(previous_chunk_hashes)):
+            relation_data.pop(f"alert_rules_chunk_{idx}", None)
+        relation_data["alert_rules_manifest"] = json.dumps(
+            {"chunks": chunk_hashes, **_alert_rules_metadata(alert_rules)}
+        )
+        relation_data.pop("alert_rules", None)
+        logger.debug("Rewrote %d of %d alert rules chunks", rewritten_chunks, len(chunks))
+
+    @staticmethod
+    def _remove_alert_rules_chunks(relation_data: RelationDataContent) -> None:
+        """Removes alert rules chunks and their manifest from the relation data bag.
+
+        Args:
+            relation_data: The application's prometheus relation data bag.
+        """
+        if "alert_rules_manifest" not in relation_data:
+            return
+        manifest = json.loads(relation_data.pop("alert_rules_manifest"))
+        for idx in range(len(manifest["chunks"])):
+            relation_data.pop(f"alert_rules_chunk_{idx}", None)
+
+    def _write_alert_rules_configmaps(
+        self,
+        relation_data: RelationDataContent,
+        alert_rules: dict,
+        encoding: str,
+        alert_rules_hash: str,
+    ) -> bool:
+        """Writes alert rules to ConfigMaps and a reference to them to the relation data bag.
+
+        Alert rules metadata (anything but groups) is written to the reference. ConfigMaps
+        which are no longer referenced are deleted once the reference is updated.
+
+        Args:
+            relation_data: The application's prometheus relation data bag.
+            alert_rules: Alert rules payload.
+            encoding: The encoding to write the alert rules with.
+            alert_rules_hash: Content hash of the alert rules.
+
+        Returns:
+            bool: Whether alert rules were written.
+        """
+        previous_names = [
+            configmap["name"]
+            for configmap in json.loads(
+                relation_data.get("alert_rules_ref", '{"configmaps": []}')
+            )["configmaps"]
+        ]
+        from alert_rules_configmap import CONFIGMAP_CHUNK_SIZE, AlertRulesConfigMaps
+
+        alert_rules_configmaps = AlertRulesConfigMaps(self.app.name)
+        configmaps = alert_rules_configmaps.write(
+            alert_rules_payload.split(alert_rules, CONFIGMAP_CHUNK_SIZE),
+            encoding,
+            previous_names,
+        )
+        if configmaps is None:
+            return False
+        relation_data["alert_rules_ref"] = json.dumps(
+            {
+                "namespace": alert_rules_configmaps.namespace,
+                "configmaps": configmaps,
+                "hash": alert_rules_hash,
+                **_alert_rules_metadata(alert_rules),
+            }
+        )
+        relation_data.pop("alert_rules", None)
+        self._remove_alert_rules_chunks(relation_data)
+        names = {configmap["name"] for configmap in configmaps}
+        alert_rules_configmaps.delete([name for name in previous_names if name not in names])
+        return True
+
+    def _remove_alert_rules_configmaps(self, relation_data: RelationDataContent) -> None:
+        """Removes alert rules ConfigMaps and the reference to them from the relation data bag.
+
+        Args:
+            relation_data: The application's prometheus relation data bag.
+        """
+        if "alert_rules_ref" not in relation_data:
+            return
+        from alert_rules_configmap import AlertRulesConfigMaps
+
+        reference = json.loads(relation_data.pop("alert_rules_ref"))
+        AlertRulesConfigMaps(self.app.name).delete(
+            [configmap["name"] for configmap in reference["configmaps"]]
+        )
+
+    def _alert_rules_encoding(self, relation: Relation) -> str:
+        """Returns the encoding to publish alert rules with.
+
+        The encoding set in the `alert_rules_compression` config option is only used if all
+        related Prometheus units advertise support for it.
+
+        Args:
+            relation: The prometheus relation to publish the alert rules to.
+
+        Returns:
+            str: One of `alert_rules_payload.ENCODINGS` or an empty string for plain JSON.
+        """
+        compression = self.model.config.get("alert_rules_compression")
+        if not compression:
+            return ""
+        if compression not in alert_rules_payload.ENCODINGS:
+            logger.warning("Unsupported alert rules compression: %s", compression)
+            return ""
+        if not self._prometheus_supports(relation, compression):
+            logger.debug("Not all Prometheus units support %s compression", compression)
+            return ""
+        return compression
+
+    def _alert_rules_chunk_size(self, relation: Relation) -> int:
+        """Returns the size of chunks to split published alert rules into.
+
+        The size set in the `alert_rules_chunk_size` config option is only used if all related
+        Prometheus units advertise support for chunked alert rules.
+
+        Args:
+            relation: The prometheus relation to publish the alert rules to.
+
+        Returns:
+            int: Chunk size in bytes or 0 if alert rules should not be split.
+        """
+        chunk_size = int(self.model.config.get("alert_rules_chunk_size", 0))
+        if chunk_size <= 0:
+            return 0
+        if not self._prometheus_supports(relation, "chunks"):
+            logger.debug("Not all Prometheus units support chunked alert rules")
+            return 0
+        return chunk_size
+
+    def _alert_rules_storage(self, relation: Relation) -> str:
+        """Returns where to store published alert rules.
+
+        ConfigMap storage, if set in the `alert_rules_storage` config option, is only used if all
+        related Prometheus units advertise support for it.
+
+        Args:
+            relation: The prometheus relation to publish the alert rules to.
+
+        Returns:
+            str: `configmap` or `relation-data`.
+        """
+        storage = self.model.config.get("alert_rules_storage")
+        if storage != "configmap":
+            if storage != "relation-data":
+                logger.warning("Unsupported alert rules storage: %s", storage)
+            return "relation-data"
+        if not self._prometheus_supports(relation, "configmap"):
+            logger.debug("Not all Prometheus units support alert rules in ConfigMaps")
+            return "relation-data"
+        return storage
+
+    def _alert_rules_group_labels(self, relation: Relation) -> bool:
+        """Returns whether labels shared by all rules of a group are published at group level.
+
+        Group-level labels, if enabled by the `hoist_group_labels` config option, are only used
+        if all related Prometheus units advertise support for them. Otherwise, every rule carries
+        all of its labels.
+
+        Args:
+            relation: The prometheus relation to publish the alert rules to.
+
+        Returns:
+            bool: Whether shared labels are hoisted to the group level.
+        """
+        if not self.model.config.get("hoist_group_labels"):
+            return False
+        if not self._prometheus_supports(relation, "group_labels"):
+            logger.debug("Not all Prometheus units support group-level labels")
+            return False
+        return True
+
+    @staticmethod
+    def _prometheus_supports(relation: Relation, feature: str) -> bool:
+        """Checks whether all related Prometheus units advertise support for a payload feature.
+
+        Args:
+            relation: The prometheus relation.
+            feature: Alert rules payload feature, as listed in the `alert_rules_features` key of
+                the Prometheus units' relation data bags.
+
+        Returns:
+            bool: Whether all related Prometheus units support the feature.
+        """
+        return bool(relation.units) and all(
+            feature in json.loads(relation.data[unit].get("alert_rules_features", "[]"))
+            for unit in relation.units
         )
-        if alert_rules_as_dict:
-            prometheus_relation = self.model.get_relation("prometheus")
-            prometheus_relation.data[self.app]["alert_rules"] = json.dumps(alert_rules_content)  # type: ignore[union-attr]  # noqa: E501
 
     def _on_prometheus_configurer_relation_joined(self, event: RelationJoinedEvent) -> None:
         """Handles actions taken when Prometheus Configurer relation joins.
@@ -173,45 +1326,54 @@ class PrometheusConfigurerOperatorCharm(CharmBase):
         )
 
     @property
-    def _prometheus_configurer_layer(self) -> Layer:
+    def _prometheus_configurer_layer(self) -> LayerDict:
         """Constructs the pebble layer for Prometheus configurer.
 
         Returns:
             a Pebble layer specification for the Prometheus configurer workload container.
         """
-        return Layer(
-            {
-                "summary": "Prometheus Configurer pebble layer",
-                "description": "Pebble layer configuration for Prometheus Configurer",
-                "services": {
-                    self._prometheus_configurer_service_name: {
-                        "override": "replace",
-                        "startup": "enabled",
-                        "command": self._prometheus_configurer_service_startup_command,
-                    }
-                },
-            }
-        )
+        return {
+            "summary": "Prometheus Configurer pebble layer",
+            "description": "Pebble layer configuration for Prometheus Configurer",
+            "services": {
+                self._prometheus_configurer_service_name: {
+                    "override": "replace",
+                    "startup": "enabled",
+                    "command": self._prometheus_configurer_service_startup_command,
+                    "environment": self._go_runtime_environment,
+                }
+            },
+        }
 
     @property
-    def _dummy_http_server_layer(self) -> Layer:
+    def _dummy_http_server_layer(self) -> LayerDict:
         """Constructs the pebble layer for the dummy HTTP server.
 
         Returns:
             a Pebble layer specification for the dummy HTTP server workload container.
         """
-        return Layer(
-            {
-                "summary": "Dummy HTTP server pebble layer",
-                "description": "Pebble layer configuration for the dummy HTTP server",
-                "services": {
-                    self._dummy_http_server_service_name: {
-                        "override": "replace",
-                        "startup": "enabled",
-                        "command": "nginx",
-                    }
-                },
-            }
+        return {
+            "summary": "Dummy HTTP server pebble layer",
+            "description": "Pebble layer configuration for the dummy HTTP server",
+            "services": {
+                self._dummy_http_server_service_name: {
+                    "override": "replace",
+                    "startup": "enabled",
+                    "command": "nginx",
+                }
+            },
+        }
+
+    @property
+    def _go_runtime_environment(self) -> Dict[str, str]:
+        """Go runtime environment of Prometheus Configurer, sized after its container limits."""
+        limits = self._stored.prometheus_configurer_limits
+        return go_runtime.environment(
+            limits.get("cpus"),
+            limits.get("memory"),
+            int(self.model.config.get("go_max_procs", 0)),
+            str(self.model.config.get("go_memory_limit", "")),
+            str(self.model.config.get("go_gc", "")),
         )
 
     @property
@@ -220,7 +1382,7 @@ class PrometheusConfigurerOperatorCharm(CharmBase):
             "prometheus_configurer "
             f"-port={str(self.PROMETHEUS_CONFIGURER_PORT)} "
             f"-rules-dir={self.RULES_DIR}/ "
-            f"-prometheusURL={self.DUMMY_HTTP_SERVER_HOST}:{self.DUMMY_HTTP_SERVER_PORT} "
+            f"-prometheusURL={self.DUMMY_HTTP_SERVER_HOST}:{self._reload_port} "
             "-restrict-queries"
         )
         multitenant_label = self.model.config.get("multitenant_label")
@@ -229,13 +1391,94 @@ class PrometheusConfigurerOperatorCharm(CharmBase):
         return command
 
     @property
-    def _dummy_http_server_running(self) -> bool:
+    def _notice_socket(self) -> Optional[str]:
+        """Pebble socket alert rules changes are delivered to as notices, if enabled."""
+        if not self.model.config.get("pebble_notices"):
+            return None
+        return f"/charm/containers/{self._prometheus_configurer_container_name}/pebble.socket"
+
+    @property
+    def _reload_webhook_enabled(self) -> bool:
+        return bool(self.model.config.get("reload_webhook"))
+
+    @property
+    def _reload_port(self) -> int:
+        """Port Prometheus Configurer sends reload requests to."""
+        if self._reload_webhook_enabled:
+            return self.RELOAD_WEBHOOK_PORT
+        return self.DUMMY_HTTP_SERVER_PORT
+
+    @property
+    def _multitenant_label(self) -> str:
+        return (
+            str(self.model.config.get("multitenant_label", ""))
+            or alert_rules_tenants.DEFAULT_MULTITENANT_LABEL
+        )
+
+    @property
+    def _dummy_http_server_started(self) -> bool:
+        """Whether the dummy HTTP server layer was applied, without querying its service."""
+        return self._dummy_http_server_container_name in self._stored.layer_hashes
+
+    def _dummy_http_server_running(self, verify: bool = False) -> bool:
+        """Whether the dummy HTTP server service is running.
+
+        Unless verification is asked for, this is told by whether the dummy HTTP server layer was
+        applied (and not stopped since), so that Pebble isn't queried in every hook.
+
+        Args:
+            verify: Whether to query the state of the service from Pebble.
+        """
+        if not verify:
+            return self._dummy_http_server_started
         try:
-            self._dummy_http_server_container.get_service(self._dummy_http_server_service_name)
-            return True
+            return self._dummy_http_server_container.get_service(
+                self._dummy_http_server_service_name
+            ).is_running()
         except ModelError:
             return False
 
 
+def _publish_hash(publish_state: dict) -> str:
+    """Returns the fingerprint of alert rules and of the way they're published."""
+    return alert_rules_payload.fingerprint(alert_rules_payload.dumps(publish_state))
+
+
+def _alert_rules_metadata(alert_rules: dict) -> dict:
+    return {key: value for key, value in alert_rules.items() if key != "groups"}
+
+
+def _count_rules(tenant_groups: Dict[str, List[dict]]) -> int:
+    return sum(len(group["rules"]) for groups in tenant_groups.values() for group in groups)
+
+
+def _rule_count(rule: dict) -> int:
+    return 1
+
+
+def _rule_cost(rule: dict) -> int:
+    return max(1, math.ceil(alert_rules_cost.estimate(rule["expr"])))
+
+
+def _dispatched_hook() -> str:
+    """Name of the Juju hook being dispatched, empty outside of Juju."""
+    return os.environ.get("JUJU_DISPATCH_PATH", "").rpartition("/")[2]
+
+
+def _watcher_running(pid: int) -> bool:
+    """Checks whether a process with a given PID is a running alert rules watcher.
+
+    PIDs get reused, so the command line of the process is checked as well.
+    """
+    if not pid:
+        return False
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+            cmdline = cmdline_file.read().decode(errors="replace")
+    except OSError:
+        return False
+    return any(script in cmdline for script in WATCHER_SCRIPTS)
+
+
 if __name__ == "__main__":
     main(PrometheusConfigurerOperatorCharm)
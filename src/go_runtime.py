@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements tuning of the Go runtime of Prometheus Configurer.
+The Go runtime isn't aware of the resource limits of the container it runs in: it sizes
+`GOMAXPROCS` after the number of cores of the node and sets no soft memory limit, so that under
+load the workload gets throttled by the CPU quota or killed for exceeding its memory limit.
+Both are derived from the cgroup (v2, or v1 as a fallback) limits of the container instead:
+- `GOMAXPROCS` is set to the CPU quota rounded down, but at least 1,
+- `GOMEMLIMIT` is set to a share of the memory limit, leaving headroom for non-heap memory.
+Any of them, as well as `GOGC`, can be overridden.
+"""
+
+import math
+from typing import Callable, Dict, Optional
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V2_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+# cgroup v1 reports no memory limit as the largest page-aligned 64 bit signed integer
+UNLIMITED_MEMORY_THRESHOLD = 2**60
+MEMORY_LIMIT_SHARE = 0.9
+DEFAULT_GOGC = "100"
+
+
+def cpu_limit(read: Callable[[str], Optional[str]]) -> Optional[float]:
+    """Reads the CPU limit of a container from its cgroup.
+
+    Args:
+        read: Reads a file of the container, returning None if it doesn't exist.
+
+    Returns:
+        float: Number of CPUs the container is limited to, None if it's not limited.
+    """
+    cpu_max = read(CGROUP_V2_CPU_MAX)
+    if cpu_max is not None:
+        quota, _, period = cpu_max.strip().partition(" ")
+    else:
+        quota = (read(CGROUP_V1_CPU_QUOTA) or "").strip()
+        period = (read(CGROUP_V1_CPU_PERIOD) or "").strip()
+    try:
+        cpus = int(quota) / int(period or "100000")
+    except (ValueError, ZeroDivisionError):
+        return None
+    return cpus if cpus > 0 else None
+
+
+def memory_limit(read: Callable[[str], Optional[str]]) -> Optional[int]:
+    """Reads the memory limit of a container from its cgroup.
+
+    Args:
+        read: Reads a file of the container, returning None if it doesn't exist.
+
+    Returns:
+        int: Number of bytes the container is limited to, None if it's not limited.
+    """
+    memory_max = read(CGROUP_V2_MEMORY_MAX)
+    if memory_max is None:
+        memory_max = read(CGROUP_V1_MEMORY_LIMIT)
+    try:
+        memory = int((memory_max or "").strip())
+    except ValueError:
+        return None
+    return memory if 0 < memory < UNLIMITED_MEMORY_THRESHOLD else None
+
+
+def environment(
+    cpus: Optional[float],
+    memory: Optional[int],
+    max_procs: int = 0,
+    memory_limit_override: str = "",
+    gc: str = "",
+) -> Dict[str, str]:
+    """Derives Go runtime environment variables from container limits.
+
+    Args:
+        cpus: Number of CPUs the container is limited to, None if it's not limited.
+        memory: Number of bytes the container is limited to, None if it's not limited.
+        max_procs: `GOMAXPROCS` override, 0 to derive it from the CPU limit.
+        memory_limit_override: `GOMEMLIMIT` override (e.g. `512MiB`), empty to derive it from the
+            memory limit.
+        gc: `GOGC` override, empty for the default.
+
+    Returns:
+        dict: Go runtime environment variables.
+    """
+    env = {"GOGC": gc or DEFAULT_GOGC}
+    if max_procs:
+        env["GOMAXPROCS"] = str(max_procs)
+    elif cpus:
+        env["GOMAXPROCS"] = str(max(1, math.floor(cpus)))
+    if memory_limit_override:
+        env["GOMEMLIMIT"] = memory_limit_override
+    elif memory:
+        env["GOMEMLIMIT"] = str(int(memory * MEMORY_LIMIT_SHARE))
+    return env
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements patching of compute resources of workload containers.
+Juju creates the StatefulSet of the application without any resource requests or limits, so the
+pods get no scheduling guarantees. Requests and limits of each workload container are patched into
+the StatefulSet the same way `KubernetesServicePatch` patches the Service. Changing the pod
+template makes Kubernetes recreate the pod, so the StatefulSet is only patched if its resources
+differ from the desired ones, compared canonically (e.g. `1` CPU equals `1000m`).
+The application needs to be trusted (`juju trust`) to patch its StatefulSet.
+"""
+
+import logging
+from types import MethodType
+from typing import Callable, Dict, List, Optional, Union
+
+from lightkube import ApiError, Client
+from lightkube.core import exceptions
+from lightkube.resources.apps_v1 import StatefulSet
+from lightkube.utils.quantity import equals_canonically, parse_quantity
+from ops.charm import CharmBase
+from ops.framework import BoundEvent, Object
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ("cpu", "memory")
+
+
+def resource_requirements(requests: Dict[str, str], limits: Dict[str, str]) -> dict:
+    """Validates resource requests and limits of a container.
+
+    Args:
+        requests: Requested quantity of each resource (`cpu` and `memory`), empty if not
+            requested.
+        limits: Limit of each resource (`cpu` and `memory`), empty if not limited.
+
+    Returns:
+        dict: Resource requirements (`requests` and `limits`), with empty values dropped.
+
+    Raises:
+        ValueError: If a quantity is invalid or a request exceeds its limit.
+    """
+    requirements = {
+        "requests": {resource: value for resource, value in requests.items() if value},
+        "limits": {resource: value for resource, value in limits.items() if value},
+    }
+    for kind in requirements.values():
+        for resource, value in kind.items():
+            if resource not in RESOURCES:
+                raise ValueError(f"unsupported resource: {resource}")
+            parse_quantity(value)
+    for resource, request in requirements["requests"].items():
+        limit = requirements["limits"].get(resource)
+        request_quantity = parse_quantity(request)
+        limit_quantity = parse_quantity(limit)
+        if request_quantity is not None and limit_quantity is not None:
+            if request_quantity > limit_quantity:
+                raise ValueError(f"{resource} request {request} exceeds limit {limit}")
+    return requirements
+
+
+class KubernetesResourcesPatch(Object):
+    """A utility for patching resource requirements into the StatefulSet set up by Juju."""
+
+    def __init__(
+        self,
+        charm: CharmBase,
+        resource_requirements: Callable[[], Dict[str, dict]],
+        *,
+        refresh_event: Optional[Union[BoundEvent, List[BoundEvent]]] = None,
+    ):
+        """Constructor for KubernetesResourcesPatch.
+
+        Args:
+            charm: the charm that is instantiating the library.
+            resource_requirements: returns resource requirements (`requests` and `limits`) of each
+                workload container, as returned by `resource_requirements`. Containers left out
+                are not patched.
+            refresh_event: an optional bound event or list of bound events which will be
+                observed to re-apply the patch (e.g. on config change). The `install` and
+                `upgrade-charm` events would be observed regardless.
+        """
+        super().__init__(charm, "kubernetes-resources-patch")
+        self.charm = charm
+        self._resource_requirements = resource_requirements
+
+        # Make mypy type checking happy that self._patch is a method
+        assert isinstance(self._patch, MethodType)
+        self.framework.observe(charm.on.install, self._patch)
+        self.framework.observe(charm.on.upgrade_charm, self._patch)
+        if refresh_event:
+            if not isinstance(refresh_event, list):
+                refresh_event = [refresh_event]
+            for evt in refresh_event:
+                self.framework.observe(evt, self._patch)
+
+    def _patch(self, _) -> None:
+        """Patches resource requirements of workload containers into the StatefulSet."""
+        try:
+            requirements = self._resource_requirements()
+        except ValueError as e:
+            logger.error("Invalid resource requirements: %s", e)
+            return
+        try:
+            client = Client()
+        except exceptions.ConfigError as e:
+            logger.warning("Error creating k8s client: %s", e)
+            return
+
+        try:
+            statefulset = client.get(StatefulSet, self._app, namespace=self._namespace)
+            if self._is_patched(statefulset, requirements):
+                return
+            client.patch(
+                StatefulSet,
+                self._app,
+                self._statefulset_patch(requirements),
+                namespace=self._namespace,
+            )
+        except ApiError as e:
+            if e.status.code == 403:
+                logger.error("Kubernetes resources patch failed: `juju trust` this application.")
+            else:
+                logger.error("Kubernetes resources patch failed: %s", str(e))
+        else:
+            logger.info("Kubernetes StatefulSet '%s' resources patched successfully", self._app)
+
+    @staticmethod
+    def _is_patched(statefulset: StatefulSet, requirements: Dict[str, dict]) -> bool:
+        containers = {
+            container.name: container
+            for container in statefulset.spec.template.spec.containers  # type: ignore[union-attr]
+        }
+        for name, container_requirements in requirements.items():
+            if name not in containers:
+                continue
+            resources = containers[name].resources
+            for kind in ("requests", "limits"):
+                current = (getattr(resources, kind) if resources else None) or {}
+                if not equals_canonically(current, container_requirements[kind]):
+                    return False
+        return True
+
+    @staticmethod
+    def _statefulset_patch(requirements: Dict[str, dict]) -> dict:
+        # Resources which aren't required anymore are removed by patching them to null
+        containers = [
+            {
+                "name": name,
+                "resources": {
+                    kind: {
+                        resource: container_requirements[kind].get(resource)
+                        for resource in RESOURCES
+                    }
+                    for kind in ("requests", "limits")
+                },
+            }
+            for name, container_requirements in sorted(requirements.items())
+        ]
+        return {"spec": {"template": {"spec": {"containers": containers}}}}
+
+    @property
+    def _app(self) -> str:
+        """Name of the current Juju application.
+
+        Returns:
+            str: A string containing the name of the current Juju application.
+        """
+        return self.charm.app.name
+
+    @property
+    def _namespace(self) -> str:
+        """The Kubernetes namespace we're running in.
+
+        Returns:
+            str: A string containing the name of the current Kubernetes namespace.
+        """
+        with open("/var/run/secrets/kubernetes.io/serviceaccount/namespace", "r") as f:
+            return f.read().strip()
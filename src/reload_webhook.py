@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements a receiver of Prometheus reload requests firing the custom Juju event
+(alert_rules_changed).
+Prometheus Configurer asks Prometheus to reload its configuration (`POST /-/reload` at the URL
+given by `-prometheusURL`) exactly once after each completed write of the rules files. Pointing
+that URL at this receiver, instead of the dummy HTTP server, gives the charm an exact,
+write-complete signal of alert rules changes, so that the rules directory doesn't need to be
+watched for changes.
+The receiver runs in a background process of the charm container, the same way as the rules
+directory watcher. It only listens on the loopback interface, which the workload containers share
+with the charm container.
+Reload requests are responded to right away and the event is fired from a worker thread, so that
+Prometheus Configurer isn't held up by the dispatch of a hook. Reload requests arriving while the
+event is being fired are coalesced into a single further one.
+Extra directories given to the receiver, which Prometheus Configurer doesn't read (e.g. rule
+templates), are still watched for changes with `watchdog`.
+"""
+
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Optional
+
+from ops.charm import CharmBase
+from ops.framework import Object
+
+import alert_rules_tracing
+import rules_dir_watcher
+from rules_dir_watcher import dispatch, start_background_process
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE_PATH = "/var/log/prometheus-configurer-reload-webhook.log"
+RELOAD_PATH = "/-/reload"
+
+
+class ReloadWebhook(Object):
+    def __init__(
+        self,
+        charm: CharmBase,
+        port: int,
+        extra_dirs: Optional[List[str]] = None,
+        notice_socket: Optional[str] = None,
+    ):
+        super().__init__(charm, None)
+        self._charm = charm
+        self._port = port
+        self._extra_dirs = extra_dirs or []
+        self._notice_socket = notice_socket
+
+    def start(self) -> int:
+        """Wraps the reload requests receiver in a new background process.
+
+        Starting the receiver while another one is already running is harmless, as the new one
+        exits as soon as it fails to bind to the port.
+
+        Returns:
+            int: PID of the receiver process.
+        """
+        logger.info("Starting reload webhook.")
+        pid = start_background_process(
+            self._charm,
+            "src/reload_webhook.py",
+            str(self._port),
+            LOG_FILE_PATH,
+            self._notice_socket,
+            self._extra_dirs,
+        )
+        logger.info(f"Started reload webhook process with PID {pid}.")
+        return pid
+
+
+class Dispatcher:
+    def __init__(self, run_cmd: str, unit: str, charm_dir: str):
+        """Fires alert_rules_changed Juju event from a worker thread.
+
+        Args:
+            run_cmd: Command running commands in the unit's hook context.
+            unit: Name of the unit.
+            charm_dir: Directory of the charm.
+        """
+        self.run_cmd = run_cmd
+        self.unit = unit
+        self.charm_dir = charm_dir
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._trace_context = None  # type: Optional[Dict[str, str]]
+
+    def start(self) -> threading.Thread:
+        """Starts the worker thread.
+
+        Returns:
+            Thread: The worker thread.
+        """
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        return thread
+
+    def request(self, trace_context: Optional[Dict[str, str]] = None) -> None:
+        """Requests alert_rules_changed to be fired, unless it's already pending.
+
+        Args:
+            trace_context: Trace context of the change. Only the context of the last of
+                coalesced requests is passed on.
+        """
+        with self._lock:
+            self._trace_context = trace_context
+            self._pending.set()
+
+    def _run(self) -> None:
+        while True:
+            self._pending.wait()
+            with self._lock:
+                self._pending.clear()
+                trace_context, self._trace_context = self._trace_context, None
+            try:
+                dispatch(self.run_cmd, self.unit, self.charm_dir, trace_context)
+            except Exception as e:
+                logger.error("Failed to fire alert_rules_changed: %s", e)
+
+
+class Handler(BaseHTTPRequestHandler):
+    dispatcher: Optional[Dispatcher] = None
+
+    def do_POST(self):  # noqa: N802
+        """Fires alert_rules_changed Juju event upon reload requests."""
+        self._respond()
+        if self.path == RELOAD_PATH and self.dispatcher:
+            # Reload requests are sent right after the rules files are written
+            self.dispatcher.request(alert_rules_tracing.new_context("reload-webhook"))
+
+    def do_GET(self):  # noqa: N802
+        """Responds to any other request the way the dummy HTTP server does."""
+        self._respond()
+
+    def _respond(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def main():
+    """Starts the reload requests receiver."""
+    port, run_cmd, unit, charm_dir, *extra_dirs = sys.argv[1:]
+
+    try:
+        server = HTTPServer(("127.0.0.1", int(port)), Handler)
+    except OSError as e:
+        logger.error("Reload webhook not started: %s", e)
+        return
+    Handler.dispatcher = Dispatcher(run_cmd, unit, charm_dir)
+    Handler.dispatcher.start()
+    if extra_dirs:
+        # Prometheus Configurer doesn't read the extra directories, so it never signals changes
+        rules_dir_watcher.watch(
+            [], rules_dir_watcher.Handler(Handler.dispatcher.request), extra_dirs
+        )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,21 +5,26 @@
 """This module implements custom Juju event (alert_rules_changed) fired upon any change in a given
 directory mounted to the workload container. It is based on `watchdog`.
 In this particular case, it is used by the prometheus-configurer-k8s-operator charm to detect
-changes of the alerting rules. Thanks to this mechanism, Prometheus Configurer knows when to
-update the configuration of the Prometheus Server.
+changes of the alerting rules (and, optionally, of other directories, e.g. rule templates). Thanks
+to this mechanism, Prometheus Configurer knows when to update the configuration of the Prometheus
+Server.
 """
 
+import json
 import logging
 import os
+import shlex
 import subprocess
 import sys
 import time
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 
 from ops.charm import CharmBase, CharmEvents
 from ops.framework import EventBase, EventSource, Object
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
+from ops.pebble import Client, NoticeType
+
+import alert_rules_tracing
 
 logger = logging.getLogger(__name__)
 
@@ -33,69 +38,184 @@ class AlertRulesChangedCharmEvents(CharmEvents):
 
 
 LOG_FILE_PATH = "/var/log/prometheus-configurer-watchdog.log"
+ALERT_RULES_CHANGED_NOTICE_KEY = "canonical.com/prometheus-configurer/alert-rules-changed"
+# Set in the environment of background processes delivering changes as Pebble notices
+NOTICE_SOCKET_ENV = "ALERT_RULES_NOTICE_SOCKET"
 
 
 class AlertRulesDirWatcher(Object):
-    def __init__(self, charm: CharmBase, rules_dir: str):
+    def __init__(
+        self,
+        charm: CharmBase,
+        rules_dir: str,
+        extra_dirs: Optional[List[str]] = None,
+        notice_socket: Optional[str] = None,
+    ):
         super().__init__(charm, None)
         self._charm = charm
         self._rules_dir = rules_dir
+        self._extra_dirs = extra_dirs or []
+        self._notice_socket = notice_socket
 
-    def start_watchdog(self):
-        """Wraps watchdog in a new background process."""
-        logger.info("Starting alert rules watchdog.")
-
-        # We need to trick Juju into thinking that we are not running
-        # in a hook context, as Juju will disallow use of juju-run.
-        new_env = os.environ.copy()
-        if "JUJU_CONTEXT_ID" in new_env:
-            new_env.pop("JUJU_CONTEXT_ID")
+    def start_watchdog(self) -> int:
+        """Wraps watchdog in a new background process.
 
-        juju_bin = (
-            "/usr/bin/juju-exec" if Path("/usr/bin/juju-exec").exists() else "/usr/bin/juju-run"
+        Returns:
+            int: PID of the watchdog process.
+        """
+        logger.info("Starting alert rules watchdog.")
+        pid = start_background_process(
+            self._charm,
+            "src/rules_dir_watcher.py",
+            self._rules_dir,
+            LOG_FILE_PATH,
+            self._notice_socket,
+            self._extra_dirs,
         )
-        pid = subprocess.Popen(
-            args=[
-                "/usr/bin/python3",
-                "src/rules_dir_watcher.py",
-                self._rules_dir,
-                juju_bin,
-                self._charm.unit.name,
-                self._charm.charm_dir,
-            ],
-            stdout=open(LOG_FILE_PATH, "a"),
-            stderr=subprocess.STDOUT,
-            env=new_env,
-        ).pid
-
         logger.info(f"Started alert rules watchdog process with PID {pid}.")
+        return pid
+
+
+def start_background_process(
+    charm: CharmBase,
+    script: str,
+    arg: str,
+    log_file_path: str,
+    notice_socket: Optional[str] = None,
+    extra_dirs: Optional[List[str]] = None,
+) -> int:
+    """Starts a script firing alert_rules_changed Juju event in a new background process.
+
+    The script is run with the command running commands in the unit's hook context, the unit
+    name and the charm directory as arguments, after the given one and before the extra
+    directories to watch.
+
+    Args:
+        charm: The charm.
+        script: Path of the script, relative to the charm directory.
+        arg: First argument of the script.
+        log_file_path: File the output of the process is appended to.
+        notice_socket: Pebble socket changes are delivered to as notices, if enabled.
+        extra_dirs: Extra directories to watch for changes.
+
+    Returns:
+        int: PID of the process.
+    """
+    # We need to trick Juju into thinking that we are not running
+    # in a hook context, as Juju will disallow use of juju-run.
+    new_env = os.environ.copy()
+    if "JUJU_CONTEXT_ID" in new_env:
+        new_env.pop("JUJU_CONTEXT_ID")
+    if notice_socket:
+        new_env[NOTICE_SOCKET_ENV] = notice_socket
+
+    juju_bin = "/usr/bin/juju-exec" if Path("/usr/bin/juju-exec").exists() else "/usr/bin/juju-run"
+    return subprocess.Popen(
+        args=[
+            "/usr/bin/python3",
+            script,
+            arg,
+            juju_bin,
+            charm.unit.name,
+            charm.charm_dir,
+            *(extra_dirs or []),
+        ],
+        stdout=open(log_file_path, "a"),
+        stderr=subprocess.STDOUT,
+        env=new_env,
+    ).pid
+
+
+def dispatch(
+    run_cmd: str, unit: str, charm_dir: str, trace_context: Optional[Dict[str, str]] = None
+):
+    """Fires alert_rules_changed Juju event.
+
+    If a Pebble socket is set in the environment, a Pebble custom notice is recorded instead,
+    which Juju delivers to the charm as a pebble-custom-notice event. Pebble coalesces repeated
+    notices with the same key, so a burst of changes doesn't queue up a hook per change.
+    The trace context of the change, if any, is stamped with the dispatch time and passed on to
+    the charm in the notice data or in the environment of the hook.
+    """
+    if trace_context:
+        trace_context = alert_rules_tracing.dispatched(trace_context)
+    notice_socket = os.environ.get(NOTICE_SOCKET_ENV)
+    if notice_socket:
+        Client(socket_path=notice_socket).notify(
+            NoticeType.CUSTOM, ALERT_RULES_CHANGED_NOTICE_KEY, data=trace_context
+        )
+        return
+    dispatch_env = "JUJU_DISPATCH_PATH=hooks/alert_rules_changed"
+    if trace_context:
+        dispatch_env += (
+            f" {alert_rules_tracing.TRACE_CONTEXT_ENV}={shlex.quote(json.dumps(trace_context))}"
+        )
+    subprocess.run([run_cmd, "-u", unit, f"{dispatch_env} {charm_dir}/dispatch"])
 
 
-def dispatch(run_cmd: str, unit: str, charm_dir: str):
-    """Fires alert_rules_changed Juju event."""
-    dispatch_sub_cmd = "JUJU_DISPATCH_PATH=hooks/alert_rules_changed {}/dispatch"
-    subprocess.run([run_cmd, "-u", unit, dispatch_sub_cmd.format(charm_dir)])
-
+class Handler:
+    def __init__(self, on_change: Callable[[Dict[str, str]], None]):
+        """Starts traces of changes in watched directories.
 
-class Handler(FileSystemEventHandler):
-    def __init__(self, run_cmd: str, unit: str, charm_dir: str):
-        self.run_cmd = run_cmd
-        self.unit = unit
-        self.charm_dir = charm_dir
+        Args:
+            on_change: Callback ran with the trace context of each change.
+        """
+        self.on_change = on_change
 
     def on_any_event(self, event):
         """Watchdog's callback ran on any change in the watched directory."""
-        dispatch(self.run_cmd, self.unit, self.charm_dir)
+        try:
+            written: Optional[float] = os.stat(event.src_path).st_mtime
+        except OSError:
+            # E.g. deleted files
+            written = None
+        # An exception would kill watchdog's dispatch thread, silently ending change delivery
+        try:
+            self.on_change(alert_rules_tracing.new_context("watchdog", written))
+        except Exception as e:
+            logger.error("Failed to fire alert_rules_changed: %s", e)
+
+
+def watch(dirs: List[str], handler: Handler, optional_dirs: Optional[List[str]] = None):
+    """Starts watchdog's observer of the given directories in a new thread.
+
+    Watchdog is only imported here, so that hooks importing this module don't load it.
+
+    Args:
+        dirs: Directories to watch.
+        handler: Handler of changes.
+        optional_dirs: Directories to watch if they exist.
+
+    Returns:
+        Observer: The started observer.
+    """
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    class EventHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            handler.on_any_event(event)
+
+    observer = Observer()
+    event_handler = EventHandler()
+    for directory in dirs:
+        observer.schedule(event_handler, directory, recursive=True)
+    for directory in optional_dirs or []:
+        if os.path.isdir(directory):
+            observer.schedule(event_handler, directory, recursive=True)
+    observer.start()
+    return observer
 
 
 def main():
     """Starts watchdog."""
-    rules_dir, run_cmd, unit, charm_dir = sys.argv[1:]
+    rules_dir, run_cmd, unit, charm_dir, *extra_dirs = sys.argv[1:]
 
-    observer = Observer()
-    event_handler = Handler(run_cmd, unit, charm_dir)
-    observer.schedule(event_handler, rules_dir, recursive=True)
-    observer.start()
+    observer = watch(
+        [rules_dir],
+        Handler(lambda trace_context: dispatch(run_cmd, unit, charm_dir, trace_context)),
+        extra_dirs,
+    )
     try:
         while True:
             time.sleep(5)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""This module implements timing of the stages of a hook.
+Stages (e.g. parsing of alert rules or a Pebble call) are timed with a monotonic clock, and
+details such as the number of rules or the payload size can be attached to them. Each stage is
+logged at debug level as it completes, and all stages of a hook are appended as a single JSON line
+to a local file once the hook is done. The file is bounded: once it would exceed its maximum size,
+it's rotated, keeping a single previous file.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+logger = logging.getLogger(__name__)
+
+MAX_TIMINGS_FILE_SIZE = 1024 * 1024
+
+
+class StageTimer:
+    def __init__(self, hook: str):
+        self.hook = hook
+        self.stages: List[dict] = []
+        self._started = time.time()
+
+    @contextmanager
+    def stage(self, name: str, **details) -> Iterator[dict]:
+        """Times a stage.
+
+        Args:
+            name: Name of the stage.
+            details: Details of the stage known upfront.
+
+        Yields:
+            dict: Details of the stage, which more details can be added to.
+        """
+        stage = {"stage": name, **details}
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self.stages.append(stage)
+            logger.debug("Stage %s of %s: %s", name, self.hook, stage)
+
+    def write(self, path: str, max_size: int = MAX_TIMINGS_FILE_SIZE) -> None:
+        """Appends the stages timed so far to a file and forgets them.
+
+        Args:
+            path: Path of the timings file.
+            max_size: Size in bytes the timings file is rotated at.
+        """
+        if not self.stages:
+            return
+        record = {
+            "hook": self.hook,
+            "timestamp": self._started,
+            "duration_ms": round((time.time() - self._started) * 1000, 3),
+            "stages": self.stages,
+        }
+        line = json.dumps(record) + "\n"
+        self.stages = []
+        try:
+            if os.path.exists(path) and os.path.getsize(path) + len(line) > max_size:
+                os.replace(path, f"{path}.1")
+            with open(path, "a") as timings_file:
+                timings_file.write(line)
+        except OSError as e:
+            logger.warning("Failed to write stage timings: %s", e)
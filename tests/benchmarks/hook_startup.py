@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Benchmark of the charm's import time and startup time for each type of hook.
+Each hook is run in a fresh interpreter, as a hook would be run by Juju, with the charm set up by
+`ops.testing.Harness` rather than `ops.main`, so startup times include some Harness overhead.
+Besides timings, it reports which of the heavy dependencies were imported, as only the hooks
+needing them should pay for their import:
+- lightkube, only needed by Kubernetes patches (install, upgrade-charm and config-changed),
+- the prometheus_remote_write library, only needed to build alert rules,
+- watchdog, only needed by the rules directory watcher process, never by hooks,
+- alert_rules_profiling (cProfile, pstats and tracemalloc), only needed by its action.
+The unit is set up as it would be once running: it leads, it's related to Prometheus and alert
+rules were already built from the rules in `tests/unit/test_rules`. Hooks which don't change any
+input of alert rules (e.g. update-status) don't rebuild them, while alert rules changes signals
+(alert_rules_changed and the Pebble custom notice) always do, so they import the
+prometheus_remote_write library, which parses rule files.
+
+Usage: python tests/benchmarks/hook_startup.py [--runs N] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+CHARM_DIR = Path(__file__).resolve().parents[2]
+HOOKS = (
+    "install",
+    "config-changed",
+    "upgrade-charm",
+    "update-status",
+    "prometheus-configurer-pebble-ready",
+    "prometheus-configurer-pebble-custom-notice",
+    "alert_rules_changed",
+)
+HEAVY_MODULES = {
+    "lightkube": "lightkube",
+    "remote_write_lib": "charms.prometheus_k8s.v0.prometheus_remote_write",
+    "watchdog": "watchdog",
+    "profiling": "alert_rules_profiling",
+}
+
+
+def run_hook(hook: str) -> Dict[str, object]:
+    """Imports the charm and runs a hook, in the current interpreter.
+
+    Args:
+        hook: Name of the hook to run.
+
+    Returns:
+        dict: Import time (`import_ms`) and startup time (`startup_ms`) of the charm, in
+            milliseconds, whether alert rules were published (`published`) and whether each of
+            the heavy modules was imported.
+    """
+    os.environ["JUJU_DISPATCH_PATH"] = f"hooks/{hook}"
+    start = time.perf_counter()
+    import charm
+
+    imported = time.perf_counter()
+
+    from contextlib import ExitStack
+    from unittest.mock import PropertyMock, patch
+
+    from ops import testing
+
+    harness = testing.Harness(charm.PrometheusConfigurerOperatorCharm)
+    with ExitStack() as stack:
+        # Watcher processes are not started, only checked for
+        stack.enter_context(
+            patch("rules_dir_watcher.AlertRulesDirWatcher.start_watchdog", return_value=0)
+        )
+        stack.enter_context(
+            patch.object(
+                charm.PrometheusConfigurerOperatorCharm,
+                "STAGE_TIMINGS_PATH",
+                os.devnull,
+            )
+        )
+        stack.enter_context(
+            patch.object(
+                charm.PrometheusConfigurerOperatorCharm,
+                "RULES_DIR",
+                str(CHARM_DIR / "tests" / "unit" / "test_rules"),
+            )
+        )
+        stack.enter_context(
+            patch.object(
+                charm.PrometheusConfigurerOperatorCharm,
+                "ADMITTED_ALERT_RULES_DIR",
+                stack.enter_context(tempfile.TemporaryDirectory()),
+            )
+        )
+        if hook in ("install", "upgrade-charm"):
+            stack.enter_context(
+                patch(
+                    "charms.observability_libs.v1.kubernetes_service_patch."
+                    "KubernetesServicePatch._namespace",
+                    new_callable=PropertyMock,
+                    return_value="benchmark",
+                )
+            )
+        # Alert rules are only built once there's a relation to publish them in
+        relation_id = harness.add_relation("prometheus", "prometheus-k8s")
+        harness.set_leader(True)
+        harness_ready = time.perf_counter()
+        harness.begin()
+        # Alert rules were built by an earlier hook, as they would have been in a running unit
+        seeding_started = time.perf_counter()
+        harness.charm._stored.alert_rules_inputs_hash = harness.charm._alert_rules_inputs_hash(
+            harness.model.get_relation("prometheus", relation_id)
+        )
+        harness_ready += time.perf_counter() - seeding_started
+        if hook == "prometheus-configurer-pebble-ready":
+            harness.container_pebble_ready("prometheus-configurer")
+        elif hook == "prometheus-configurer-pebble-custom-notice":
+            harness.set_can_connect("prometheus-configurer", True)
+            harness.pebble_notify("prometheus-configurer", charm.ALERT_RULES_CHANGED_NOTICE_KEY)
+        else:
+            getattr(harness.charm.on, hook.replace("-", "_")).emit()
+        done = time.perf_counter()
+        published = "alert_rules" in harness.get_relation_data(relation_id, harness.model.app)
+    harness.cleanup()
+    result: Dict[str, object] = {
+        "import_ms": round((imported - start) * 1000, 1),
+        "startup_ms": round((done - harness_ready) * 1000, 1),
+        "published": published,
+    }
+    for name, module in HEAVY_MODULES.items():
+        result[name] = module in sys.modules
+    return result
+
+
+def measure(hook: str, runs: int = 1) -> Dict[str, object]:
+    """Runs a hook in fresh interpreters and reports the fastest run.
+
+    Args:
+        hook: Name of the hook to run.
+        runs: Number of runs.
+
+    Returns:
+        dict: Results of the fastest run, as returned by `run_hook`.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(CHARM_DIR), str(CHARM_DIR / "lib"), str(CHARM_DIR / "src")]
+    )
+    results: List[Dict[str, object]] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, "--hook", hook],
+            cwd=CHARM_DIR,
+            env=env,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(results, key=lambda result: float(str(result["startup_ms"])))
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hook", choices=HOOKS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    if args.hook:
+        print(json.dumps(run_hook(args.hook)))
+        return
+    results = {hook: measure(hook, args.runs) for hook in HOOKS}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ["import_ms", "startup_ms", "published", *HEAVY_MODULES]
+    print(f"{'hook':<45}" + "".join(f"{column:>18}" for column in columns))
+    for hook, result in results.items():
+        print(f"{hook:<45}" + "".join(f"{str(result[column]):>18}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
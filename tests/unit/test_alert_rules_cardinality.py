@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_cardinality
+
+
+class TestAlertRulesCardinality(unittest.TestCase):
+    def test_given_unaggregated_expression_when_estimate_then_unaggregated_risk_is_returned(self):
+        self.assertEqual(
+            alert_rules_cardinality.estimate({"alert": "Down", "expr": "up == 0"}),
+            alert_rules_cardinality.UNAGGREGATED_RISK,
+        )
+
+    def test_given_aggregation_by_labels_when_estimate_then_risk_of_grouping_labels_is_returned(
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_cardinality.estimate({"alert": "A", "expr": "sum by (job) (x) > 1"}), 1.0
+        )
+        self.assertEqual(
+            alert_rules_cardinality.estimate({"alert": "A", "expr": "sum(x) by (job, pod) > 1"}),
+            11.0,
+        )
+        self.assertEqual(
+            alert_rules_cardinality.estimate({"alert": "A", "expr": "sum(sum(x) by (pod)) > 1"}),
+            0.0,
+        )
+
+    def test_given_aggregation_without_labels_when_estimate_then_unaggregated_risk_is_returned(
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_cardinality.estimate({"alert": "A", "expr": "sum without (pod) (x)"}),
+            alert_rules_cardinality.UNAGGREGATED_RISK,
+        )
+
+    def test_given_templated_labels_when_estimate_then_templates_add_to_risk(self):
+        rule = {
+            "alert": "A",
+            "expr": "sum(x) > 1",
+            "labels": {"value": "{{ $value }}", "where": "{{ $labels.instance }}", "static": "a"},
+        }
+
+        self.assertEqual(alert_rules_cardinality.estimate(rule), 110.0)
+
+    def test_given_recording_rule_when_estimate_then_no_risk_is_returned(self):
+        self.assertEqual(alert_rules_cardinality.estimate({"record": "r", "expr": "up"}), 0.0)
+
+    def test_given_tenant_groups_when_report_then_risks_are_aggregated_per_rule_and_tenant(self):
+        tenant_groups = {
+            "a": [
+                {
+                    "name": "g",
+                    "rules": [{"alert": "A", "expr": "up"}, {"record": "r", "expr": "up"}],
+                }
+            ]
+        }
+
+        self.assertEqual(
+            alert_rules_cardinality.report(tenant_groups),
+            {"risk": 20.0, "tenants": {"a": {"risk": 20.0, "rules": {"g/A": [20.0]}}}},
+        )
+
+    def test_given_alert_rules_sharing_a_name_when_report_then_risks_of_all_of_them_are_reported(  # noqa: E501
+        self,
+    ):
+        tenant_groups = {
+            "a": [
+                {
+                    "name": "g",
+                    "rules": [
+                        {"alert": "A", "expr": "up", "labels": {"severity": "critical"}},
+                        {"alert": "A", "expr": "sum(up) by (job)", "labels": {"severity": "low"}},
+                    ],
+                }
+            ]
+        }
+
+        self.assertEqual(
+            alert_rules_cardinality.report(tenant_groups),
+            {"risk": 21.0, "tenants": {"a": {"risk": 21.0, "rules": {"g/A": [20.0, 1.0]}}}},
+        )
+
+    def test_given_rules_over_threshold_when_block_then_risky_rules_are_dropped(self):
+        groups = [
+            {
+                "name": "g",
+                "rules": [{"alert": "A", "expr": "up"}, {"alert": "B", "expr": "sum(up)"}],
+            },
+            {"name": "h", "rules": [{"alert": "C", "expr": "up"}, {"alert": "C", "expr": "up"}]},
+        ]
+
+        allowed_groups, blocked = alert_rules_cardinality.block(groups, 10)
+
+        self.assertEqual(
+            allowed_groups, [{"name": "g", "rules": [{"alert": "B", "expr": "sum(up)"}]}]
+        )
+        self.assertEqual(blocked, ["g/A", "h/C", "h/C"])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import Mock, PropertyMock, patch
+
+from lightkube import ApiError
+from lightkube.resources.core_v1 import ConfigMap
+
+import alert_rules_payload
+from alert_rules_configmap import AlertRulesConfigMaps
+
+TEST_APP_NAME = "prometheus-configurer-k8s"
+TEST_NAMESPACE = "test-namespace"
+TEST_CHUNKS = ['{"groups":[{"name":"first"}]}', '{"groups":[{"name":"second"}]}']
+
+
+class TestAlertRulesConfigMaps(unittest.TestCase):
+    def setUp(self):
+        client_patcher = patch("alert_rules_configmap.Client")
+        self.patched_client = client_patcher.start().return_value
+        self.addCleanup(client_patcher.stop)
+        namespace_patcher = patch(
+            "alert_rules_configmap.AlertRulesConfigMaps.namespace",
+            new_callable=PropertyMock,
+            return_value=TEST_NAMESPACE,
+        )
+        namespace_patcher.start()
+        self.addCleanup(namespace_patcher.stop)
+        self.configmaps = AlertRulesConfigMaps(TEST_APP_NAME)
+
+    def test_given_no_previous_configmaps_when_write_then_configmap_is_applied_for_each_chunk(
+        self,
+    ):
+        references = self.configmaps.write(TEST_CHUNKS, "", [])
+
+        self.assertEqual(
+            [reference["hash"] for reference in references],
+            [alert_rules_payload.fingerprint(chunk) for chunk in TEST_CHUNKS],
+        )
+        applied_configmaps = [call.args[0] for call in self.patched_client.apply.call_args_list]
+        self.assertEqual(
+            [configmap.metadata.name for configmap in applied_configmaps],
+            [reference["name"] for reference in references],
+        )
+        self.assertTrue(
+            all(
+                configmap.metadata.name.startswith(f"{TEST_APP_NAME}-alert-rules-")
+                for configmap in applied_configmaps
+            )
+        )
+        self.assertEqual(applied_configmaps[0].metadata.namespace, TEST_NAMESPACE)
+        self.assertEqual(applied_configmaps[1].data, {"alert_rules": TEST_CHUNKS[1]})
+
+    def test_given_unchanged_chunk_when_write_then_only_changed_chunks_are_applied_and_none_deleted(  # noqa: E501
+        self,
+    ):
+        previous = self.configmaps.write(TEST_CHUNKS[:1], "", [])
+        self.patched_client.apply.reset_mock()
+
+        references = self.configmaps.write(
+            TEST_CHUNKS, "", [reference["name"] for reference in previous]
+        )
+
+        self.patched_client.apply.assert_called_once()
+        self.assertEqual(
+            self.patched_client.apply.call_args.args[0].metadata.name,
+            references[1]["name"],
+        )
+        self.patched_client.delete.assert_not_called()
+
+    def test_given_encoding_changed_when_write_then_configmaps_are_renamed(self):
+        plain = self.configmaps.write(TEST_CHUNKS, "", [])
+
+        compressed = self.configmaps.write(TEST_CHUNKS, "zlib", [])
+
+        self.assertFalse(
+            {reference["name"] for reference in plain}
+            & {reference["name"] for reference in compressed}
+        )
+
+    def test_given_application_not_trusted_when_write_then_none_is_returned(self):
+        self.patched_client.apply.side_effect = ApiError(
+            response=Mock(json=Mock(return_value={"code": 403, "message": "Forbidden"}))
+        )
+
+        self.assertIsNone(self.configmaps.write(TEST_CHUNKS, "", []))
+
+    def test_given_write_failing_halfway_when_write_then_configmaps_written_are_deleted(self):
+        self.patched_client.apply.side_effect = [
+            None,
+            ApiError(response=Mock(json=Mock(return_value={"code": 500, "message": "Boom"}))),
+        ]
+
+        self.assertIsNone(self.configmaps.write(TEST_CHUNKS, "", []))
+
+        written = self.patched_client.apply.call_args_list[0].args[0].metadata.name
+        self.patched_client.delete.assert_called_once_with(
+            ConfigMap, written, namespace=TEST_NAMESPACE
+        )
+
+    def test_given_namespace_cannot_be_read_when_write_then_none_is_returned(self):
+        with patch(
+            "alert_rules_configmap.AlertRulesConfigMaps.namespace",
+            new_callable=PropertyMock,
+            return_value=None,
+        ):
+            self.assertIsNone(self.configmaps.write(TEST_CHUNKS, "", []))
+
+        self.patched_client.apply.assert_not_called()
+
+    def test_given_stale_configmaps_when_delete_then_configmaps_are_deleted(self):
+        self.configmaps.delete(["stale"])
+
+        self.patched_client.delete.assert_called_once_with(
+            ConfigMap, "stale", namespace=TEST_NAMESPACE
+        )
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_cost
+
+
+class TestAlertRulesCost(unittest.TestCase):
+    def test_given_durations_when_duration_seconds_then_durations_are_converted_to_seconds(self):
+        self.assertEqual(alert_rules_cost.duration_seconds("5m"), 300)
+        self.assertEqual(alert_rules_cost.duration_seconds("1h30m"), 5400)
+        self.assertEqual(alert_rules_cost.duration_seconds("500ms"), 0.5)
+        self.assertEqual(alert_rules_cost.duration_seconds("invalid"), 0)
+
+    def test_given_simple_comparison_when_estimate_then_cost_of_single_selector_is_returned(self):
+        self.assertEqual(alert_rules_cost.estimate("up == 0"), 1.0)
+        self.assertEqual(alert_rules_cost.estimate('{job="prometheus"} > 1'), 1.0)
+
+    def test_given_range_selector_with_regex_matcher_when_estimate_then_range_and_regex_are_costed(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(alert_rules_cost.estimate('rate(x{job=~"api.*"}[5m])'), 4.0)
+
+    def test_given_ungrouped_aggregation_when_estimate_then_aggregation_is_costed(self):
+        self.assertEqual(alert_rules_cost.estimate("sum(rate(x[10m]))"), 5.0)
+        self.assertEqual(alert_rules_cost.estimate("sum by (job) (rate(x[5m]))"), 2.0)
+        self.assertEqual(alert_rules_cost.estimate("sum(rate(x[5m])) without (instance)"), 2.0)
+
+    def test_given_subquery_when_estimate_then_each_subquery_step_is_costed(self):
+        self.assertEqual(alert_rules_cost.estimate("max_over_time(rate(x[5m])[1h:1m])"), 62.0)
+
+    def test_given_keywords_and_string_literals_when_estimate_then_they_are_not_counted_as_selectors(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_cost.estimate(
+                "sum(x) without (instance) / on(job) group_left count(y offset 5m) > bool 1e3"
+            ),
+            4.0,
+        )
+        self.assertEqual(
+            alert_rules_cost.estimate('label_replace(up, "dst", "$1", "src", "(some|regex)")'),
+            1.0,
+        )
+
+    def test_given_tenant_groups_when_report_then_costs_are_aggregated_per_group_and_tenant(self):
+        tenant_groups = {
+            "first": [
+                {"name": "a", "rules": [{"expr": "up == 0"}, {"expr": "rate(x[5m]) > 1"}]},
+                {"name": "b", "rules": [{"expr": "up == 0"}]},
+            ],
+            "second": [{"name": "c", "rules": [{"expr": "sum(x)"}]}],
+        }
+
+        cost_report = alert_rules_cost.report(tenant_groups)
+
+        self.assertEqual(
+            cost_report,
+            {
+                "cost": 7.0,
+                "tenants": {
+                    "first": {"cost": 4.0, "groups": {"a": 3.0, "b": 1.0}},
+                    "second": {"cost": 3.0, "groups": {"c": 3.0}},
+                },
+            },
+        )
+
+    def test_given_cost_report_when_as_metrics_then_gauge_per_tenant_and_group_is_rendered(self):
+        cost_report = {"cost": 3.0, "tenants": {'te"nant': {"cost": 3.0, "groups": {"c": 3.0}}}}
+
+        metrics = alert_rules_cost.as_metrics(cost_report)
+
+        self.assertIn("# TYPE prometheus_configurer_rules_estimated_cost gauge\n", metrics)
+        self.assertIn(
+            'prometheus_configurer_rules_estimated_cost{tenant="te\\"nant",group="c"} 3.0\n',
+            metrics,
+        )
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_dedup
+
+
+def _alert(name: str, expr: str, **kwargs) -> dict:
+    return {"alert": name, "expr": expr, "labels": {"severity": "low"}, **kwargs}
+
+
+class TestAlertRulesDedup(unittest.TestCase):
+    def test_given_equivalent_expressions_when_normalise_expr_then_normal_forms_are_equal(self):
+        self.assertEqual(
+            alert_rules_dedup.normalise_expr(
+                'sum  by (job, instance) ( rate(x{b="1 , 2",  a=~"x"}[5m] ) ) > 1'
+            ),
+            alert_rules_dedup.normalise_expr(
+                'sum by(instance,job)(rate(x{a=~"x",b="1 , 2"}[5m]))>1'
+            ),
+        )
+
+    def test_given_whitespace_in_string_literal_when_normalise_expr_then_string_literal_is_kept(
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_dedup.normalise_expr('up{job="a  b"}  ==  0'), 'up{job="a  b"}==0'
+        )
+
+    def test_given_exact_duplicates_in_different_groups_when_deduplicate_with_collapse_then_only_first_rule_is_kept(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {"name": "a", "rules": [_alert("Down", "up == 0")]},
+            {"name": "b", "rules": [_alert("Down", "up==0")]},
+        ]
+
+        deduplicated_groups, duplicates = alert_rules_dedup.deduplicate(groups, collapse=True)
+
+        self.assertEqual(deduplicated_groups, [groups[0]])
+        self.assertEqual(duplicates, {"exact": 1, "semantic": 0})
+
+    def test_given_alerts_differing_only_in_name_and_annotations_when_deduplicate_then_semantic_duplicate_is_counted(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {
+                "name": "a",
+                "rules": [
+                    _alert("Down", "up == 0", annotations={"summary": "Down"}),
+                    _alert("TargetDown", "up == 0", annotations={"summary": "Target down"}),
+                    _alert("Down", "up == 0", **{"for": "5m"}),
+                ],
+            }
+        ]
+
+        deduplicated_groups, duplicates = alert_rules_dedup.deduplicate(groups, collapse=False)
+
+        self.assertEqual(deduplicated_groups, groups)
+        self.assertEqual(duplicates, {"exact": 0, "semantic": 1})
+
+    def test_given_recording_rules_with_same_expression_when_deduplicate_then_they_are_not_duplicates(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {
+                "name": "a",
+                "rules": [
+                    {"record": "job:up:sum", "expr": "sum(up)"},
+                    {"record": "up:sum", "expr": "sum(up)"},
+                ],
+            }
+        ]
+
+        _, duplicates = alert_rules_dedup.deduplicate(groups, collapse=True)
+
+        self.assertEqual(duplicates, {"exact": 0, "semantic": 0})
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import re
+import unittest
+from typing import Dict, List
+
+import alert_rules_packing
+
+
+def _group(name: str, rules_count: int, **settings) -> dict:
+    return {
+        "name": name,
+        "rules": [{"alert": f"{name}_{idx}", "expr": "up == 0"} for idx in range(rules_count)],
+        **settings,
+    }
+
+
+def _group_of_rule(groups: List[dict]) -> Dict[str, str]:
+    return {rule["alert"]: group["name"] for group in groups for rule in group["rules"]}
+
+
+class TestAlertRulesPacking(unittest.TestCase):
+    def test_given_oversized_group_when_pack_then_group_is_split_into_parts_within_max_size(
+        self,
+    ):
+        groups = alert_rules_packing.pack([_group("tenant_alerts", 5)], max_group_size=2)
+
+        self.assertEqual(sum(len(group["rules"]) for group in groups), 5)
+        self.assertTrue(all(len(group["rules"]) <= 2 for group in groups))
+        self.assertTrue(all(re.fullmatch(r"tenant_\d+_alerts", group["name"]) for group in groups))
+
+    def test_given_rule_added_to_oversized_group_when_pack_then_other_rules_stay_in_their_groups(  # noqa: E501
+        self,
+    ):
+        group = _group("tenant_alerts", 20)
+        before = _group_of_rule(alert_rules_packing.pack([group], max_group_size=10))
+        group["rules"].append({"alert": "added", "expr": "up == 0"})
+
+        after = _group_of_rule(alert_rules_packing.pack([group], max_group_size=10))
+
+        moved = [alert for alert, name in before.items() if after[alert] != name]
+        self.assertEqual(moved, [])
+
+    def test_given_derived_name_of_existing_group_when_pack_then_derived_name_is_made_unique(
+        self,
+    ):
+        existing = [_group(f"tenant_{idx}_alerts", 1) for idx in range(8)]
+
+        groups = alert_rules_packing.pack(
+            [*existing, _group("tenant_alerts", 5)], max_group_size=2
+        )
+
+        names = [group["name"] for group in groups]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(names[:8], [group["name"] for group in existing])
+
+    def test_given_oversized_group_with_recording_rules_when_pack_then_group_is_not_split(self):
+        group = _group("tenant_alerts", 5)
+        group["rules"][0] = {"record": "job:up:sum", "expr": "sum by (job) (up)"}
+
+        self.assertEqual(alert_rules_packing.pack([group], max_group_size=2), [group])
+
+    def test_given_tiny_groups_when_pack_then_groups_with_same_settings_are_merged(self):
+        groups = alert_rules_packing.pack(
+            [
+                _group("a_alerts", 1),
+                _group("b_alerts", 1),
+                _group("c_alerts", 1, interval="5m"),
+                _group("d_alerts", 4),
+            ],
+            min_group_size=3,
+            merged_name_prefix="tenant",
+        )
+
+        self.assertEqual(
+            [(group["name"], len(group["rules"])) for group in groups],
+            [("d_alerts", 4), ("tenant_merged_0_alerts", 2), ("c_alerts", 1)],
+        )
+
+    def test_given_tiny_group_added_when_pack_then_rules_of_other_tiny_groups_stay_merged_together(  # noqa: E501
+        self,
+    ):
+        groups = [_group(f"{name}_alerts", 1) for name in "abcd"]
+        before = _group_of_rule(alert_rules_packing.pack(groups, min_group_size=4))
+
+        after = _group_of_rule(
+            alert_rules_packing.pack([_group("0_alerts", 1), *groups], min_group_size=4)
+        )
+
+        self.assertEqual({alert: after[alert] for alert in before}, before)
+
+    def test_given_tiny_groups_and_max_group_size_when_pack_then_merged_groups_do_not_exceed_it(
+        self,
+    ):
+        groups = alert_rules_packing.pack(
+            [_group(f"{name}_alerts", 2) for name in "abcde"], max_group_size=4, min_group_size=3
+        )
+
+        self.assertEqual(sum(len(group["rules"]) for group in groups), 10)
+        self.assertTrue(all(len(group["rules"]) <= 4 for group in groups))
+
+    def test_given_rule_weight_when_pack_then_groups_are_split_by_weight(self):
+        groups = alert_rules_packing.pack(
+            [_group("tenant_alerts", 4)], max_group_size=5, weigh=lambda rule: 2
+        )
+
+        self.assertTrue(all(len(group["rules"]) <= 2 for group in groups))
+        self.assertEqual(sum(len(group["rules"]) for group in groups), 4)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import base64
+import json
+import unittest
+import zlib
+from unittest.mock import patch
+
+import alert_rules_payload
+
+TEST_ALERT_RULES = {
+    "groups": [
+        {
+            "name": "tenant_b_alerts",
+            "rules": [
+                {
+                    "alert": "SecondAlert",
+                    "expr": "up == 0",
+                    "labels": {"tenant": "b", "severity": "critical"},
+                },
+                {"alert": "FirstAlert", "expr": "up == 1", "labels": {"tenant": "b"}},
+            ],
+        },
+        {
+            "name": "tenant_a_alerts",
+            "rules": [{"alert": "ÜberAlert", "expr": "up > 1", "labels": {"tenant": "a"}}],
+        },
+    ]
+}
+
+
+class TestAlertRulesPayload(unittest.TestCase):
+    def test_given_same_groups_in_different_order_when_dumps_then_payloads_are_identical(self):
+        reordered_alert_rules = {"groups": list(reversed(TEST_ALERT_RULES["groups"]))}
+
+        self.assertEqual(
+            alert_rules_payload.dumps(TEST_ALERT_RULES),
+            alert_rules_payload.dumps(reordered_alert_rules),
+        )
+
+    def test_given_alert_rules_when_dumps_then_groups_are_sorted_and_rules_keep_their_order(self):
+        payload = json.loads(alert_rules_payload.dumps(TEST_ALERT_RULES))
+
+        self.assertEqual(
+            [group["name"] for group in payload["groups"]], ["tenant_a_alerts", "tenant_b_alerts"]
+        )
+        self.assertEqual(
+            [rule["alert"] for rule in payload["groups"][1]["rules"]],
+            ["SecondAlert", "FirstAlert"],
+        )
+
+    def test_given_alert_rules_when_dumps_then_payload_is_compact_with_sorted_keys(self):
+        payload = alert_rules_payload.dumps(TEST_ALERT_RULES)
+
+        self.assertNotIn(", ", payload)
+        self.assertNotIn('": ', payload)
+        self.assertIn('"labels":{"severity":"critical","tenant":"b"}', payload)
+
+    def test_given_orjson_not_available_when_dumps_then_payload_is_the_same(self):
+        payload = alert_rules_payload.dumps(TEST_ALERT_RULES)
+
+        with patch("alert_rules_payload.orjson", None):
+            self.assertEqual(alert_rules_payload.dumps(TEST_ALERT_RULES), payload)
+
+    def test_given_empty_alert_rules_when_dumps_then_payload_is_empty_json_object(self):
+        self.assertEqual(alert_rules_payload.dumps({}), "{}")
+
+    def test_given_same_payload_when_fingerprint_then_fingerprints_are_identical(self):
+        reordered_alert_rules = {"groups": list(reversed(TEST_ALERT_RULES["groups"]))}
+
+        self.assertEqual(
+            alert_rules_payload.fingerprint(alert_rules_payload.dumps(TEST_ALERT_RULES)),
+            alert_rules_payload.fingerprint(alert_rules_payload.dumps(reordered_alert_rules)),
+        )
+
+    def test_given_zlib_encoding_when_encode_then_payload_is_base64_encoded_zlib_stream(self):
+        payload = alert_rules_payload.dumps(TEST_ALERT_RULES)
+
+        encoded_payload = alert_rules_payload.encode(payload, "zlib")
+
+        self.assertEqual(zlib.decompress(base64.b64decode(encoded_payload)).decode(), payload)
+
+    def test_given_no_encoding_when_encode_then_payload_is_unchanged(self):
+        payload = alert_rules_payload.dumps(TEST_ALERT_RULES)
+
+        self.assertEqual(alert_rules_payload.encode(payload, ""), payload)
+
+    def test_given_unsupported_encoding_when_encode_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            alert_rules_payload.encode("{}", "lzma")
+
+    def test_given_chunk_size_smaller_than_groups_when_split_then_each_group_is_a_chunk(self):
+        chunks = alert_rules_payload.split(TEST_ALERT_RULES, 1)
+
+        self.assertEqual(
+            [[group["name"] for group in json.loads(chunk)["groups"]] for chunk in chunks],
+            [["tenant_a_alerts"], ["tenant_b_alerts"]],
+        )
+
+    def test_given_chunk_size_bigger_than_payload_when_split_then_chunk_equals_whole_payload(self):
+        with patch("alert_rules_payload.CHUNK_BOUNDARY_MODULUS", 2**32):
+            chunks = alert_rules_payload.split(TEST_ALERT_RULES, 2**20)
+
+        self.assertEqual(chunks, [alert_rules_payload.dumps(TEST_ALERT_RULES)])
+
+    def test_given_group_in_first_chunk_changes_size_when_split_then_following_chunks_are_unchanged(  # noqa: E501
+        self,
+    ):
+        alert_rules = {
+            "groups": [
+                {"name": f"group_{idx}", "rules": [{"alert": "Alert", "expr": "up == 0"}]}
+                for idx in range(50)
+            ]
+        }
+        chunks = alert_rules_payload.split(alert_rules, 400)
+        alert_rules["groups"][0]["rules"][0]["expr"] = "up == 0 and vector(1)"
+
+        changed_chunks = alert_rules_payload.split(alert_rules, 400)
+
+        self.assertEqual(len(changed_chunks), len(chunks))
+        self.assertEqual(changed_chunks[1:], chunks[1:])
+
+    def test_given_labels_shared_by_all_rules_of_group_when_hoist_labels_then_shared_labels_are_moved_to_group(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {
+                "name": "a",
+                "rules": [
+                    {"alert": "A", "expr": "up == 0", "labels": {"juju_model": "m", "sev": "1"}},
+                    {"alert": "B", "expr": "up == 1", "labels": {"juju_model": "m"}},
+                ],
+            },
+            {"name": "b", "rules": [{"alert": "C", "expr": "up", "labels": {"juju_model": "m"}}]},
+        ]
+
+        hoisted_groups = alert_rules_payload.hoist_labels(groups)
+
+        self.assertEqual(
+            hoisted_groups,
+            [
+                {
+                    "name": "a",
+                    "labels": {"juju_model": "m"},
+                    "rules": [
+                        {"alert": "A", "expr": "up == 0", "labels": {"sev": "1"}},
+                        {"alert": "B", "expr": "up == 1"},
+                    ],
+                },
+                groups[1],
+            ],
+        )
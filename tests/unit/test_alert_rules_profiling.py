@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import alert_rules_profiling
+
+
+def _allocate():
+    return len([str(number) for number in range(10000)])
+
+
+class TestAlertRulesProfiling(unittest.TestCase):
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_path = Path(profile_dir.name) / "profiles" / "alert-rules.prof"
+
+    def test_given_function_when_profile_then_hotspots_peak_memory_and_result_are_returned(self):
+        profile = alert_rules_profiling.profile(_allocate, str(self.profile_path), top=3)
+
+        lines = profile["hotspots"].splitlines()
+        self.assertEqual(lines[0].split(), ["ncalls", "tottime", "cumtime", "function"])
+        self.assertLessEqual(len(lines), 4)
+        self.assertIn("_allocate", profile["hotspots"])
+        self.assertGreater(profile["peak_memory"], 0)
+        self.assertEqual(profile["result"], 10000)
+
+    def test_given_function_when_profile_then_raw_profile_is_saved(self):
+        alert_rules_profiling.profile(_allocate, str(self.profile_path))
+
+        self.assertGreater(self.profile_path.stat().st_size, 0)
+
+    def test_given_unsupported_sort_key_when_profile_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            alert_rules_profiling.profile(_allocate, str(self.profile_path), sort="percall")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_quotas
+
+TEST_GROUPS = [
+    {"name": "a", "rules": [{"expr": "up == 0"}, {"expr": "rate(x[5m]) > 1"}]},
+    {"name": "b", "rules": [{"expr": "up == 0"}]},
+]
+
+
+class TestAlertRulesQuotas(unittest.TestCase):
+    def test_given_valid_quotas_when_parse_quotas_then_empty_quotas_are_dropped(self):
+        self.assertEqual(
+            alert_rules_quotas.parse_quotas(
+                {"max_rules": 10, "max_expr_length": 0, "max_cost": 2.5}
+            ),
+            {"max_rules": 10, "max_cost": 2.5},
+        )
+
+    def test_given_invalid_quotas_when_parse_quotas_then_value_error_is_raised(self):
+        for quotas in [{"max_rules": -1}, {"max_rules": 1.5}, {"max_cost": "a"}, {"other": 1}]:
+            with self.assertRaises(ValueError):
+                alert_rules_quotas.parse_quotas(quotas)
+
+    def test_given_tenant_quotas_yaml_when_parse_tenant_quotas_then_quotas_of_each_tenant_are_returned(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_quotas.parse_tenant_quotas("noisy: {max_rules: 5}\n1: {max_cost: 2}"),
+            {"noisy": {"max_rules": 5}, "1": {"max_cost": 2}},
+        )
+        with self.assertRaises(ValueError):
+            alert_rules_quotas.parse_tenant_quotas("- noisy")
+
+    def test_given_rules_within_quotas_when_violations_then_no_violations_are_returned(self):
+        self.assertEqual(
+            alert_rules_quotas.violations(
+                TEST_GROUPS, {"max_rules": 3, "max_expr_length": 15, "max_cost": 4}
+            ),
+            [],
+        )
+
+    def test_given_rules_exceeding_quotas_when_violations_then_each_exceeded_quota_is_returned(
+        self,
+    ):
+        violations = alert_rules_quotas.violations(
+            TEST_GROUPS, {"max_rules": 2, "max_expr_length": 10, "max_cost": 3}
+        )
+
+        self.assertEqual(
+            violations,
+            [
+                "3 rules exceed max_rules 2",
+                "expression of 15 characters exceeds max_expr_length 10",
+                "estimated cost 4.0 exceeds max_cost 3",
+            ],
+        )
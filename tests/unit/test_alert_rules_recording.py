@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import unittest
+
+from charms.prometheus_k8s.v0.prometheus_remote_write import (
+    PrometheusRemoteWriteProvider,
+)
+from ops import testing
+from ops.charm import CharmBase
+
+import alert_rules_recording
+
+TEST_LABELS = {"tenant": "first", "severity": "low"}
+TEST_TOPOLOGY_LABELS = {
+    "juju_model": "model",
+    "juju_model_uuid": "00000000-0000-4000-8000-000000000000",
+    "juju_application": "prometheus-configurer-k8s",
+    "juju_charm": "prometheus-configurer-k8s",
+}
+PROMETHEUS_METADATA = """
+name: prometheus-k8s
+provides:
+  receive-remote-write:
+    interface: prometheus_remote_write
+"""
+
+
+class PrometheusCharm(CharmBase):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.remote_write_provider = PrometheusRemoteWriteProvider(self, "receive-remote-write")
+
+
+def _alert(name: str, expr: str) -> dict:
+    return {"alert": name, "expr": expr, "labels": dict(TEST_LABELS)}
+
+
+class TestAlertRulesRecording(unittest.TestCase):
+    def test_given_subexpression_shared_by_enough_alerts_when_extract_then_alerts_select_recorded_series(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {
+                "name": "a",
+                "rules": [
+                    _alert("High", 'rate(x{tenant="first"}[5m]) > 10'),
+                    _alert("Low", 'rate( x{tenant="first"}[5m] ) < 1'),
+                    _alert("Other", 'rate(y{tenant="first"}[5m]) > 1'),
+                ],
+            }
+        ]
+
+        extracted_groups = alert_rules_recording.extract(groups, "first", 2)
+
+        self.assertEqual(len(extracted_groups), 2)
+        recording_group = extracted_groups[1]
+        self.assertEqual(recording_group["name"], "recording_rules_first")
+        self.assertEqual(len(recording_group["rules"]), 1)
+        recording_rule = recording_group["rules"][0]
+        self.assertTrue(recording_rule["record"].startswith("cse:rate:"))
+        self.assertEqual(recording_rule["expr"], 'rate(x{tenant="first"}[5m])')
+        self.assertEqual(recording_rule["labels"], {"tenant": "first"})
+        self.assertEqual(
+            [rule["expr"] for rule in extracted_groups[0]["rules"]],
+            [
+                f"{recording_rule['record']} > 10",
+                f"{recording_rule['record']} < 1",
+                'rate(y{tenant="first"}[5m]) > 1',
+            ],
+        )
+
+    def test_given_nested_shared_subexpressions_when_extract_then_outermost_call_is_extracted(
+        self,
+    ):
+        expr = "histogram_quantile(0.9, rate(x_bucket[5m]))"
+        groups = [{"name": "a", "rules": [_alert("A", f"{expr} > 1"), _alert("B", f"{expr} > 2")]}]
+
+        extracted_groups = alert_rules_recording.extract(groups, "", 2)
+
+        self.assertEqual(extracted_groups[1]["name"], "recording_rules")
+        self.assertEqual(
+            [rule["expr"] for rule in extracted_groups[1]["rules"]],
+            ["histogram_quantile(0.9, rate(x_bucket[5m]))"],
+        )
+
+    def test_given_subexpressions_not_shared_by_enough_alerts_when_extract_then_groups_are_unchanged(  # noqa: E501
+        self,
+    ):
+        groups = [
+            {
+                "name": "a",
+                "rules": [_alert("A", "rate(x[5m]) > 1"), _alert("B", "rate(x[5m]) > 2")],
+            }
+        ]
+
+        self.assertEqual(alert_rules_recording.extract(groups, "", 3), groups)
+
+    def test_given_extracted_recording_rules_when_loaded_by_prometheus_then_they_are_accepted_with_topology_and_tenant_labels(  # noqa: E501
+        self,
+    ):
+        rules = [
+            _alert("High", 'rate(x{job="a"}[5m]) > 10'),
+            _alert("Low", 'rate(x{job="a"}[5m]) < 1'),
+        ]
+        for rule in rules:
+            rule["labels"].update(TEST_TOPOLOGY_LABELS)
+        labels = {**TEST_TOPOLOGY_LABELS, "tenant": "first"}
+        groups = alert_rules_recording.extract([{"name": "a", "rules": rules}], "first", 2, labels)
+        harness = testing.Harness(PrometheusCharm, meta=PROMETHEUS_METADATA)
+        self.addCleanup(harness.cleanup)
+        harness.set_leader(True)
+        harness.begin()
+        relation_id = harness.add_relation("receive-remote-write", "prometheus-configurer-k8s")
+        harness.add_relation_unit(relation_id, "prometheus-configurer-k8s/0")
+
+        harness.update_relation_data(
+            relation_id,
+            "prometheus-configurer-k8s",
+            {"alert_rules": json.dumps({"groups": groups})},
+        )
+
+        loaded_groups = [
+            group
+            for alerts in harness.charm.remote_write_provider.alerts().values()
+            for group in alerts["groups"]
+        ]
+        self.assertEqual(
+            sorted(group["name"] for group in loaded_groups), ["a", "recording_rules_first"]
+        )
+        recording_rule = groups[1]["rules"][0]
+        self.assertEqual(recording_rule["labels"], labels)
+        self.assertNotIn("event", harness.get_relation_data(relation_id, harness.charm.app.name))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml
+
+import alert_rules_templates
+
+TEST_TEMPLATE = {
+    "groups": [
+        {
+            "name": "baseline",
+            "rules": [
+                {"alert": "Down", "expr": "up == 0", "annotations": {"summary": "%%tenant%%"}}
+            ],
+        }
+    ]
+}
+
+
+class TestAlertRulesTemplates(unittest.TestCase):
+    def setUp(self):
+        templates_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(templates_dir.cleanup)
+        self.templates_dir = templates_dir.name
+        (Path(self.templates_dir) / "baseline.yml").write_text(yaml.safe_dump(TEST_TEMPLATE))
+
+    def test_given_valid_bindings_when_parse_bindings_then_templates_of_each_tenant_are_returned(
+        self,
+    ):
+        self.assertEqual(
+            alert_rules_templates.parse_bindings("a: [baseline, k8s]\nb: [baseline]"),
+            {"a": ["baseline", "k8s"], "b": ["baseline"]},
+        )
+
+    def test_given_invalid_bindings_when_parse_bindings_then_value_error_is_raised(self):
+        for bindings in ["a: baseline", "- a", "a: ["]:
+            with self.assertRaises(ValueError):
+                alert_rules_templates.parse_bindings(bindings)
+
+    def test_given_template_file_when_find_then_template_path_is_returned(self):
+        self.assertEqual(
+            alert_rules_templates.find(self.templates_dir, "baseline"),
+            Path(self.templates_dir) / "baseline.yml",
+        )
+        self.assertIsNone(alert_rules_templates.find(self.templates_dir, "missing"))
+
+    def test_given_unchanged_template_file_when_load_twice_then_template_is_parsed_once(self):
+        path = Path(self.templates_dir) / "baseline.yml"
+
+        with patch("yaml.safe_load", wraps=yaml.safe_load) as patched_safe_load:
+            first_template = alert_rules_templates.load(path)
+            second_template = alert_rules_templates.load(path)
+
+        self.assertEqual(patched_safe_load.call_count, 1)
+        self.assertEqual(json.loads(first_template), TEST_TEMPLATE["groups"])
+        self.assertIs(first_template, second_template)
+
+    def test_given_template_when_expand_then_groups_are_named_and_labelled_for_tenant(self):
+        template = alert_rules_templates.load(Path(self.templates_dir) / "baseline.yml")
+
+        groups = alert_rules_templates.expand(template, "baseline", 'te"nant', "tenant")
+
+        self.assertEqual(
+            groups,
+            [
+                {
+                    "name": 'te"nant_baseline_baseline',
+                    "rules": [
+                        {
+                            "alert": "Down",
+                            "expr": "up == 0",
+                            "annotations": {"summary": 'te"nant'},
+                            "labels": {"tenant": 'te"nant'},
+                        }
+                    ],
+                }
+            ],
+        )
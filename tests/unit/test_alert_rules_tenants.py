@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_tenants
+
+TEST_GROUPS = [
+    {"name": "b_alerts", "rules": [{"alert": "B", "expr": "up", "labels": {"tenant": "b"}}]},
+    {"name": "a_2_alerts", "rules": [{"alert": "A2", "expr": "up", "labels": {"tenant": "a"}}]},
+    {"name": "a_1_alerts", "rules": [{"alert": "A1", "expr": "up", "labels": {"tenant": "a"}}]},
+    {"name": "no_tenant_alerts", "rules": [{"alert": "C", "expr": "up", "labels": {}}]},
+]
+
+
+class TestAlertRulesTenants(unittest.TestCase):
+    def test_given_groups_of_many_tenants_when_partition_then_groups_are_sorted_per_tenant(self):
+        tenant_groups = alert_rules_tenants.partition(TEST_GROUPS, "tenant")
+
+        self.assertEqual(
+            {
+                tenant: [group["name"] for group in groups]
+                for tenant, groups in tenant_groups.items()
+            },
+            {"a": ["a_1_alerts", "a_2_alerts"], "b": ["b_alerts"], "": ["no_tenant_alerts"]},
+        )
+
+    def test_given_one_tenant_changed_when_changed_then_only_this_tenant_is_returned(self):
+        previous_fingerprints = alert_rules_tenants.fingerprints(
+            alert_rules_tenants.partition(TEST_GROUPS, "tenant")
+        )
+        changed_groups = [dict(group) for group in TEST_GROUPS]
+        changed_groups[0]["rules"] = [{"alert": "B", "expr": "down", "labels": {"tenant": "b"}}]
+
+        fingerprints = alert_rules_tenants.fingerprints(
+            alert_rules_tenants.partition(changed_groups, "tenant")
+        )
+
+        self.assertEqual(alert_rules_tenants.changed(previous_fingerprints, fingerprints), ["b"])
+
+    def test_given_tenant_removed_when_changed_then_removed_tenant_is_returned(self):
+        previous_fingerprints = {"a": "1", "b": "2"}
+
+        self.assertEqual(alert_rules_tenants.changed(previous_fingerprints, {"a": "1"}), ["b"])
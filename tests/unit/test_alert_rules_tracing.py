@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import List
+
+import alert_rules_tracing
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """Stands in for the OTLP HTTP receiver of an OpenTelemetry collector."""
+
+    requests: List[tuple] = []
+
+    def do_POST(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.requests.append((self.path, self.headers["Content-Type"], json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _finished_trace() -> List[dict]:
+    context = alert_rules_tracing.new_context("watchdog", written=time.time() - 1)
+    trace = alert_rules_tracing.Trace(
+        alert_rules_tracing.dispatched(context), "alert_rules_changed", time.time()
+    )
+    with trace.span("alert_rules.publish", storage="relation-data") as attributes:
+        attributes["bytes"] = 42
+    return trace.finish()
+
+
+class TestAlertRulesTracing(unittest.TestCase):
+    def setUp(self):
+        traces_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(traces_dir.cleanup)
+        self.traces_path = Path(traces_dir.name) / "traces.jsonl"
+
+    def test_given_dispatched_trace_context_when_trace_finished_then_spans_cover_change_end_to_end(  # noqa: E501
+        self,
+    ):
+        spans = _finished_trace()
+
+        names = [span["name"] for span in spans]
+        self.assertEqual(
+            names,
+            [
+                "alert_rules.change",
+                "alert_rules.detect",
+                "alert_rules.dispatch",
+                "alert_rules.hook",
+                "alert_rules.publish",
+            ],
+        )
+        root, detect, dispatch, hook, publish = spans
+        self.assertEqual(len({span["trace_id"] for span in spans}), 1)
+        self.assertEqual(root["parent_span_id"], "")
+        for span in (detect, dispatch, hook):
+            self.assertEqual(span["parent_span_id"], root["span_id"])
+        self.assertEqual(publish["parent_span_id"], hook["span_id"])
+        self.assertEqual(publish["attributes"], {"storage": "relation-data", "bytes": 42})
+        self.assertGreaterEqual(root["attributes"]["latency_ms"], 1000)
+        self.assertEqual(root["end_time_unix_nano"], hook["end_time_unix_nano"])
+
+    def test_given_no_trace_context_when_trace_finished_then_no_spans_are_recorded(self):
+        trace = alert_rules_tracing.Trace(None, "update_status", time.time())
+        with trace.span("alert_rules.publish"):
+            pass
+
+        self.assertEqual(trace.finish(), [])
+
+    def test_given_trace_context_without_dispatch_time_when_parse_context_then_none_is_returned(
+        self,
+    ):
+        context = alert_rules_tracing.new_context("watchdog")
+
+        self.assertIsNone(alert_rules_tracing.parse_context(context))
+
+    def test_given_spans_when_write_then_spans_are_appended_as_json_lines(self):
+        spans = _finished_trace()
+
+        alert_rules_tracing.write(spans, str(self.traces_path))
+        alert_rules_tracing.write(spans, str(self.traces_path))
+
+        lines = self.traces_path.read_text().splitlines()
+        self.assertEqual(len(lines), 2 * len(spans))
+        self.assertEqual(json.loads(lines[0]), spans[0])
+
+    def test_given_traces_file_at_maximum_size_when_write_then_file_is_rotated(self):
+        spans = _finished_trace()
+        alert_rules_tracing.write(spans, str(self.traces_path))
+
+        alert_rules_tracing.write(spans, str(self.traces_path), max_size=1)
+
+        self.assertEqual(len(self.traces_path.read_text().splitlines()), len(spans))
+        self.assertTrue(Path(f"{self.traces_path}.1").exists())
+
+    def test_given_running_collector_when_export_then_spans_are_received_as_otlp_json(self):
+        CollectorHandler.requests = []
+        server = HTTPServer(("127.0.0.1", 0), CollectorHandler)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.shutdown)
+        spans = _finished_trace()
+
+        exported = alert_rules_tracing.export(
+            spans, f"http://127.0.0.1:{server.server_address[1]}/"
+        )
+
+        self.assertTrue(exported)
+        path, content_type, body = CollectorHandler.requests[0]
+        self.assertEqual((path, content_type), ("/v1/traces", "application/json"))
+        resource_spans = body["resourceSpans"][0]
+        self.assertEqual(
+            resource_spans["resource"]["attributes"],
+            [{"key": "service.name", "value": {"stringValue": "prometheus-configurer-k8s"}}],
+        )
+        received = resource_spans["scopeSpans"][0]["spans"]
+        self.assertEqual(
+            [span["spanId"] for span in received], [span["span_id"] for span in spans]
+        )
+        self.assertEqual(received[0]["traceId"], spans[0]["trace_id"])
+        self.assertEqual(
+            received[4]["attributes"][1], {"key": "bytes", "value": {"intValue": "42"}}
+        )
+
+    def test_given_unreachable_collector_when_export_then_spans_are_not_exported(self):
+        server = HTTPServer(("127.0.0.1", 0), CollectorHandler)
+        port = server.server_address[1]
+        server.server_close()
+
+        self.assertFalse(
+            alert_rules_tracing.export(_finished_trace(), f"http://127.0.0.1:{port}", timeout=1)
+        )
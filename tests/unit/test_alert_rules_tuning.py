@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import alert_rules_tuning
+
+
+class TestAlertRulesTuning(unittest.TestCase):
+    def test_given_valid_tenant_settings_when_parse_tenant_settings_then_empty_values_are_dropped(
+        self,
+    ):
+        tenant_settings = alert_rules_tuning.parse_tenant_settings(
+            "low: {interval: 5m, limit: 100, query_offset: ''}\ncritical: {interval: 1m30s}"
+        )
+
+        self.assertEqual(
+            tenant_settings,
+            {"low": {"interval": "5m", "limit": 100}, "critical": {"interval": "1m30s"}},
+        )
+
+    def test_given_invalid_duration_when_parse_tenant_settings_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            alert_rules_tuning.parse_tenant_settings("low: {interval: five minutes}")
+
+    def test_given_unsupported_setting_when_parse_settings_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            alert_rules_tuning.parse_settings({"partial_response_strategy": "warn"})
+
+    def test_given_group_with_interval_when_apply_then_only_missing_settings_are_applied(self):
+        groups = [{"name": "a_alerts", "interval": "1m", "rules": []}, {"name": "b_alerts"}]
+
+        tuned_groups = alert_rules_tuning.apply(groups, {"interval": "5m", "limit": 10})
+
+        self.assertEqual(
+            tuned_groups,
+            [
+                {"name": "a_alerts", "interval": "1m", "limit": 10, "rules": []},
+                {"name": "b_alerts", "interval": "5m", "limit": 10},
+            ],
+        )
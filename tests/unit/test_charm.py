@@ -2,52 +2,109 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import base64
 import json
+import re
+import signal
+import tempfile
 import unittest
-from unittest.mock import Mock, PropertyMock, patch
+import zlib
+from pathlib import Path
+from unittest.mock import PropertyMock, patch
 
+import ops
+import yaml
 from charms.prometheus_k8s.v0.prometheus_remote_write import AlertRules, JujuTopology
 from ops import testing
 from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
 
+import alert_rules_payload
+import alert_rules_tracing
 from charm import PrometheusConfigurerOperatorCharm
 
 TEST_MULTITENANT_LABEL = "some_test_label"
-TEST_CONFIG = f"""options:
-  multitenant_label:
-    type: string
-    description: |
-      Prometheus Configurer has been designed to support multiple tenants. This label can be used
-      to restrict the alerting rules in Prometheus, so that each rule can only be triggered by
-      metrics with matching label.
-    default: {TEST_MULTITENANT_LABEL}
-"""
+TEST_CONFIG = yaml.safe_load(Path("config.yaml").read_text())
+TEST_CONFIG["options"]["multitenant_label"]["default"] = TEST_MULTITENANT_LABEL
+COS_TOOL = "charms.prometheus_k8s.v0.prometheus_remote_write.CosTool"
 
 
-class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
-    @patch(
-        "charm.KubernetesServicePatch",
-        lambda charm, ports: None,
+def _cos_tool_transform(args: list) -> str:
+    """Stands in for `cos-tool transform`, adding label matchers to the first metric selected."""
+    matchers = ",".join(
+        '{}="{}"'.format(*arg.split("=", 1)[1].split("=", 1)) for arg in args[2:-1]
     )
+    return re.sub(
+        r"^([a-zA-Z_:][\w:]*)", lambda match: f"{match.group(1)}{{{matchers}}}", args[-1]
+    )
+
+
+class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
     def setUp(self):
-        self.harness = testing.Harness(PrometheusConfigurerOperatorCharm, config=TEST_CONFIG)
+        self.harness = testing.Harness(
+            PrometheusConfigurerOperatorCharm, config=yaml.safe_dump(TEST_CONFIG)
+        )
         self.addCleanup(self.harness.cleanup)
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.rule_costs_metrics_path = Path(metrics_dir.name) / "rule-costs.prom"
+        rule_costs_metrics_patch = patch.object(
+            PrometheusConfigurerOperatorCharm,
+            "RULE_COSTS_METRICS_PATH",
+            str(self.rule_costs_metrics_path),
+        )
+        rule_costs_metrics_patch.start()
+        self.addCleanup(rule_costs_metrics_patch.stop)
+        self.stage_timings_path = Path(metrics_dir.name) / "stage-timings.jsonl"
+        stage_timings_patch = patch.object(
+            PrometheusConfigurerOperatorCharm,
+            "STAGE_TIMINGS_PATH",
+            str(self.stage_timings_path),
+        )
+        stage_timings_patch.start()
+        self.addCleanup(stage_timings_patch.stop)
+        self.alert_rules_traces_path = Path(metrics_dir.name) / "alert-rules-traces.jsonl"
+        alert_rules_traces_patch = patch.object(
+            PrometheusConfigurerOperatorCharm,
+            "ALERT_RULES_TRACES_PATH",
+            str(self.alert_rules_traces_path),
+        )
+        alert_rules_traces_patch.start()
+        self.addCleanup(alert_rules_traces_patch.stop)
+        self.admitted_alert_rules_dir = Path(metrics_dir.name) / "admitted-alert-rules"
+        admitted_alert_rules_patch = patch.object(
+            PrometheusConfigurerOperatorCharm,
+            "ADMITTED_ALERT_RULES_DIR",
+            str(self.admitted_alert_rules_dir),
+        )
+        admitted_alert_rules_patch.start()
+        self.addCleanup(admitted_alert_rules_patch.stop)
+        alert_rules_dir_watcher_patch = patch("charm.AlertRulesDirWatcher")
+        self.patched_alert_rules_dir_watcher = alert_rules_dir_watcher_patch.start()
+        self.patched_alert_rules_dir_watcher.return_value.start_watchdog.return_value = 0
+        self.addCleanup(alert_rules_dir_watcher_patch.stop)
+        reload_webhook_patch = patch("reload_webhook.ReloadWebhook")
+        self.patched_reload_webhook = reload_webhook_patch.start()
+        self.patched_reload_webhook.return_value.start.return_value = 0
+        self.addCleanup(reload_webhook_patch.stop)
         self.harness.set_leader(True)
         self.harness.begin()
 
-    @patch("charm.AlertRulesDirWatcher")
     @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
     def test_given_rules_directory_when_pebble_ready_then_watchdog_starts_watching_given_rules_directory(  # noqa: E501
-        self, patched_rules_dir, patched_alert_rules_dir_watcher
+        self, patched_rules_dir
     ):
         test_rules_dir = "/test/rules/dir"
         patched_rules_dir.return_value = test_rules_dir
 
         self.harness.charm.on.start.emit()
 
-        patched_alert_rules_dir_watcher.assert_called_with(self.harness.charm, test_rules_dir)
+        self.patched_alert_rules_dir_watcher.assert_called_with(
+            self.harness.charm,
+            test_rules_dir,
+            [PrometheusConfigurerOperatorCharm.RULE_TEMPLATES_DIR],
+            None,
+        )
 
-    @patch("charm.AlertRulesDirWatcher", Mock())
     def test_given_prometheus_relation_not_created_when_pebble_ready_then_charm_goes_to_blocked_state(  # noqa: E501
         self,
     ):
@@ -57,12 +114,10 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
             "Waiting for prometheus relation to be created"
         )
 
-    @patch("charm.AlertRulesDirWatcher", Mock())
     def test_given_prometheus_relation_created_and_prometheus_configurer_container_ready_but_dummy_http_server_not_yet_ready_when_pebble_ready_then_charm_goes_to_waiting_state(  # noqa: E501
         self,
     ):
         self.harness.add_relation("prometheus", "prometheus-k8s")
-        self.harness.set_can_connect("dummy-http-server", True)
         self.harness.container_pebble_ready("prometheus-configurer")
 
         assert self.harness.charm.unit.status == WaitingStatus(
@@ -82,7 +137,6 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
         "charm.PrometheusConfigurerOperatorCharm.DUMMY_HTTP_SERVER_PORT",
         new_callable=PropertyMock,
     )
-    @patch("charm.AlertRulesDirWatcher", Mock())
     def test_given_prometheus_relation_created_and_prometheus_configurer_container_ready_when_pebble_ready_then_pebble_plan_is_updated_with_correct_pebble_layer(  # noqa: E501
         self,
         patched_dummy_http_server_port,
@@ -112,6 +166,7 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
                     f"-prometheusURL={test_dummy_http_server_host}:{test_dummy_http_server_port} "
                     "-restrict-queries "
                     f"-multitenant-label={TEST_MULTITENANT_LABEL}",
+                    "environment": {"GOGC": "100"},
                 }
             }
         }
@@ -138,7 +193,6 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
         updated_plan = self.harness.get_container_pebble_plan("dummy-http-server").to_dict()
         self.assertEqual(expected_plan, updated_plan)
 
-    @patch("charm.AlertRulesDirWatcher", Mock())
     def test_given_prometheus_relation_created_and_prometheus_configurer_container_ready_when_pebble_ready_then_charm_goes_to_active_state(  # noqa: E501
         self,
     ):
@@ -166,10 +220,12 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
         self.harness.charm.on.alert_rules_changed.emit()
 
         self.assertEqual(
-            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
-                "alert_rules"
-            ],
-            json.dumps(alert_rules_as_dict),
+            json.loads(
+                self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
+                    "alert_rules"
+                ]
+            )["groups"],
+            json.loads(alert_rules_payload.dumps(alert_rules_as_dict))["groups"],
         )
 
     @patch(
@@ -193,3 +249,926 @@ class TestPrometheusConfigurerOperatorCharm(unittest.TestCase):
                 "port": str(test_prometheus_configurer_port),
             },
         )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_already_published_when_alert_rules_changed_then_data_bag_write_is_skipped(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.charm.on.alert_rules_changed.emit()
+        writes_skipped = self.harness.charm._stored.alert_rules_writes_skipped
+
+        with patch("ops.model.RelationDataContent.__setitem__") as patched_setitem:
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        patched_setitem.assert_not_called()
+        self.assertEqual(self.harness.charm._stored.alert_rules_writes, 1)
+        self.assertEqual(self.harness.charm._stored.alert_rules_writes_skipped, writes_skipped + 1)
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_overwritten_in_data_bag_when_alert_rules_changed_then_alert_rules_are_rewritten(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.charm.on.alert_rules_changed.emit()
+        published = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        groups = json.loads(published["alert_rules"])["groups"]
+        self.harness.update_relation_data(
+            relation_id, "prometheus-configurer-k8s", {"alert_rules": "{}", "alert_rules_hash": ""}
+        )
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertEqual(json.loads(relation_data["alert_rules"])["groups"], groups)
+        self.assertEqual(self.harness.charm._stored.alert_rules_writes, 2)
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_unit_is_not_leader_when_update_status_then_alert_rules_are_published_once_unit_is_elected_leader(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.set_leader(False)
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+
+        self.harness.charm.on.update_status.emit()
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertNotIn(
+            "alert_rules",
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s"),
+        )
+        self.harness.set_leader(True)
+        self.assertIn(
+            "CPUOverUse",
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
+                "alert_rules"
+            ],
+        )
+
+    def test_given_unit_is_not_leader_when_publish_alert_rules_then_data_bag_is_not_read_nor_written(  # noqa: E501
+        self,
+    ):
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.set_leader(False)
+        relation = self.harness.model.get_relation("prometheus", relation_id)
+        groups = [{"name": "group", "rules": [{"alert": "A", "expr": "up == 0"}]}]
+
+        self.harness.charm._publish_alert_rules(relation, {"": groups})
+
+        self.assertEqual(self.harness.charm._stored.alert_rules_writes, 0)
+        self.assertEqual(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s"), {}
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_compression_enabled_and_supported_by_prometheus_when_alert_rules_changed_then_compressed_alert_rules_are_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"alert_rules_compression": "zlib"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.update_relation_data(
+            relation_id, "prometheus-k8s/0", {"alert_rules_features": json.dumps(["zlib"])}
+        )
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertEqual(relation_data["alert_rules_encoding"], "zlib")
+        alert_rules = json.loads(
+            zlib.decompress(base64.b64decode(relation_data["alert_rules"])).decode()
+        )
+        self.assertEqual(alert_rules["groups"][0]["rules"][0]["alert"], "CPUOverUse")
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_compression_enabled_but_not_supported_by_prometheus_when_alert_rules_changed_then_plain_alert_rules_are_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"alert_rules_compression": "zlib"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertNotIn("alert_rules_encoding", relation_data)
+        alert_rules = json.loads(relation_data["alert_rules"])
+        self.assertEqual(alert_rules["groups"][0]["rules"][0]["alert"], "CPUOverUse")
+
+    def test_given_chunking_enabled_and_supported_by_prometheus_when_alert_rules_changed_then_only_changed_chunks_are_rewritten(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = Path("./tests/unit/test_rules/test_rule.yml").read_text()
+        for rule_name in ["first", "second", "third"]:
+            (Path(rules_dir.name) / f"{rule_name}.yml").write_text(test_rule)
+        self.harness.update_config({"alert_rules_chunk_size": 1})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.update_relation_data(
+            relation_id, "prometheus-k8s/0", {"alert_rules_features": json.dumps(["chunks"])}
+        )
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+            (Path(rules_dir.name) / "second.yml").write_text(
+                test_rule.replace("CPUOverUse", "CPUOverUseChanged")
+            )
+
+            with patch(
+                "ops.model.RelationDataContent.__setitem__",
+                side_effect=ops.model.RelationDataContent.__setitem__,
+                autospec=True,
+            ) as patched_setitem:
+                self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertNotIn("alert_rules", relation_data)
+        self.assertEqual(len(json.loads(relation_data["alert_rules_manifest"])["chunks"]), 3)
+        self.assertIn("CPUOverUseChanged", relation_data["alert_rules_chunk_1"])
+        written_keys = [call.args[1] for call in patched_setitem.call_args_list]
+        self.assertEqual(
+            written_keys, ["alert_rules_chunk_1", "alert_rules_manifest", "alert_rules_hash"]
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_configmap_storage_enabled_and_supported_by_prometheus_when_alert_rules_changed_then_configmap_reference_is_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        test_configmaps = [{"name": "prometheus-configurer-k8s-alert-rules-0", "hash": "abc"}]
+        self.harness.update_config({"alert_rules_storage": "configmap"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.update_relation_data(
+            relation_id, "prometheus-k8s/0", {"alert_rules_features": json.dumps(["configmap"])}
+        )
+
+        with patch(
+            "alert_rules_configmap.AlertRulesConfigMaps.write", return_value=test_configmaps
+        ), patch(
+            "alert_rules_configmap.AlertRulesConfigMaps.namespace", new_callable=PropertyMock
+        ) as patched_namespace:
+            patched_namespace.return_value = "test-namespace"
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertNotIn("alert_rules", relation_data)
+        reference = json.loads(relation_data["alert_rules_ref"])
+        self.assertEqual(reference["namespace"], "test-namespace")
+        self.assertEqual(reference["configmaps"], test_configmaps)
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_configmap_storage_enabled_but_configmap_write_fails_when_alert_rules_changed_then_alert_rules_are_published_in_relation_data_bag(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"alert_rules_storage": "configmap"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.update_relation_data(
+            relation_id, "prometheus-k8s/0", {"alert_rules_features": json.dumps(["configmap"])}
+        )
+
+        with patch("alert_rules_configmap.AlertRulesConfigMaps.write", return_value=None):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertNotIn("alert_rules_ref", relation_data)
+        self.assertIn("CPUOverUse", relation_data["alert_rules"])
+
+    def test_given_rules_of_one_tenant_changed_when_alert_rules_changed_then_only_this_tenant_is_published_as_changed(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = yaml.safe_load(Path("./tests/unit/test_rules/test_rule.yml").read_text())
+        for tenant in ["first", "second"]:
+            test_rule["labels"][TEST_MULTITENANT_LABEL] = tenant
+            (Path(rules_dir.name) / f"{tenant}_rules.yml").write_text(yaml.safe_dump(test_rule))
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+            first_alert_rules = json.loads(
+                self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
+                    "alert_rules"
+                ]
+            )
+            test_rule["expr"] = "process_cpu_seconds_total > 0.5"
+            (Path(rules_dir.name) / "second_rules.yml").write_text(yaml.safe_dump(test_rule))
+
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        self.assertEqual(first_alert_rules["changed_tenants"], ["first", "second"])
+        self.assertEqual(alert_rules["changed_tenants"], ["second"])
+        self.assertEqual(alert_rules["tenants"]["first"], first_alert_rules["tenants"]["first"])
+        self.assertEqual(alert_rules["groups"][0], first_alert_rules["groups"][0])
+        self.assertNotEqual(
+            alert_rules["tenants"]["second"], first_alert_rules["tenants"]["second"]
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_group_settings_in_config_when_alert_rules_changed_then_groups_are_published_with_tenant_settings(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config(
+            {
+                "group_interval": "1m",
+                "group_limit": 5,
+                "tenant_group_settings": "'': {interval: 5m}",
+            }
+        )
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        group = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )["groups"][0]
+        self.assertEqual((group["interval"], group["limit"]), ("5m", 5))
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_invalid_group_settings_in_config_when_alert_rules_changed_then_charm_goes_to_blocked_state(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"group_interval": "often"})
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_unsupported_group_size_measure_in_config_when_alert_rules_changed_then_charm_goes_to_blocked_state(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"max_rules_per_group": 10, "group_size_by": "bytes"})
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("Invalid alert rules settings: unsupported group size measure: bytes"),
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_valid_rules_file_in_rules_directory_when_get_rule_costs_action_then_estimated_costs_are_returned(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+
+        output = self.harness.run_action("get-rule-costs")
+
+        costs = json.loads(output.results["costs"])
+        self.assertEqual(costs["cost"], 1.0)
+        self.assertEqual(list(costs["tenants"][""]["groups"].values()), [1.0])
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_valid_rules_file_in_rules_directory_when_profile_alert_rules_action_then_hotspots_are_returned_and_alert_rules_are_not_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        profile_path = self.rule_costs_metrics_path.parent / "alert-rules.prof"
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch.object(
+            PrometheusConfigurerOperatorCharm, "ALERT_RULES_PROFILE_PATH", str(profile_path)
+        ):
+            output = self.harness.run_action("profile-alert-rules", {"top": 5})
+
+        self.assertEqual(output.results["rules"], "1")
+        self.assertEqual(len(output.results["hotspots"].splitlines()), 6)
+        self.assertGreater(int(output.results["peak-memory-bytes"]), 0)
+        self.assertEqual(output.results["profile-path"], str(profile_path))
+        self.assertTrue(profile_path.exists())
+        self.assertNotIn(
+            "alert_rules",
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s"),
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_invalid_group_settings_in_config_when_profile_alert_rules_action_then_action_fails(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"group_interval": "often"})
+
+        with self.assertRaises(testing.ActionFailed):
+            self.harness.run_action("profile-alert-rules")
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_valid_rules_file_in_rules_directory_when_alert_rules_changed_then_rule_costs_metrics_are_written(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertIn(
+            'prometheus_configurer_rules_estimated_cost{tenant=""',
+            self.rule_costs_metrics_path.read_text(),
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_estimated_rules_cost_exceeds_budget_when_alert_rules_changed_then_alert_rules_are_not_published_and_charm_goes_to_blocked_state(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"max_rules_cost": 0.5})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertNotIn(
+            "alert_rules", self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        )
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("Estimated rules cost 1.0 exceeds budget 0.5"),
+        )
+
+        self.harness.update_config({"max_rules_cost": 2.0})
+
+        self.assertIn(
+            "alert_rules", self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        )
+        self.assertNotIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_given_tenant_exceeding_its_quota_when_alert_rules_changed_then_tenant_is_held_at_last_admitted_rules(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = yaml.safe_load(Path("./tests/unit/test_rules/test_rule.yml").read_text())
+        for tenant in ["first", "second"]:
+            test_rule["labels"][TEST_MULTITENANT_LABEL] = tenant
+            (Path(rules_dir.name) / f"{tenant}_rules.yml").write_text(yaml.safe_dump(test_rule))
+        self.harness.update_config({"tenant_quotas": "second: {max_expr_length: 40}"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+            test_rule["expr"] = "process_cpu_seconds_total > 0.5 and up == 1"
+            for tenant in ["first", "second"]:
+                test_rule["labels"][TEST_MULTITENANT_LABEL] = tenant
+                (Path(rules_dir.name) / f"{tenant}_rules.yml").write_text(
+                    yaml.safe_dump(test_rule)
+                )
+
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        exprs = {
+            rule["labels"][TEST_MULTITENANT_LABEL]: rule["expr"]
+            for group in alert_rules["groups"]
+            for rule in group["rules"]
+        }
+        self.assertIn("up == 1", exprs["first"])
+        self.assertNotIn("up == 1", exprs["second"])
+        self.assertEqual(
+            self.harness.charm.unit.status, BlockedStatus("Quotas exceeded by tenants: second")
+        )
+
+    def test_given_tenant_whose_rules_were_admitted_when_tenant_is_gone_then_its_admitted_rules_are_removed(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = yaml.safe_load(Path("./tests/unit/test_rules/test_rule.yml").read_text())
+        for tenant in ["first", "second"]:
+            test_rule["labels"][TEST_MULTITENANT_LABEL] = tenant
+            (Path(rules_dir.name) / f"{tenant}_rules.yml").write_text(yaml.safe_dump(test_rule))
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+            self.assertEqual(len(list(self.admitted_alert_rules_dir.iterdir())), 2)
+            (Path(rules_dir.name) / "second_rules.yml").unlink()
+
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertEqual(len(list(self.admitted_alert_rules_dir.iterdir())), 1)
+        self.assertEqual(
+            list(self.harness.charm._stored.alert_rules_admitted_hashes.keys()), ["first"]
+        )
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_tenant_exceeding_its_quota_without_admitted_rules_when_alert_rules_changed_then_tenant_rules_are_not_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"tenant_max_cost": 0.5})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertEqual(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
+                "alert_rules"
+            ],
+            "{}",
+        )
+        self.assertIsInstance(self.harness.charm.unit.status, BlockedStatus)
+
+    def test_given_duplicate_rules_and_collapse_enabled_when_alert_rules_changed_then_duplicates_are_not_published(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = yaml.safe_load(Path("./tests/unit/test_rules/test_rule.yml").read_text())
+        (Path(rules_dir.name) / "first_rules.yml").write_text(yaml.safe_dump(test_rule))
+        test_rule["alert"] = "CPUOverUseCopy"
+        test_rule["expr"] = "process_cpu_seconds_total  >  0.12"
+        (Path(rules_dir.name) / "second_rules.yml").write_text(yaml.safe_dump(test_rule))
+        self.harness.update_config({"deduplicate_rules": "collapse"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            with self.assertLogs("charm", "INFO") as logs:
+                self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        self.assertEqual(
+            [rule["alert"] for group in alert_rules["groups"] for rule in group["rules"]],
+            ["CPUOverUse"],
+        )
+        self.assertIn("1 rules, 0 exact and 1 semantic duplicates", "\n".join(logs.output))
+
+    def test_given_recording_rule_file_in_rules_directory_when_alert_rules_changed_then_recording_rule_is_published(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        (Path(rules_dir.name) / "recording_rule.yml").write_text(
+            yaml.safe_dump({"record": "job:up:sum", "expr": "sum by (job) (up)"})
+        )
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        self.assertEqual(alert_rules["groups"][0]["rules"][0]["record"], "job:up:sum")
+
+    def test_given_subexpression_shared_by_alerts_and_extraction_enabled_when_alert_rules_changed_then_recording_rule_is_published(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        for name, threshold in [("High", 10), ("Low", 1)]:
+            (Path(rules_dir.name) / f"{name}.yml").write_text(
+                yaml.safe_dump({"alert": name, "expr": f"rate(requests_total[5m]) > {threshold}"})
+            )
+        self.harness.update_config({"extract_common_subexpressions": 2})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        rules = [rule for group in alert_rules["groups"] for rule in group["rules"]]
+        records = [rule["record"] for rule in rules if "record" in rule]
+        self.assertEqual(len(records), 1)
+        self.assertTrue(
+            all(rule["expr"].startswith(records[0]) for rule in rules if "alert" in rule)
+        )
+
+    def test_given_group_label_hoisting_enabled_and_supported_by_prometheus_when_alert_rules_changed_then_topology_labels_are_published_at_group_level(  # noqa: E501
+        self,
+    ):
+        rules_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(rules_dir.cleanup)
+        test_rule = yaml.safe_load(Path("./tests/unit/test_rules/test_rule.yml").read_text())
+        second_rule = {**test_rule, "alert": "CPUOverUseAgain", "labels": {}}
+        (Path(rules_dir.name) / "rules.yml").write_text(
+            yaml.safe_dump({"groups": [{"name": "cpu", "rules": [test_rule, second_rule]}]})
+        )
+        self.harness.update_config({"hoist_group_labels": True})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+        self.harness.update_relation_data(
+            relation_id, "prometheus-k8s/0", {"alert_rules_features": json.dumps(["group_labels"])}
+        )
+
+        with patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", rules_dir.name):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        group = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )["groups"][0]
+        self.assertEqual(group["labels"]["juju_application"], "prometheus-configurer-k8s")
+        self.assertEqual(group["rules"][0]["labels"], {"severity": "Low"})
+        self.assertNotIn("labels", group["rules"][1])
+
+    def test_given_rule_template_bound_to_tenants_when_alert_rules_changed_then_template_is_published_for_each_tenant(  # noqa: E501
+        self,
+    ):
+        templates_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(templates_dir.cleanup)
+        (Path(templates_dir.name) / "baseline.yml").write_text(
+            Path("./tests/unit/test_rules/test_rule.yml").read_text()
+        )
+        self.harness.update_config(
+            {"tenant_rule_templates": "first: [baseline]\nsecond: [baseline]"}
+        )
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch(
+            "charm.PrometheusConfigurerOperatorCharm.RULE_TEMPLATES_DIR", templates_dir.name
+        ), patch(f"{COS_TOOL}.path", new_callable=PropertyMock, return_value="cos-tool"), patch(
+            f"{COS_TOOL}._exec", side_effect=_cos_tool_transform
+        ):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        alert_rules = json.loads(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")["alert_rules"]
+        )
+        self.assertEqual(sorted(alert_rules["tenants"]), ["first", "second"])
+        rules = sorted(
+            (rule for group in alert_rules["groups"] for rule in group["rules"]),
+            key=lambda rule: rule["labels"][TEST_MULTITENANT_LABEL],
+        )
+        self.assertEqual(
+            [rule["labels"][TEST_MULTITENANT_LABEL] for rule in rules], ["first", "second"]
+        )
+        for rule, tenant in zip(rules, ["first", "second"]):
+            self.assertRegex(
+                rule["expr"],
+                rf'^process_cpu_seconds_total{{.*{TEST_MULTITENANT_LABEL}="{tenant}"}} > 0.12$',
+            )
+
+    def test_given_rule_template_bound_to_tenant_and_no_cos_tool_when_alert_rules_changed_then_template_is_not_published_and_charm_goes_to_blocked_state(  # noqa: E501
+        self,
+    ):
+        templates_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(templates_dir.cleanup)
+        (Path(templates_dir.name) / "baseline.yml").write_text(
+            Path("./tests/unit/test_rules/test_rule.yml").read_text()
+        )
+        self.harness.update_config({"tenant_rule_templates": "first: [baseline]"})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch(
+            "charm.PrometheusConfigurerOperatorCharm.RULE_TEMPLATES_DIR", templates_dir.name
+        ), patch(f"{COS_TOOL}.path", new_callable=PropertyMock, return_value=None):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertNotIn(
+            "alert_rules", self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        )
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus(
+                "Invalid alert rules settings: cos-tool not found, rule templates can't be "
+                "restricted to tenants"
+            ),
+        )
+
+    def test_given_rule_template_bound_to_tenant_and_no_rule_templates_storage_when_alert_rules_changed_then_missing_storage_is_logged(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config({"tenant_rule_templates": "first: [baseline]"})
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        with patch(
+            "charm.PrometheusConfigurerOperatorCharm.RULE_TEMPLATES_DIR", "/nonexistent"
+        ), self.assertLogs("charm", level="WARNING") as logs:
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertIn("Rule templates storage is not attached", "\n".join(logs.output))
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_valid_rules_file_in_rules_directory_when_get_alert_cardinality_action_then_estimated_risks_are_returned(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+
+        output = self.harness.run_action("get-alert-cardinality")
+
+        cardinality = json.loads(output.results["cardinality"])
+        self.assertEqual(cardinality["risk"], 20.0)
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_rule_over_cardinality_risk_threshold_when_alert_rules_changed_then_rule_is_not_published_and_charm_goes_to_blocked_state(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"max_alert_cardinality_risk": 10.0})
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        self.assertEqual(
+            self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")[
+                "alert_rules"
+            ],
+            "{}",
+        )
+        self.assertEqual(
+            self.harness.charm.unit.status, BlockedStatus("Rules blocked for cardinality risk: 1")
+        )
+
+    def test_given_reload_webhook_enabled_when_pebble_ready_then_reload_webhook_receives_prometheus_configurer_reload_requests(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config({"reload_webhook": True})
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.container_pebble_ready("dummy-http-server")
+
+        self.harness.container_pebble_ready("prometheus-configurer")
+
+        self.patched_reload_webhook.assert_called_with(
+            self.harness.charm,
+            PrometheusConfigurerOperatorCharm.RELOAD_WEBHOOK_PORT,
+            [PrometheusConfigurerOperatorCharm.RULE_TEMPLATES_DIR],
+            None,
+        )
+        self.patched_alert_rules_dir_watcher.assert_not_called()
+        command = (
+            self.harness.get_container_pebble_plan("prometheus-configurer")
+            .services["prometheus-configurer"]
+            .command
+        )
+        self.assertIn(
+            f"-prometheusURL=localhost:{PrometheusConfigurerOperatorCharm.RELOAD_WEBHOOK_PORT}",
+            command,
+        )
+        self.assertEqual(self.harness.get_container_pebble_plan("dummy-http-server").to_dict(), {})
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_changed_notice_when_pebble_custom_notice_then_alert_rules_are_published(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        relation_id = self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.set_can_connect("prometheus-configurer", True)
+
+        self.harness.pebble_notify("prometheus-configurer", "example.com/other-notice")
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertNotIn("alert_rules", relation_data)
+
+        self.harness.pebble_notify(
+            "prometheus-configurer", "canonical.com/prometheus-configurer/alert-rules-changed"
+        )
+
+        relation_data = self.harness.get_relation_data(relation_id, "prometheus-configurer-k8s")
+        self.assertIn("CPUOverUse", relation_data["alert_rules"])
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_changed_notice_with_trace_context_when_pebble_custom_notice_then_spans_up_to_publishing_are_written(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.set_can_connect("prometheus-configurer", True)
+        trace_context = alert_rules_tracing.dispatched(alert_rules_tracing.new_context("watchdog"))
+
+        self.harness.pebble_notify(
+            "prometheus-configurer",
+            "canonical.com/prometheus-configurer/alert-rules-changed",
+            data=trace_context,
+        )
+
+        spans = [
+            json.loads(line) for line in self.alert_rules_traces_path.read_text().splitlines()
+        ]
+        self.assertEqual({span["trace_id"] for span in spans}, {trace_context["trace_id"]})
+        self.assertEqual(spans[0]["span_id"], trace_context["span_id"])
+        self.assertIn("alert_rules.publish", [span["name"] for span in spans])
+
+    @patch("alert_rules_tracing.export")
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_trace_context_in_environment_and_otlp_endpoint_in_config_when_alert_rules_changed_then_spans_are_exported(  # noqa: E501
+        self, patched_rules_dir, patched_export
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.update_config({"tracing_otlp_endpoint": "http://localhost:4318"})
+        trace_context = alert_rules_tracing.dispatched(alert_rules_tracing.new_context("watchdog"))
+
+        with patch.dict(
+            "os.environ",
+            {alert_rules_tracing.TRACE_CONTEXT_ENV: json.dumps(trace_context)},
+        ):
+            self.harness.charm.on.alert_rules_changed.emit()
+
+        spans, endpoint = patched_export.call_args.args
+        self.assertEqual(endpoint, "http://localhost:4318")
+        self.assertEqual(spans[0]["trace_id"], trace_context["trace_id"])
+
+    def test_given_no_trace_context_when_update_status_then_no_spans_are_written(self):
+        self.harness.charm.on.update_status.emit()
+
+        self.assertFalse(self.alert_rules_traces_path.exists())
+
+    def test_given_alert_rules_watcher_running_when_pebble_ready_then_watcher_is_not_started_again(  # noqa: E501
+        self,
+    ):
+        self.patched_alert_rules_dir_watcher.return_value.start_watchdog.return_value = 1234
+        self.harness.charm.on.start.emit()
+
+        with patch("charm._watcher_running", return_value=True):
+            self.harness.container_pebble_ready("prometheus-configurer")
+
+        self.patched_alert_rules_dir_watcher.assert_called_once()
+
+    def test_given_dummy_http_server_running_when_reload_webhook_enabled_then_dummy_http_server_is_stopped_once(  # noqa: E501
+        self,
+    ):
+        self.harness.set_can_connect("dummy-http-server", True)
+        self.harness.container_pebble_ready("dummy-http-server")
+        container = self.harness.model.unit.get_container("dummy-http-server")
+        self.assertTrue(container.get_service("dummy-http-server").is_running())
+
+        self.harness.update_config({"reload_webhook": True})
+
+        self.assertFalse(container.get_service("dummy-http-server").is_running())
+        with patch("ops.model.Container.stop") as patched_stop:
+            self.harness.update_config({"group_interval": "2m"})
+            self.harness.charm.on.update_status.emit()
+        patched_stop.assert_not_called()
+
+    def test_given_alert_rules_watcher_running_when_reload_webhook_enabled_then_watcher_is_replaced_by_reload_webhook(  # noqa: E501
+        self,
+    ):
+        self.patched_alert_rules_dir_watcher.return_value.start_watchdog.return_value = 1234
+        self.harness.charm.on.start.emit()
+
+        with patch("charm._watcher_running", return_value=True), patch(
+            "charm.os.kill"
+        ) as patched_kill:
+            self.harness.update_config({"reload_webhook": True})
+
+        patched_kill.assert_called_once_with(1234, signal.SIGTERM)
+        self.patched_reload_webhook.return_value.start.assert_called_once()
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_inputs_unchanged_when_pebble_ready_then_alert_rules_are_not_rebuilt(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        with patch.object(
+            PrometheusConfigurerOperatorCharm, "_build_tenant_groups"
+        ) as patched_build_tenant_groups:
+            self.harness.container_pebble_ready("prometheus-configurer")
+
+        patched_build_tenant_groups.assert_not_called()
+
+    def test_given_pebble_layer_applied_when_config_changed_without_layer_changes_then_pebble_plan_is_not_fetched(  # noqa: E501
+        self,
+    ):
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.container_pebble_ready("dummy-http-server")
+        self.harness.container_pebble_ready("prometheus-configurer")
+
+        with patch("ops.model.Container.get_plan") as patched_get_plan:
+            self.harness.update_config({"max_rules_cost": 100.0})
+
+        patched_get_plan.assert_not_called()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    def test_given_pebble_plan_drifted_from_applied_layer_when_update_status_then_layer_is_applied_again(  # noqa: E501
+        self,
+    ):
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.container_pebble_ready("dummy-http-server")
+        self.harness.container_pebble_ready("prometheus-configurer")
+        container = self.harness.charm.unit.get_container("prometheus-configurer")
+        expected_plan = container.get_plan().to_dict()
+        container.add_layer(
+            "prometheus-configurer",
+            {"services": {"prometheus-configurer": {"override": "replace", "command": "sleep"}}},
+            combine=True,
+        )
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(container.get_plan().to_dict(), expected_plan)
+
+    def test_given_prometheus_configurer_container_limits_when_pebble_ready_then_go_runtime_is_sized_after_limits(  # noqa: E501
+        self,
+    ):
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.container_pebble_ready("dummy-http-server")
+        self.harness.set_can_connect("prometheus-configurer", True)
+        container = self.harness.charm.unit.get_container("prometheus-configurer")
+        container.push("/sys/fs/cgroup/cpu.max", "200000 100000\n", make_dirs=True)
+        container.push("/sys/fs/cgroup/memory.max", "1000\n", make_dirs=True)
+
+        self.harness.container_pebble_ready("prometheus-configurer")
+
+        environment = container.get_plan().services["prometheus-configurer"].environment
+        self.assertEqual(environment, {"GOGC": "100", "GOMAXPROCS": "2", "GOMEMLIMIT": "900"})
+
+    def test_given_prometheus_configurer_container_limits_changed_when_update_status_then_go_runtime_is_resized(  # noqa: E501
+        self,
+    ):
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+        self.harness.container_pebble_ready("dummy-http-server")
+        self.harness.container_pebble_ready("prometheus-configurer")
+        container = self.harness.charm.unit.get_container("prometheus-configurer")
+        container.push("/sys/fs/cgroup/cpu.max", "400000 100000\n", make_dirs=True)
+        self.harness.update_config({"go_gc": "50", "go_memory_limit": "512MiB"})
+
+        self.harness.charm.on.update_status.emit()
+
+        environment = container.get_plan().services["prometheus-configurer"].environment
+        self.assertEqual(environment, {"GOGC": "50", "GOMAXPROCS": "4", "GOMEMLIMIT": "512MiB"})
+
+    def test_given_cpu_request_exceeding_limit_when_config_changed_then_charm_goes_to_blocked_state(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config(
+            {"prometheus_configurer_cpu_request": "2", "prometheus_configurer_cpu_limit": "1"}
+        )
+
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus(
+                "Invalid resource requirements: prometheus-configurer: cpu request 2 exceeds "
+                "limit 1"
+            ),
+        )
+
+    @patch.dict("os.environ", {"JUJU_DISPATCH_PATH": "hooks/install"})
+    @patch("kubernetes_resources_patch.KubernetesResourcesPatch")
+    @patch("charms.observability_libs.v1.kubernetes_service_patch.KubernetesServicePatch")
+    def test_given_install_hook_when_charm_is_initialised_then_kubernetes_patches_are_set_up(
+        self, patched_service_patch, patched_resources_patch
+    ):
+        harness = testing.Harness(PrometheusConfigurerOperatorCharm)
+        self.addCleanup(harness.cleanup)
+
+        harness.begin()
+
+        patched_service_patch.assert_called_once()
+        patched_resources_patch.assert_called_once()
+
+    @patch.dict("os.environ", {"JUJU_DISPATCH_PATH": "hooks/update-status"})
+    @patch("kubernetes_resources_patch.KubernetesResourcesPatch")
+    @patch("charms.observability_libs.v1.kubernetes_service_patch.KubernetesServicePatch")
+    def test_given_update_status_hook_when_charm_is_initialised_then_kubernetes_patches_are_not_set_up(  # noqa: E501
+        self, patched_service_patch, patched_resources_patch
+    ):
+        harness = testing.Harness(PrometheusConfigurerOperatorCharm)
+        self.addCleanup(harness.cleanup)
+
+        harness.begin()
+
+        patched_service_patch.assert_not_called()
+        patched_resources_patch.assert_not_called()
+
+    @patch("charm.PrometheusConfigurerOperatorCharm.RULES_DIR", new_callable=PropertyMock)
+    def test_given_alert_rules_published_when_alert_rules_changed_then_stage_timings_are_written(  # noqa: E501
+        self, patched_rules_dir
+    ):
+        patched_rules_dir.return_value = "./tests/unit/test_rules"
+        self.harness.add_relation("prometheus", "prometheus-k8s")
+
+        self.harness.charm.on.alert_rules_changed.emit()
+
+        record = json.loads(self.stage_timings_path.read_text().splitlines()[-1])
+        self.assertEqual(record["hook"], "alert_rules_changed")
+        stages = {stage["stage"]: stage for stage in record["stages"]}
+        self.assertEqual(
+            list(stages),
+            [
+                "discover",
+                "parse",
+                "annotate",
+                "transform",
+                "validate",
+                "fingerprint",
+                "serialise",
+                "publish",
+            ],
+        )
+        self.assertEqual(stages["discover"]["files"], 1)
+        self.assertEqual(stages["parse"]["rules"], 1)
+        self.assertGreater(stages["publish"]["bytes"], 0)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+import go_runtime
+
+
+class TestGoRuntime(unittest.TestCase):
+    def test_given_cgroup_v2_cpu_quota_when_cpu_limit_then_number_of_cpus_is_returned(self):
+        files = {go_runtime.CGROUP_V2_CPU_MAX: "250000 100000\n"}
+
+        self.assertEqual(go_runtime.cpu_limit(files.get), 2.5)
+
+    def test_given_cgroup_v2_without_cpu_quota_when_cpu_limit_then_none_is_returned(self):
+        files = {go_runtime.CGROUP_V2_CPU_MAX: "max 100000\n"}
+
+        self.assertIsNone(go_runtime.cpu_limit(files.get))
+
+    def test_given_cgroup_v1_cpu_quota_when_cpu_limit_then_number_of_cpus_is_returned(self):
+        files = {
+            go_runtime.CGROUP_V1_CPU_QUOTA: "50000\n",
+            go_runtime.CGROUP_V1_CPU_PERIOD: "100000\n",
+        }
+
+        self.assertEqual(go_runtime.cpu_limit(files.get), 0.5)
+
+    def test_given_cgroup_v1_without_cpu_quota_when_cpu_limit_then_none_is_returned(self):
+        files = {
+            go_runtime.CGROUP_V1_CPU_QUOTA: "-1\n",
+            go_runtime.CGROUP_V1_CPU_PERIOD: "100000\n",
+        }
+
+        self.assertIsNone(go_runtime.cpu_limit(files.get))
+
+    def test_given_cgroup_v2_memory_limit_when_memory_limit_then_number_of_bytes_is_returned(
+        self,
+    ):
+        files = {go_runtime.CGROUP_V2_MEMORY_MAX: "1073741824\n"}
+
+        self.assertEqual(go_runtime.memory_limit(files.get), 1073741824)
+
+    def test_given_cgroup_v1_without_memory_limit_when_memory_limit_then_none_is_returned(self):
+        files = {go_runtime.CGROUP_V1_MEMORY_LIMIT: "9223372036854771712\n"}
+
+        self.assertIsNone(go_runtime.memory_limit(files.get))
+
+    def test_given_no_cgroup_files_when_memory_limit_then_none_is_returned(self):
+        self.assertIsNone(go_runtime.memory_limit({}.get))
+
+    def test_given_container_limits_when_environment_then_go_runtime_is_sized_after_limits(self):
+        env = go_runtime.environment(0.5, 1000)
+
+        self.assertEqual(env, {"GOGC": "100", "GOMAXPROCS": "1", "GOMEMLIMIT": "900"})
+
+    def test_given_overrides_when_environment_then_overrides_take_precedence_over_limits(self):
+        env = go_runtime.environment(2.5, 1000, 4, "512MiB", "off")
+
+        self.assertEqual(env, {"GOGC": "off", "GOMAXPROCS": "4", "GOMEMLIMIT": "512MiB"})
+
+    def test_given_no_limits_when_environment_then_only_gogc_is_set(self):
+        self.assertEqual(go_runtime.environment(None, None), {"GOGC": "100"})
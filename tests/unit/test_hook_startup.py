@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+BENCHMARK = "tests/benchmarks/hook_startup.py"
+
+
+def _run_hook(hook: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([".", "lib", "src"])
+    output = subprocess.run(
+        [sys.executable, BENCHMARK, "--hook", hook],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class TestHookStartup(unittest.TestCase):
+    def test_given_hooks_not_changing_alert_rules_inputs_when_run_then_lightkube_and_remote_write_lib_are_not_imported(  # noqa: E501
+        self,
+    ):
+        for hook in ("update-status", "prometheus-configurer-pebble-ready"):
+            with self.subTest(hook=hook):
+                result = _run_hook(hook)
+
+                self.assertFalse(result["published"])
+                self.assertFalse(result["lightkube"])
+                self.assertFalse(result["remote_write_lib"])
+
+    def test_given_update_status_hook_when_run_then_watchdog_and_profiling_are_not_imported(self):
+        result = _run_hook("update-status")
+
+        self.assertFalse(result["watchdog"])
+        self.assertFalse(result["profiling"])
+
+    def test_given_alert_rules_changed_when_run_then_alert_rules_are_published_without_importing_lightkube(  # noqa: E501
+        self,
+    ):
+        result = _run_hook("alert_rules_changed")
+
+        self.assertTrue(result["published"])
+        self.assertTrue(result["remote_write_lib"])
+        self.assertFalse(result["lightkube"])
+
+    def test_given_install_hook_when_run_then_lightkube_is_imported_for_kubernetes_patches(self):
+        self.assertTrue(_run_hook("install")["lightkube"])
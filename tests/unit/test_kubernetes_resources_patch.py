@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import PropertyMock, patch
+
+from lightkube.models.apps_v1 import StatefulSetSpec
+from lightkube.models.core_v1 import (
+    Container,
+    PodSpec,
+    PodTemplateSpec,
+    ResourceRequirements,
+)
+from lightkube.models.meta_v1 import LabelSelector
+from lightkube.resources.apps_v1 import StatefulSet
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+import kubernetes_resources_patch
+from kubernetes_resources_patch import KubernetesResourcesPatch
+
+TEST_REQUIREMENTS = {
+    "workload": kubernetes_resources_patch.resource_requirements(
+        {"cpu": "100m", "memory": ""}, {"cpu": "1", "memory": "512Mi"}
+    )
+}
+
+
+class ResourcesPatchCharm(CharmBase):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.resources_patch = KubernetesResourcesPatch(
+            self, lambda: TEST_REQUIREMENTS, refresh_event=self.on.config_changed
+        )
+
+
+def _statefulset(resources: ResourceRequirements) -> StatefulSet:
+    return StatefulSet(
+        spec=StatefulSetSpec(
+            selector=LabelSelector(),
+            serviceName="test-app",
+            template=PodTemplateSpec(
+                spec=PodSpec(
+                    containers=[
+                        Container(name="charm"),
+                        Container(name="workload", resources=resources),
+                    ]
+                )
+            ),
+        )
+    )
+
+
+class TestKubernetesResourcesPatch(unittest.TestCase):
+    def setUp(self):
+        client_patcher = patch("kubernetes_resources_patch.Client")
+        self.patched_client = client_patcher.start().return_value
+        self.addCleanup(client_patcher.stop)
+        namespace_patcher = patch(
+            "kubernetes_resources_patch.KubernetesResourcesPatch._namespace",
+            new_callable=PropertyMock,
+            return_value="test-namespace",
+        )
+        namespace_patcher.start()
+        self.addCleanup(namespace_patcher.stop)
+        self.harness = Harness(ResourcesPatchCharm, meta="name: test-app")
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+    def test_given_request_exceeding_limit_when_resource_requirements_then_value_error_is_raised(
+        self,
+    ):
+        with self.assertRaises(ValueError):
+            kubernetes_resources_patch.resource_requirements({"cpu": "2"}, {"cpu": "1"})
+
+    def test_given_invalid_quantity_when_resource_requirements_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            kubernetes_resources_patch.resource_requirements({"memory": "lots"}, {})
+
+    def test_given_statefulset_without_resources_when_install_then_resources_are_patched(self):
+        self.patched_client.get.return_value = _statefulset(ResourceRequirements())
+
+        self.harness.charm.on.install.emit()
+
+        self.patched_client.patch.assert_called_once()
+        self.assertEqual(
+            self.patched_client.patch.call_args.args[2],
+            {
+                "spec": {
+                    "template": {
+                        "spec": {
+                            "containers": [
+                                {
+                                    "name": "workload",
+                                    "resources": {
+                                        "requests": {"cpu": "100m", "memory": None},
+                                        "limits": {"cpu": "1", "memory": "512Mi"},
+                                    },
+                                }
+                            ]
+                        }
+                    }
+                }
+            },
+        )
+
+    def test_given_statefulset_with_canonically_equal_resources_when_config_changed_then_statefulset_is_not_patched(  # noqa: E501
+        self,
+    ):
+        self.patched_client.get.return_value = _statefulset(
+            ResourceRequirements(
+                requests={"cpu": "0.1"}, limits={"cpu": "1000m", "memory": "536870912"}
+            )
+        )
+
+        self.harness.charm.on.config_changed.emit()
+
+        self.patched_client.patch.assert_not_called()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import base64
+import hashlib
+import json
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from charms.prometheus_k8s.v0.prometheus_remote_write import (
+    CosTool,
+    PrometheusRemoteWriteProvider,
+)
+from lightkube.core.exceptions import ConfigError
+from ops import testing
+from ops.charm import CharmBase
+
+REMOTE_WRITE_LIB = "charms.prometheus_k8s.v0.prometheus_remote_write"
+TEST_TOPOLOGY_LABELS = {
+    "juju_model": "model",
+    "juju_model_uuid": "00000000-0000-4000-8000-000000000000",
+    "juju_application": "prometheus-configurer-k8s",
+    "juju_charm": "prometheus-configurer-k8s",
+}
+PROMETHEUS_METADATA = """
+name: prometheus-k8s
+provides:
+  receive-remote-write:
+    interface: prometheus_remote_write
+"""
+
+
+class PrometheusCharm(CharmBase):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.remote_write_provider = PrometheusRemoteWriteProvider(self, "receive-remote-write")
+
+
+def _group(name: str, labels: dict = TEST_TOPOLOGY_LABELS) -> dict:
+    return {
+        "name": name,
+        "rules": [{"alert": f"{name}Alert", "expr": "up == 0", "labels": dict(labels)}],
+    }
+
+
+def _chunk(*groups: dict) -> str:
+    return json.dumps({"groups": list(groups)})
+
+
+def _hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode()).hexdigest()
+
+
+def _chunked(*chunks: str) -> dict:
+    return {
+        "alert_rules_manifest": json.dumps({"chunks": [_hash(chunk) for chunk in chunks]}),
+        **{f"alert_rules_chunk_{idx}": chunk for idx, chunk in enumerate(chunks)},
+    }
+
+
+class TestPrometheusRemoteWriteProvider(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = Path(cache_dir.name)
+        cache_dir_patch = patch(f"{REMOTE_WRITE_LIB}.ALERT_RULES_CACHE_DIR", cache_dir.name)
+        cache_dir_patch.start()
+        self.addCleanup(cache_dir_patch.stop)
+        self.harness = testing.Harness(PrometheusCharm, meta=PROMETHEUS_METADATA)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.begin()
+        self.relation_id = self.harness.add_relation(
+            "receive-remote-write", "prometheus-configurer-k8s"
+        )
+        self.harness.add_relation_unit(self.relation_id, "prometheus-configurer-k8s/0")
+
+    def _publish(self, relation_data: dict) -> None:
+        self.harness.update_relation_data(
+            self.relation_id, "prometheus-configurer-k8s", relation_data
+        )
+
+    def _alert_group_names(self) -> list:
+        return sorted(
+            group["name"]
+            for alert_rules in self.harness.charm.remote_write_provider.alerts().values()
+            for group in alert_rules["groups"]
+        )
+
+    def _errors(self) -> str:
+        relation = self.harness.model.get_relation("receive-remote-write", self.relation_id)
+        assert relation
+        event = relation.data[self.harness.charm.app].get("event", "{}")
+        return json.loads(event).get("errors", "")
+
+    def test_given_zlib_encoded_alert_rules_when_alerts_then_alert_rules_are_decoded(self):
+        compressed = zlib.compress(_chunk(_group("a")).encode())
+        self._publish(
+            {
+                "alert_rules": base64.b64encode(compressed).decode(),
+                "alert_rules_encoding": "zlib",
+            }
+        )
+
+        self.assertEqual(self._alert_group_names(), ["a"])
+
+    def test_given_alert_rules_split_into_chunks_when_alerts_then_chunks_are_reassembled(self):
+        self._publish(_chunked(_chunk(_group("a"), _group("b")), _chunk(_group("c"))))
+
+        self.assertEqual(self._alert_group_names(), ["a", "b", "c"])
+
+    @patch.object(CosTool, "validate_alert_rules", return_value=(True, ""))
+    def test_given_chunks_already_processed_when_alerts_then_only_new_chunks_are_fetched_and_validated(  # noqa: E501
+        self, patched_validate_alert_rules
+    ):
+        first_chunk = _chunk(_group("a"))
+        self._publish(_chunked(first_chunk))
+        self._alert_group_names()
+        patched_validate_alert_rules.reset_mock()
+
+        relation_data = _chunked(first_chunk, _chunk(_group("b")))
+        # The processed first chunk is cached, so it isn't read from the relation data bag again
+        relation_data["alert_rules_chunk_0"] = "not JSON"
+        self._publish(relation_data)
+
+        self.assertEqual(self._alert_group_names(), ["a", "b"])
+        patched_validate_alert_rules.assert_called_once()
+
+    def test_given_processed_chunks_when_alerts_then_they_are_cached_on_disk_rather_than_in_stored_state(  # noqa: E501
+        self,
+    ):
+        chunk = _chunk(_group("a"))
+        self._publish(_chunked(chunk))
+
+        self._alert_group_names()
+
+        cached_chunk = self.cache_dir / "receive-remote-write" / f"{_hash(chunk)}.json"
+        self.assertEqual(json.loads(cached_chunk.read_text())[0][1]["name"], "a")
+        self.assertFalse(hasattr(self.harness.charm.remote_write_provider, "_stored"))
+
+    def test_given_chunk_no_longer_listed_when_alerts_then_its_cache_is_removed(self):
+        first_chunk = _chunk(_group("a"))
+        self._publish(_chunked(first_chunk))
+        self._alert_group_names()
+
+        self._publish(_chunked(_chunk(_group("b"))))
+        self._alert_group_names()
+
+        self.assertEqual(
+            [path.name for path in (self.cache_dir / "receive-remote-write").iterdir()],
+            [f"{_hash(_chunk(_group('b')))}.json"],
+        )
+
+    def test_given_chunk_missing_from_relation_data_when_alerts_then_error_is_reported_and_chunk_is_loaded_once_available(  # noqa: E501
+        self,
+    ):
+        first_chunk, second_chunk = _chunk(_group("a")), _chunk(_group("b"))
+        relation_data = _chunked(first_chunk, second_chunk)
+        del relation_data["alert_rules_chunk_1"]
+        self._publish(relation_data)
+
+        self.assertEqual(self._alert_group_names(), ["a"])
+        self.assertIn(f"failed to load alert rules chunk {_hash(second_chunk)}", self._errors())
+
+        self._publish({"alert_rules_chunk_1": second_chunk})
+
+        self.assertEqual(self._alert_group_names(), ["a", "b"])
+
+    def test_given_corrupted_cached_chunk_when_alerts_then_error_is_reported_and_chunk_is_loaded_again(  # noqa: E501
+        self,
+    ):
+        chunk = _chunk(_group("a"))
+        self._publish(_chunked(chunk))
+        self._alert_group_names()
+        (self.cache_dir / "receive-remote-write" / f"{_hash(chunk)}.json").write_text("{")
+
+        self.assertEqual(self._alert_group_names(), [])
+        self.assertIn(f"failed to load alert rules chunk {_hash(chunk)}", self._errors())
+        self.assertEqual(self._alert_group_names(), ["a"])
+
+    def test_given_labels_hoisted_to_group_level_when_alerts_then_they_are_put_back_into_each_rule(  # noqa: E501
+        self,
+    ):
+        group = _group("a", labels={"severity": "critical"})
+        group["labels"] = dict(TEST_TOPOLOGY_LABELS, severity="warning")
+        self._publish({"alert_rules": _chunk(group)})
+
+        (alert_rules,) = self.harness.charm.remote_write_provider.alerts().values()
+
+        (alert_group,) = alert_rules["groups"]
+        self.assertNotIn("labels", alert_group)
+        self.assertEqual(
+            alert_group["rules"][0]["labels"], dict(TEST_TOPOLOGY_LABELS, severity="critical")
+        )
+
+    @patch("lightkube.Client")
+    def test_given_alert_rules_stored_in_configmaps_when_alerts_then_they_are_fetched_from_kubernetes(  # noqa: E501
+        self, patched_client
+    ):
+        chunk = _chunk(_group("a"))
+        patched_client.return_value.get.return_value = Mock(data={"alert_rules": chunk})
+        self._publish(
+            {
+                "alert_rules_ref": json.dumps(
+                    {
+                        "namespace": "cos",
+                        "configmaps": [{"name": "alert-rules-0", "hash": _hash(chunk)}],
+                    }
+                )
+            }
+        )
+
+        self.assertEqual(self._alert_group_names(), ["a"])
+        self.assertEqual(patched_client.return_value.get.call_args.args[1], "alert-rules-0")
+        self.assertEqual(patched_client.return_value.get.call_args.kwargs, {"namespace": "cos"})
+
+    @patch("lightkube.Client")
+    def test_given_configmap_unreadable_when_alerts_then_error_is_reported_and_configmap_is_fetched_again(  # noqa: E501
+        self, patched_client
+    ):
+        chunk = _chunk(_group("a"))
+        patched_client.return_value.get.side_effect = [
+            ConfigError("not trusted"),
+            Mock(data={"alert_rules": chunk}),
+        ]
+        self._publish(
+            {
+                "alert_rules_ref": json.dumps(
+                    {
+                        "namespace": "cos",
+                        "configmaps": [{"name": "alert-rules-0", "hash": _hash(chunk)}],
+                    }
+                )
+            }
+        )
+
+        self.assertEqual(self._alert_group_names(), [])
+        self.assertIn("failed to load alert rules", self._errors())
+        self.assertEqual(self._alert_group_names(), ["a"])
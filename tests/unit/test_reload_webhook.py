@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import threading
+import unittest
+import urllib.request
+from http.server import HTTPServer
+from unittest.mock import ANY, patch
+
+from ops import testing
+
+from charm import PrometheusConfigurerOperatorCharm
+from reload_webhook import Dispatcher, Handler, ReloadWebhook
+
+
+class TestReloadWebhook(unittest.TestCase):
+    def setUp(self):
+        self.harness = testing.Harness(PrometheusConfigurerOperatorCharm)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+    @patch("pathlib.Path.exists")
+    @patch("subprocess.Popen")
+    @patch("reload_webhook.LOG_FILE_PATH", "/dev/null")
+    def test_given_reload_webhook_and_juju_exec_exists_when_start_then_correct_subprocess_is_started(  # noqa: E501
+        self, patched_popen, patched_path_exists
+    ):
+        patched_path_exists.return_value = True
+        reload_webhook = ReloadWebhook(self.harness.charm, 9101)
+
+        reload_webhook.start()
+
+        patched_popen.assert_called_once()
+        self.assertEqual(
+            patched_popen.call_args.kwargs["args"],
+            [
+                "/usr/bin/python3",
+                "src/reload_webhook.py",
+                "9101",
+                "/usr/bin/juju-exec",
+                self.harness.charm.unit.name,
+                self.harness.charm.charm_dir,
+            ],
+        )
+
+    @patch("pathlib.Path.exists")
+    @patch("subprocess.Popen")
+    @patch("reload_webhook.LOG_FILE_PATH", "/dev/null")
+    def test_given_extra_dirs_when_start_then_they_are_passed_to_subprocess_to_be_watched(
+        self, patched_popen, patched_path_exists
+    ):
+        patched_path_exists.return_value = True
+        reload_webhook = ReloadWebhook(self.harness.charm, 9101, ["/etc/prometheus/templates"])
+
+        reload_webhook.start()
+
+        self.assertEqual(patched_popen.call_args.kwargs["args"][-1], "/etc/prometheus/templates")
+
+    def _start_receiver(self) -> str:
+        Handler.dispatcher = Dispatcher("juju-exec", "unit/0", "/charm")
+        Handler.dispatcher.start()
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    @patch("reload_webhook.dispatch")
+    def test_given_running_receiver_when_reload_requested_then_alert_rules_changed_is_dispatched_once(  # noqa: E501
+        self, patched_dispatch
+    ):
+        dispatched = threading.Event()
+        patched_dispatch.side_effect = lambda *args: dispatched.set()
+        url = self._start_receiver()
+
+        urllib.request.urlopen(urllib.request.Request(f"{url}/-/reload", method="POST"))
+        urllib.request.urlopen(f"{url}/")
+
+        self.assertTrue(dispatched.wait(5))
+        patched_dispatch.assert_called_once_with("juju-exec", "unit/0", "/charm", ANY)
+        self.assertEqual(patched_dispatch.call_args.args[3]["source"], "reload-webhook")
+
+    @patch("reload_webhook.dispatch")
+    def test_given_alert_rules_changed_being_dispatched_when_reloads_requested_then_they_are_responded_to_and_coalesced(  # noqa: E501
+        self, patched_dispatch
+    ):
+        dispatch_started = threading.Event()
+        release_dispatch = threading.Event()
+        dispatched = threading.Semaphore(0)
+
+        def slow_dispatch(*args):
+            dispatch_started.set()
+            release_dispatch.wait(5)
+            dispatched.release()
+
+        patched_dispatch.side_effect = slow_dispatch
+        url = self._start_receiver()
+        urllib.request.urlopen(urllib.request.Request(f"{url}/-/reload", method="POST"))
+        self.assertTrue(dispatch_started.wait(5))
+
+        for _ in range(3):
+            urllib.request.urlopen(
+                urllib.request.Request(f"{url}/-/reload", method="POST"), timeout=1
+            )
+        # Requests are handled one at a time, so the last reload request is done with by now
+        urllib.request.urlopen(f"{url}/")
+        release_dispatch.set()
+
+        self.assertTrue(dispatched.acquire(timeout=5))
+        self.assertTrue(dispatched.acquire(timeout=5))
+        self.assertFalse(dispatched.acquire(timeout=0.2))
+        self.assertEqual(patched_dispatch.call_count, 2)
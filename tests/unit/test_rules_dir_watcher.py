@@ -2,26 +2,38 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import shlex
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch
 
 from ops import testing
+from ops.pebble import NoticeType
+from watchdog.events import FileModifiedEvent
 
+import alert_rules_tracing
 from charm import PrometheusConfigurerOperatorCharm
-from rules_dir_watcher import AlertRulesDirWatcher
+from rules_dir_watcher import (
+    ALERT_RULES_CHANGED_NOTICE_KEY,
+    NOTICE_SOCKET_ENV,
+    AlertRulesDirWatcher,
+    Handler,
+    dispatch,
+    watch,
+)
 
 
 class TestRulesDirWatcher(unittest.TestCase):
-    @patch("charm.KubernetesServicePatch", lambda charm, ports: None)
     def setUp(self):
         self.harness = testing.Harness(PrometheusConfigurerOperatorCharm)
         self.harness.begin()
 
     @patch("pathlib.Path.exists")
     @patch("subprocess.Popen")
-    @patch("rules_dir_watcher.LOG_FILE_PATH")
+    @patch("rules_dir_watcher.LOG_FILE_PATH", "/dev/null")
     def test_given_rules_dir_watcher_and_juju_exec_exists_when_start_watchdog_then_correct_subprocess_is_started(
-        self, _, patched_popen, patched_path_exists
+        self, patched_popen, patched_path_exists
     ):
         test_watch_dir = "/whatever/watch/dir"
         patched_path_exists.return_value = True
@@ -42,9 +54,9 @@ class TestRulesDirWatcher(unittest.TestCase):
 
     @patch("pathlib.Path.exists")
     @patch("subprocess.Popen")
-    @patch("rules_dir_watcher.LOG_FILE_PATH")
+    @patch("rules_dir_watcher.LOG_FILE_PATH", "/dev/null")
     def test_given_rules_dir_watcher_and_juju_exec_does_not_exist_when_start_watchdog_then_correct_subprocess_is_started(
-        self, _, patched_popen, patched_path_exists
+        self, patched_popen, patched_path_exists
     ):
         test_watch_dir = "/whatever/watch/dir"
         patched_path_exists.return_value = False
@@ -62,3 +74,103 @@ class TestRulesDirWatcher(unittest.TestCase):
             self.harness.charm.unit.name,
             self.harness.charm.charm_dir,
         ]
+
+    @patch("pathlib.Path.exists")
+    @patch("subprocess.Popen")
+    @patch("rules_dir_watcher.LOG_FILE_PATH", "/dev/null")
+    def test_given_notice_socket_when_start_watchdog_then_notice_socket_is_set_in_subprocess_environment(
+        self, patched_popen, patched_path_exists
+    ):
+        patched_path_exists.return_value = True
+        watchdog = AlertRulesDirWatcher(
+            self.harness.charm, "/whatever/watch/dir", notice_socket="/pebble.socket"
+        )
+
+        watchdog.start_watchdog()
+
+        assert patched_popen.call_args.kwargs["env"][NOTICE_SOCKET_ENV] == "/pebble.socket"
+
+    @patch("subprocess.run")
+    @patch("rules_dir_watcher.Client")
+    def test_given_notice_socket_in_environment_when_dispatch_then_pebble_notice_is_recorded(
+        self, patched_client, patched_run
+    ):
+        with patch.dict("os.environ", {NOTICE_SOCKET_ENV: "/pebble.socket"}):
+            dispatch("/usr/bin/juju-exec", "unit/0", "/charm")
+
+        patched_client.assert_called_once_with(socket_path="/pebble.socket")
+        patched_client.return_value.notify.assert_called_once_with(
+            NoticeType.CUSTOM, ALERT_RULES_CHANGED_NOTICE_KEY, data=None
+        )
+        patched_run.assert_not_called()
+
+    @patch("rules_dir_watcher.Client")
+    def test_given_notice_socket_in_environment_and_trace_context_when_dispatch_then_dispatched_trace_context_is_notice_data(  # noqa: E501
+        self, patched_client
+    ):
+        trace_context = alert_rules_tracing.new_context("watchdog")
+
+        with patch.dict("os.environ", {NOTICE_SOCKET_ENV: "/pebble.socket"}):
+            dispatch("/usr/bin/juju-exec", "unit/0", "/charm", trace_context)
+
+        data = patched_client.return_value.notify.call_args.kwargs["data"]
+        self.assertEqual(data["trace_id"], trace_context["trace_id"])
+        self.assertIsNotNone(alert_rules_tracing.parse_context(data))
+
+    @patch("subprocess.run")
+    def test_given_trace_context_when_dispatch_then_trace_context_is_set_in_hook_environment(
+        self, patched_run
+    ):
+        trace_context = alert_rules_tracing.new_context("watchdog")
+
+        dispatch("/usr/bin/juju-exec", "unit/0", "/charm", trace_context)
+
+        run_cmd, _, unit, dispatch_cmd = patched_run.call_args.args[0]
+        self.assertEqual((run_cmd, unit), ("/usr/bin/juju-exec", "unit/0"))
+        *assignments, script = shlex.split(dispatch_cmd)
+        self.assertEqual(script, "/charm/dispatch")
+        environment = dict(assignment.split("=", 1) for assignment in assignments)
+        self.assertEqual(environment["JUJU_DISPATCH_PATH"], "hooks/alert_rules_changed")
+        with patch.dict("os.environ", environment):
+            received = alert_rules_tracing.context_from_environment()
+        self.assertEqual(received["trace_id"], trace_context["trace_id"])
+
+    @patch("rules_dir_watcher.Client")
+    def test_given_pebble_unreachable_when_change_observed_then_error_is_logged_and_next_change_is_delivered(  # noqa: E501
+        self, patched_client
+    ):
+        patched_client.return_value.notify.side_effect = [ConnectionError("refused"), None]
+        handler = Handler(
+            lambda trace_context: dispatch("/usr/bin/juju-exec", "unit/0", "/charm", trace_context)
+        )
+        event = FileModifiedEvent("/etc/prometheus/rules/rules.yml")
+
+        with patch.dict("os.environ", {NOTICE_SOCKET_ENV: "/pebble.socket"}), self.assertLogs(
+            "rules_dir_watcher", level="ERROR"
+        ):
+            handler.on_any_event(event)
+        with patch.dict("os.environ", {NOTICE_SOCKET_ENV: "/pebble.socket"}):
+            handler.on_any_event(event)
+
+        self.assertEqual(patched_client.return_value.notify.call_count, 2)
+
+    def test_given_watched_dir_when_file_written_then_change_is_handled_with_trace_context(self):
+        changed = threading.Event()
+        trace_contexts = []
+
+        def on_change(trace_context):
+            trace_contexts.append(trace_context)
+            changed.set()
+
+        with tempfile.TemporaryDirectory() as watched_dir:
+            observer = watch([], Handler(on_change), [watched_dir, "/does/not/exist"])
+            try:
+                with open(f"{watched_dir}/template.yml", "w") as template:
+                    template.write("groups: []")
+
+                self.assertTrue(changed.wait(5))
+            finally:
+                observer.stop()
+                observer.join()
+
+        self.assertEqual(trace_contexts[0]["source"], "watchdog")
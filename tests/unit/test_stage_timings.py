@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from stage_timings import StageTimer
+
+
+class TestStageTimings(unittest.TestCase):
+    def setUp(self):
+        timings_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(timings_dir.cleanup)
+        self.timings_path = Path(timings_dir.name) / "timings.jsonl"
+
+    def test_given_timed_stages_when_write_then_stages_are_appended_as_single_json_line(self):
+        timer = StageTimer("update_status")
+        with timer.stage("parse", files=2) as stage:
+            stage["rules"] = 3
+        with timer.stage("publish"):
+            pass
+
+        timer.write(str(self.timings_path))
+
+        lines = self.timings_path.read_text().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record["hook"], "update_status")
+        self.assertEqual([stage["stage"] for stage in record["stages"]], ["parse", "publish"])
+        self.assertEqual(record["stages"][0]["files"], 2)
+        self.assertEqual(record["stages"][0]["rules"], 3)
+        self.assertGreaterEqual(record["stages"][0]["duration_ms"], 0)
+        self.assertEqual(timer.stages, [])
+
+    def test_given_no_timed_stages_when_write_then_nothing_is_written(self):
+        StageTimer("update_status").write(str(self.timings_path))
+
+        self.assertFalse(self.timings_path.exists())
+
+    def test_given_timings_file_at_max_size_when_write_then_file_is_rotated(self):
+        self.timings_path.write_text("x" * 100)
+        timer = StageTimer("update_status")
+        with timer.stage("parse"):
+            pass
+
+        timer.write(str(self.timings_path), max_size=100)
+
+        self.assertEqual(Path(f"{self.timings_path}.1").read_text(), "x" * 100)
+        self.assertEqual(len(self.timings_path.read_text().splitlines()), 1)
+
+    def test_given_stage_raising_when_stage_then_stage_is_still_timed(self):
+        timer = StageTimer("update_status")
+
+        with self.assertRaises(ValueError):
+            with timer.stage("parse"):
+                raise ValueError("invalid")
+
+        self.assertEqual(timer.stages[0]["stage"], "parse")